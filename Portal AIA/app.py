@@ -1,21 +1,197 @@
-from flask import Flask, request, jsonify, send_from_directory, send_file
+from flask import Flask, Request, request, jsonify, send_from_directory, send_file, Response, g
 from pathlib import Path
 import os
+import hashlib
+import time
+from werkzeug.exceptions import RequestEntityTooLarge
 from werkzeug.utils import secure_filename
 
 # importa a função de processamento
-from backend.aia import processar_arquivo_excel
+from backend.aia import processar_arquivo_excel, inspecionar_arquivo, encerrar_pools_escrita, POLITICAS_DEDUP
+from backend.jobs import criar_job, obter_job, contar_jobs, encerrar as encerrar_jobs
+from backend.metricas import Contador, Histograma, Medidor, exportar as exportar_metricas
 import socket
 import netifaces
 import shutil
 import tempfile
-
-app = Flask(__name__, static_folder='frontend', static_url_path='')
+import multiprocessing
 
 BASE_DIR = Path(__file__).parent
 DATA_DIR = BASE_DIR / 'data'
 DATA_DIR.mkdir(exist_ok=True)
 
+# Debugger/reloader do Flask apenas quando AIA_DEBUG=1 (nunca em produção)
+DEBUG = os.environ.get('AIA_DEBUG', '').strip().lower() in ('1', 'true', 'sim')
+
+# Porta do servidor (a mesma usada por wsgi.py/gunicorn.conf.py); informada em /api/hostinfo
+PORTA = int(os.environ.get('AIA_PORT', '5000'))
+
+# Tamanho máximo do upload (MB); 0 desativa o limite
+MAX_UPLOAD_MB = int(os.environ.get('AIA_MAX_UPLOAD_MB', '512'))
+MAX_UPLOAD_BYTES = MAX_UPLOAD_MB * 1024 * 1024
+
+
+class _ArquivoUpload:
+    """Destino de um arquivo enviado: grava em partes direto em um arquivo temporário único,
+    calculando o SHA-256 e impondo o tamanho máximo enquanto o corpo é recebido."""
+
+    def __init__(self, filename):
+        suffix = Path(secure_filename(filename or '')).suffix
+        fd, nome = tempfile.mkstemp(dir=DATA_DIR, prefix='upload_', suffix=suffix)
+        self.caminho = Path(nome)
+        self.manter = False  # True quando outro dono (ex.: job assíncrono) remove o arquivo
+        self.tamanho = 0
+        self._fh = os.fdopen(fd, 'w+b')
+        self._hash = hashlib.sha256()
+
+    def write(self, dados):
+        self.tamanho += len(dados)
+        if MAX_UPLOAD_BYTES and self.tamanho > MAX_UPLOAD_BYTES:
+            raise RequestEntityTooLarge(f"Arquivo maior que o limite de {MAX_UPLOAD_MB} MB.")
+        self._hash.update(dados)
+        return self._fh.write(dados)
+
+    def seek(self, *args):
+        return self._fh.seek(*args)
+
+    def tell(self):
+        return self._fh.tell()
+
+    def read(self, *args):
+        return self._fh.read(*args)
+
+    def flush(self):
+        return self._fh.flush()
+
+    def close(self):
+        self._fh.close()
+
+    @property
+    def sha256(self):
+        return self._hash.hexdigest()
+
+
+class _RequestUpload(Request):
+    """Request que grava os arquivos do multipart direto em _ArquivoUpload (sem buffer extra)."""
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        upload = _ArquivoUpload(filename)
+        g.setdefault('uploads', []).append(upload)
+        return upload
+
+
+app = Flask(__name__, static_folder='frontend', static_url_path='')
+app.request_class = _RequestUpload
+if MAX_UPLOAD_BYTES:
+    app.config['MAX_CONTENT_LENGTH'] = MAX_UPLOAD_BYTES
+
+
+# ============================================================================
+# MÉTRICAS (expostas em /metrics no formato do Prometheus)
+# ============================================================================
+
+_REQUISICOES = Contador('aia_http_requisicoes_total', 'Requisições HTTP por rota, método e status.',
+                        ('rota', 'metodo', 'status'))
+_LATENCIA = Histograma('aia_http_latencia_segundos', 'Latência das requisições HTTP por rota.', ('rota',))
+_EM_ANDAMENTO = Medidor('aia_http_requisicoes_em_andamento', 'Requisições HTTP sendo atendidas agora.')
+_BYTES_ENTRADA = Contador('aia_bytes_entrada_total', 'Bytes de arquivos recebidos por upload.', ('rota',))
+_LINHAS = Contador('aia_linhas_processadas_total', 'Linhas processadas com sucesso.', ('formato',))
+_LOTES = Contador('aia_lotes_gravados_total', 'Lotes (arquivos de saída) gravados.', ('formato',))
+_PROCESSAMENTOS = Histograma('aia_processamento_segundos', 'Duração de cada processamento de planilha.',
+                             ('formato', 'status'))
+_ETAPAS = Contador('aia_etapa_segundos_total', 'Tempo acumulado por etapa do processamento.', ('etapa',))
+_FALHAS = Contador('aia_falhas_total', 'Processamentos com falha, por motivo.', ('motivo',))
+Medidor('aia_jobs', 'Jobs assíncronos registrados, por status (na_fila e processando estão em andamento).',
+        ('status',), funcao=contar_jobs)
+
+
+def _rota_atual():
+    return request.url_rule.rule if request.url_rule else 'nao_encontrada'
+
+
+@app.before_request
+def _iniciar_metricas():
+    g.inicio_requisicao = time.perf_counter()
+    _EM_ANDAMENTO.inc()
+
+
+@app.after_request
+def _registrar_metricas(response):
+    inicio = g.get('inicio_requisicao')
+    if inicio is not None:
+        rota = _rota_atual()
+        _REQUISICOES.inc(rota=rota, metodo=request.method, status=response.status_code)
+        _LATENCIA.observar(time.perf_counter() - inicio, rota=rota)
+    return response
+
+
+@app.teardown_request
+def _finalizar_metricas(exc=None):
+    if g.pop('inicio_requisicao', None) is not None:
+        _EM_ANDAMENTO.dec()
+
+
+# Valores do rótulo 'formato' (o output_format vem do formulário: qualquer outro vira 'outro',
+# para um valor arbitrário não criar uma série nova a cada requisição)
+FORMATOS_METRICAS = ('lista', 'planilha')
+
+
+def _rotulo_formato(output_format):
+    formato = str(output_format).strip().lower()
+    return formato if formato in FORMATOS_METRICAS else 'outro'
+
+
+def _processar_com_metricas(*args, **kwargs):
+    """processar_arquivo_excel registrando linhas, lotes, duração, etapas e falhas nas métricas."""
+    result = processar_arquivo_excel(*args, **kwargs)
+    formato = _rotulo_formato(kwargs.get('output_format', 'planilha'))
+    timings = result.get('timings') or {}
+    _PROCESSAMENTOS.observar(timings.get('total_segundos', 0), formato=formato,
+                             status='sucesso' if result.get('success') else 'falha')
+    for etapa, medida in (timings.get('etapas') or {}).items():
+        _ETAPAS.inc(medida['segundos'], etapa=etapa)
+    if result.get('success'):
+        _LINHAS.inc(result.get('total_lines') or 0, formato=formato)
+        _LOTES.inc(result.get('total_files') or 0, formato=formato)
+    else:
+        _FALHAS.inc(motivo=result.get('motivo_falha', 'outro'))
+    return result
+
+
+@app.teardown_request
+def _remover_uploads(exc=None):
+    """Remove os arquivos temporários do request (exceto os entregues a um job)."""
+    for upload in g.pop('uploads', []):
+        try:
+            upload.close()
+        except Exception:
+            pass
+        if not upload.manter:
+            try:
+                os.remove(upload.caminho)
+            except Exception:
+                pass
+
+
+@app.errorhandler(RequestEntityTooLarge)
+def _upload_grande_demais(e):
+    limite = f" (limite: {MAX_UPLOAD_MB} MB)" if MAX_UPLOAD_MB else ""
+    return jsonify({"success": False, "error": f"Arquivo grande demais{limite}."}), 413
+
+
+def _arquivo_enviado(f):
+    """Retorna o _ArquivoUpload já gravado em disco para o arquivo `f` do request."""
+    upload = f.stream
+    if not isinstance(upload, _ArquivoUpload):
+        # não deveria ocorrer (o Request grava todos os arquivos via _ArquivoUpload)
+        upload = _ArquivoUpload(f.filename)
+        g.setdefault('uploads', []).append(upload)
+        f.save(upload)
+    upload.flush()
+    upload.close()
+    _BYTES_ENTRADA.inc(upload.tamanho, rota=_rota_atual())
+    return upload
+
 @app.route('/')
 def index():
     return send_from_directory(app.static_folder, 'index.html')
@@ -25,19 +201,76 @@ def index():
 def static_files(filename):
     return send_from_directory(app.static_folder, filename)
 
+def _resposta_zip(result):
+    """Envia o ZIP gerado pelo processamento em partes (chunked), sem carregá-lo inteiro na memória."""
+    zip_file = result.pop('zip_file')
+
+    def _gerar():
+        try:
+            while True:
+                parte = zip_file.read(64 * 1024)
+                if not parte:
+                    break
+                yield parte
+        finally:
+            zip_file.close()
+
+    headers = {
+        'Content-Disposition': f'attachment; filename="{result["zip_name"]}"',
+        'X-Total-Files': str(result['total_files']),
+        'X-Total-Lines': str(result['total_lines']),
+    }
+    # tempos por etapa no cabeçalho padrão Server-Timing (o corpo é o próprio ZIP)
+    etapas = (result.get('timings') or {}).get('etapas') or {}
+    if etapas:
+        headers['Server-Timing'] = ', '.join(f"{nome};dur={m['segundos'] * 1000:.1f}" for nome, m in etapas.items())
+    return Response(_gerar(), mimetype='application/zip', headers=headers)
+
+
 @app.route('/api/processar', methods=['POST'])
 def api_processar():
     try:
         if 'file' not in request.files:
             return jsonify({"success": False, "error": "Arquivo não enviado."}), 400
-        f = request.files['file']
-        if f.filename == '':
+        # um ou mais arquivos no campo 'file' (modo multi-arquivo: uma única sequência de lotes)
+        arquivos = request.files.getlist('file')
+        if any(f.filename == '' for f in arquivos):
             return jsonify({"success": False, "error": "Arquivo sem nome."}), 400
+        # ordem de concatenação: 'envio' (ordem recebida, padrão) ou 'nome'
+        ordem = request.form.get('ordem', 'envio').strip().lower()
+        if ordem not in ('envio', 'nome'):
+            return jsonify({"success": False, "error": "Parâmetro 'ordem' inválido (use 'envio' ou 'nome')."}), 400
+        if ordem == 'nome':
+            arquivos.sort(key=lambda f: f.filename.lower())
 
         action = request.form.get('action', 'criar')
         company = request.form.get('company', '')
         batchSize = request.form.get('batchSize', '')
         output_format = request.form.get('output_format', 'planilha')
+        # modo streaming (memória constante para planilhas muito grandes)
+        streaming = request.form.get('streaming', '').strip().lower() in ('1', 'true', 'on', 'sim')
+        # modo assíncrono: retorna um job_id imediatamente e processa em segundo plano
+        assincrono = request.form.get('async', '').strip().lower() in ('1', 'true', 'on', 'sim')
+        # entrega dos lotes: 'base64' (JSON com files_data) ou 'zip' (ZIP enviado direto na resposta)
+        entrega = request.form.get('entrega', 'base64').strip().lower()
+        if entrega not in ('base64', 'zip'):
+            return jsonify({"success": False, "error": "Parâmetro 'entrega' inválido (use 'base64' ou 'zip')."}), 400
+        if entrega == 'zip' and assincrono:
+            return jsonify({"success": False, "error": "A entrega em ZIP não está disponível no modo assíncrono."}), 400
+        # deduplicação: '' (desligada), 'primeiro', 'ultimo' ou 'conflito'
+        deduplicar = request.form.get('deduplicar', '').strip().lower() or None
+        if deduplicar and deduplicar not in POLITICAS_DEDUP:
+            return jsonify({"success": False, "error": f"Parâmetro 'deduplicar' inválido (use {', '.join(POLITICAS_DEDUP)})."}), 400
+        # ignora números já exportados antes pela empresa (índice persistido por empresa/ação)
+        usar_indice = request.form.get('indice_empresa', '').strip().lower() in ('1', 'true', 'on', 'sim')
+        # validação de telefone/DDD/CPF/CNPJ (linhas inválidas vão para o arquivo de rejeitados)
+        validar = request.form.get('validar', '').strip().lower() in ('1', 'true', 'on', 'sim')
+        # modo delta: só o que mudou desde a última exportação da empresa (não vale no streaming)
+        delta = request.form.get('delta', '').strip().lower() in ('1', 'true', 'on', 'sim')
+        if delta and streaming:
+            return jsonify({"success": False, "error": "O modo delta não está disponível no modo streaming."}), 400
+        # abas das pastas de trabalho: nenhuma (só a primeira), 'todas' ou um campo 'abas' por nome
+        abas = [a for a in request.form.getlist('abas') if a.strip()] or None
         # mapeamento explícito enviado pelo frontend (opcional)
         explicit_mapping = {
             'numero_col': request.form.get('numero_col', '') or None,
@@ -49,10 +282,16 @@ def api_processar():
             if not explicit_mapping[k]:
                 explicit_mapping[k] = None
 
-        # salva arquivo temporariamente em data/
-        filename = secure_filename(f.filename)
-        temp_path = DATA_DIR / filename
-        f.save(str(temp_path))
+        # os arquivos já foram gravados em data/ (nomes únicos) durante o recebimento do corpo
+        uploads = [_arquivo_enviado(f) for f in arquivos]
+        if len(uploads) == 1:
+            entrada = str(uploads[0].caminho)
+            hashes = uploads[0].sha256
+            nomes = arquivos[0].filename
+        else:
+            entrada = [str(u.caminho) for u in uploads]
+            hashes = [u.sha256 for u in uploads]
+            nomes = [f.filename for f in arquivos]
 
         # determina pasta base de saída (opcional) fornecida pelo usuário
         output_base = request.form.get('outputBase', '').strip()
@@ -68,24 +307,91 @@ def api_processar():
         else:
             pasta_base = str(BASE_DIR)
 
-        # chama a função de processamento
-        result = processar_arquivo_excel(str(temp_path), action, company, batchSize, pasta_base, explicit_mapping, output_format=output_format)
+        if assincrono:
+            def _remover_temp():
+                for upload in uploads:
+                    try:
+                        os.remove(upload.caminho)
+                    except OSError:
+                        pass
 
-        # opcional: remover arquivo temporário
-        try:
-            os.remove(temp_path)
-        except Exception:
-            pass
+            # o job passa a ser o dono dos arquivos temporários
+            for upload in uploads:
+                upload.manter = True
+            try:
+                job_id = criar_job(_processar_com_metricas, entrada, action, company, batchSize, pasta_base,
+                                   explicit_mapping, output_format=output_format, streaming=streaming,
+                                   hash_conteudo=hashes, nome_arquivo=nomes, deduplicar=deduplicar,
+                                   usar_indice=usar_indice, validar=validar, delta=delta, abas=abas,
+                                   ao_finalizar=_remover_temp)
+            except RuntimeError as e:
+                # servidor encerrando: os arquivos voltam a ser removidos ao fim do request
+                for upload in uploads:
+                    upload.manter = False
+                return jsonify({"success": False, "error": str(e)}), 503
+            return jsonify({"success": True, "job_id": job_id, "status_url": f"/api/jobs/{job_id}"}), 202
+
+        # chama a função de processamento (os arquivos temporários são removidos ao fim do request)
+        result = _processar_com_metricas(entrada, action, company, batchSize, pasta_base, explicit_mapping, output_format=output_format, streaming=streaming, entrega=entrega, hash_conteudo=hashes, nome_arquivo=nomes, deduplicar=deduplicar, usar_indice=usar_indice, validar=validar, delta=delta, abas=abas)
 
+        if result.get('success') and entrega == 'zip':
+            return _resposta_zip(result)
         if result.get('success'):
             return jsonify(result)
         else:
             return jsonify(result), 500
 
+    except RequestEntityTooLarge:
+        raise
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 500
 
 
+@app.route('/api/inspect', methods=['POST'])
+def api_inspect():
+    """Lê só o cabeçalho e as primeiras linhas do arquivo enviado.
+
+    Retorna total de linhas, colunas, mapeamento detectado, prévia e previsão de lotes.
+    O cliente pode enviar só o início do arquivo em `file`, com `tamanho_total` (tamanho do
+    arquivo original) e, nos formatos binários, o fim em `file_fim`; se as partes não
+    bastarem, a resposta (422) traz `arquivo_completo` e o arquivo inteiro deve ser reenviado.
+    """
+    try:
+        if 'file' not in request.files:
+            return jsonify({"success": False, "error": "Arquivo não enviado."}), 400
+        f = request.files['file']
+        if f.filename == '':
+            return jsonify({"success": False, "error": "Arquivo sem nome."}), 400
+
+        upload = _arquivo_enviado(f)
+        tamanho_total = request.form.get('tamanho_total', type=int)
+        if tamanho_total is not None and tamanho_total <= upload.tamanho:
+            # o arquivo veio inteiro
+            tamanho_total = None
+        if tamanho_total is not None and MAX_UPLOAD_BYTES and tamanho_total > MAX_UPLOAD_BYTES:
+            raise RequestEntityTooLarge(f"Arquivo maior que o limite de {MAX_UPLOAD_MB} MB.")
+        fim = _arquivo_enviado(request.files['file_fim']) if tamanho_total and 'file_fim' in request.files else None
+        result = inspecionar_arquivo(str(upload.caminho), request.form.get('linhas', 5),
+                                     request.form.get('batchSize') or None, tamanho_total=tamanho_total,
+                                     caminho_fim=str(fim.caminho) if fim else None)
+        if result.get('success'):
+            return jsonify(result)
+        return jsonify(result), 422
+    except RequestEntityTooLarge:
+        raise
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def api_job_status(job_id):
+    """Retorna status, linhas processadas, lotes gravados, ETA e (ao final) o resultado do job."""
+    job = obter_job(job_id)
+    if job is None:
+        return jsonify({"success": False, "error": "Job não encontrado."}), 404
+    return jsonify({"success": True, **job})
+
+
 @app.route('/api/download_zip', methods=['POST'])
 def api_download_zip():
     """Compacta a pasta solicitada e retorna um ZIP para download.
@@ -118,6 +424,12 @@ def api_download_zip():
         return jsonify({"success": False, "error": str(e)}), 500
 
 
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Métricas do processo no formato de exposição do Prometheus."""
+    return Response(exportar_metricas(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
 @app.route('/api/hostinfo', methods=['GET'])
 def api_hostinfo():
     """Retorna IPs IPv4 do host para montar um link de rede."""
@@ -145,9 +457,21 @@ def api_hostinfo():
 
         # dedupe
         ips = list(dict.fromkeys(ips))
-        return jsonify({"success": True, "ips": ips, "port": 5000})
+        return jsonify({"success": True, "ips": ips, "port": PORTA})
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 500
 
+def encerrar_servidor(timeout=None):
+    """Encerramento gracioso: recusa novos jobs, aguarda os pendentes (até `timeout` s) e fecha os pools."""
+    restantes = encerrar_jobs(timeout)
+    if restantes:
+        print(f"✗ Aviso: {restantes} job(s) não terminaram dentro de {timeout}s.")
+    encerrar_pools_escrita()
+    return restantes
+
+
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5000, debug=True)
+    # necessário para o pool de processos de escrita quando empacotado como executável
+    multiprocessing.freeze_support()
+    # servidor de desenvolvimento; em produção use wsgi.py (waitress/gunicorn)
+    app.run(host='0.0.0.0', port=PORTA, debug=DEBUG)
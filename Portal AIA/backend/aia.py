@@ -1,10 +1,29 @@
 import os
 import sys
 import re
+import numpy as np
 import pandas as pd
 from pathlib import Path
 import base64
 import csv
+import hashlib
+import json
+import io
+import shutil
+import tempfile
+import threading
+import time
+import zipfile
+import xml.etree.ElementTree as ET
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import multiprocessing
+
+try:
+    from .instrumentacao import Medicao, SEM_MEDICAO, registrar_log
+except ImportError:  # executado como script (python aia.py)
+    from instrumentacao import Medicao, SEM_MEDICAO, registrar_log
 
 
 def _normalize_col(name: str) -> str:
@@ -24,11 +43,13 @@ def _normalize_col(name: str) -> str:
     return s
 
 
-def _find_column(df, alternatives):
+def _find_column(df, alternatives, norm_map=None):
     """Procura uma coluna no DataFrame a partir de alternativas (lista de nomes possíveis).
-    Retorna o nome real da coluna ou None.
+    Retorna o nome real da coluna ou None. `norm_map` ({coluna: nome normalizado}) pode ser
+    passado para não normalizar os nomes a cada chamada.
     """
-    norm_map = {col: _normalize_col(col) for col in df.columns}
+    if norm_map is None:
+        norm_map = {col: _normalize_col(col) for col in df.columns}
     alts_norm = [_normalize_col(a) for a in alternatives]
     for real, norm in norm_map.items():
         if norm in alts_norm:
@@ -64,6 +85,19 @@ else:
     CAMINHO_ARQUIVO = SCRIPT_DIR / NOME_ARQUIVO_ORIGINAL
     PASTA_SAIDA = SCRIPT_DIR / "PORTAL AIA"  # valor padrão — será sobrescrito em tempo de execução para uploads_<empresa>
 TAMANHO_LOTE = 100
+
+# Diretório dos caches persistentes (mapeamento de colunas etc.)
+DIR_CACHE = Path(os.environ.get('AIA_DIR_CACHE', SCRIPT_DIR / "data"))
+# Quantidade máxima de layouts de cabeçalho lembrados no cache de mapeamento (LRU)
+CACHE_MAPEAMENTO_MAX = 256
+# Cache de resultados por hash do conteúdo: ativo por padrão e limitado em tamanho (MB)
+CACHE_RESULTADOS = os.environ.get('AIA_CACHE_RESULTADOS', '1').strip().lower() not in ('0', 'false', 'nao', 'não')
+CACHE_RESULTADOS_MAX_MB = int(os.environ.get('AIA_CACHE_RESULTADOS_MB', '512'))
+# Versão da leitura/normalização gravada na chave do cache de resultados: incremente sempre
+# que a leitura dos arquivos ou a normalização mudar o df normalizado. As entradas das
+# versões anteriores deixam de ser encontradas e saem do cache pela evicção por tamanho.
+VERSAO_CACHE = 2
+
 # ============================================================================
 # FUNÇÃO PARA CRIAR PASTA
 # ============================================================================
@@ -107,11 +141,10 @@ def carregar_dados():
         suffix = caminho.suffix.lower()
         df = None
         if suffix in ('.csv',):
-            # leitura direta de CSV (tenta autodetectar separador)
-            try:
-                df = pd.read_csv(caminho, sep=None, engine='python')
-            except Exception:
-                df = pd.read_csv(caminho, encoding='utf-8', sep=';')
+            # leitura direta de CSV (autodetecta o separador e usa o parser em C)
+            df = _ler_csv(caminho, todas_colunas=True)
+        elif suffix in EXTENSOES_COLUNARES:
+            df = pd.read_parquet(caminho) if suffix == '.parquet' else pd.read_feather(caminho)
         else:
             # para arquivos Excel, escolhe engine apropriado
             engine = None
@@ -127,10 +160,7 @@ def carregar_dados():
                     df = pd.read_excel(caminho)
             except Exception:
                 # fallback: alguns arquivos salvos com extensão Excel podem ser CSVs
-                try:
-                    df = pd.read_csv(caminho, sep=None, engine='python')
-                except Exception:
-                    raise
+                df = _ler_csv(caminho, todas_colunas=True)
 
         # Padroniza nomes das colunas para minúsculas e remove espaços
         df.columns = df.columns.str.lower().str.strip()
@@ -159,117 +189,344 @@ def carregar_dados():
 # FUNÇÃO PARA DIVIDIR E SALVAR ARQUIVOS
 # ============================================================================
 
-def selecionar_e_formatar_dados(df, explicit_mapping=None):
+# Linhas usadas para detectar o delimitador de um CSV inteiro em uma coluna
+AMOSTRA_COLUNA_UNICA = 200
+# Títulos (normalizados) que identificam a linha de cabeçalho nesse caso
+_TITULOS_COLUNA_UNICA = ('numero', 'acao', 'cnpj', 'cpfcnpj', 'taxid', 'did', 'telefone', 'tel', 'cpf')
+
+
+def _detectar_delimitador_coluna(valores):
+    """Detecta o delimitador nas primeiras linhas da coluna (csv.Sniffer), ou None.
+
+    Se o Sniffer não decidir (ex.: uma única linha), vale a regra simples: o primeiro de
+    ',', ';' e tab presente na primeira linha.
+    """
+    amostra = [v for v in valores[:AMOSTRA_COLUNA_UNICA] if v]
+    if not amostra:
+        return None
+    try:
+        return csv.Sniffer().sniff('\n'.join(amostra), delimiters=',;\t|').delimiter
+    except csv.Error:
+        pass
+    for d in [',', ';', '\t']:
+        if d in amostra[0]:
+            return d
+    return None
+
+
+def _ler_linhas_csv(valores, delim):
+    """Interpreta as linhas (lista de str) como CSV, uma linha de dados por item.
+
+    As linhas são unidas em um único buffer e lidas por um parser compilado: primeiro o
+    pyarrow.csv (se instalado; todos os campos como texto), que só aceita linhas com o
+    mesmo número de campos da amostra; senão o parser em C do pandas, com tantas colunas
+    quanto o maior número de campos. Colunas numeradas (0, 1, ...); campos ausentes ou
+    vazios viram ''.
+    """
+    if not valores:
+        return pd.DataFrame(columns=[0], dtype=str)
+    texto = '\n'.join(valores) + '\n'
+    try:
+        import pyarrow as pa
+        import pyarrow.csv as pa_csv
+        n_campos = max(v.count(delim) for v in valores[:AMOSTRA_COLUNA_UNICA]) + 1
+        nomes = [str(i) for i in range(n_campos)]
+        tabela = pa_csv.read_csv(
+            io.BytesIO(texto.encode('utf-8')),
+            read_options=pa_csv.ReadOptions(column_names=nomes),
+            parse_options=pa_csv.ParseOptions(delimiter=delim, ignore_empty_lines=False),
+            convert_options=pa_csv.ConvertOptions(column_types={n: pa.string() for n in nomes},
+                                                  strings_can_be_null=False, quoted_strings_can_be_null=False),
+        )
+        dividido = tabela.to_pandas()
+        dividido.columns = range(n_campos)
+        return dividido
+    except Exception:
+        pass
+    # aspas podem superestimar os campos; as colunas vazias que sobram são descartadas depois
+    n_campos = max(v.count(delim) for v in valores) + 1
+    return pd.read_csv(io.StringIO(texto), sep=delim, header=None, names=range(n_campos), dtype=str,
+                       keep_default_na=False, skip_blank_lines=False, engine='c')
+
+
+def _e_cabecalho(campos):
+    return any(_normalize_col(c) in _TITULOS_COLUNA_UNICA for c in campos)
+
+
+def _dividir_coluna_unica(df, delim=None, colunas=None):
+    """Divide um DataFrame de coluna única que contém um CSV inteiro (ex.: 'numero,acao,cnpj').
+
+    A coluna é relida como CSV de verdade (_ler_linhas_csv): as linhas são unidas em um
+    buffer e passam pelo parser do pandas, respeitando campos entre aspas (ex.: um CNPJ
+    com o delimitador), em vez de um split linha a linha.
+    O delimitador vem de uma amostra das linhas. Os títulos vêm do nome da coluna (quando o
+    cabeçalho da planilha já é a linha 'numero;acao;cnpj') ou da primeira linha; sem títulos
+    reconhecíveis as colunas viram col1, col2, ...
+
+    Quando `delim`/`colunas` já são conhecidos (ex.: blocos seguintes de uma leitura em
+    fluxo), a detecção é pulada. Retorna (df, delim, colunas); se nenhum delimitador for
+    encontrado o DataFrame é devolvido sem alterações e delim é None.
+    """
+    if df.shape[1] != 1:
+        return df, delim, colunas
+    nome = df.columns[0]
+    serie = df.iloc[:, 0]
+    valores = serie.astype(str).where(serie.notna(), '')
+    # quebras de linha dentro de uma célula desalinhariam as linhas do buffer
+    if valores.str.contains('[\r\n]', regex=True).any():
+        valores = valores.str.replace('[\r\n]+', ' ', regex=True)
+    linhas = valores.tolist()
+    if delim is None:
+        delim = _detectar_delimitador_coluna(linhas)
+    if not delim:
+        return df, None, colunas
+
+    dividido = _ler_linhas_csv(linhas, delim)
+    n_campos = dividido.shape[1]
+
+    if colunas is None:
+        titulos = None
+        if isinstance(nome, str) and delim in nome:
+            campos = [c.strip() for c in next(csv.reader([nome], delimiter=delim))]
+            if _e_cabecalho(campos):
+                titulos = campos
+        if titulos is None and len(dividido):
+            # checar se primeira linha é header (contém palavras como 'numero'/'acao'/'cnpj')
+            campos = ['' if pd.isna(c) else c.strip() for c in dividido.iloc[0].tolist()]
+            if _e_cabecalho(campos):
+                titulos = campos
+                dividido = dividido.iloc[1:].reset_index(drop=True)
+        titulos = titulos or []
+        # campos vazios no fim dos títulos vêm das colunas a mais contadas com as aspas
+        while titulos and not titulos[-1]:
+            titulos.pop()
+        usados = n_campos
+        while usados > max(len(titulos), 1) and not (dividido[usados - 1].fillna('') != '').any():
+            usados -= 1
+        # cria nomes genéricos para as colunas sem título
+        colunas = _nomes_unicos(titulos + [f'col{i+1}' for i in range(len(titulos), usados)])
+
+    # bloco subsequente: reaproveita os nomes já definidos no primeiro bloco
+    dividido = dividido.reindex(columns=range(len(colunas)))
+    dividido.columns = colunas
+    return dividido, delim, list(colunas)
+
+
+# ============================================================================
+# CACHE DE MAPEAMENTO DE COLUNAS (POR ASSINATURA DO CABEÇALHO)
+# ============================================================================
+
+_cache_mapeamento = None
+_cache_mapeamento_lock = threading.Lock()
+# Nos processos do pool de leitura as entradas novas são acumuladas aqui (em vez de gravadas)
+# e devolvidas ao processo principal, único que grava cache_mapeamentos.json
+_cache_mapeamento_adiado = None
+
+
+def _arquivo_cache_mapeamento():
+    return DIR_CACHE / 'cache_mapeamentos.json'
+
+
+def _assinatura_cabecalho(nomes_normalizados):
+    """Hash do cabeçalho normalizado (ordem das colunas incluída)."""
+    return hashlib.sha1(json.dumps(nomes_normalizados).encode('utf-8')).hexdigest()
+
+
+def _carregar_cache_mapeamento():
+    """Carrega (uma vez) o cache do disco; deve ser chamado com o lock adquirido."""
+    global _cache_mapeamento
+    if _cache_mapeamento is None:
+        _cache_mapeamento = OrderedDict()
+        try:
+            with open(_arquivo_cache_mapeamento(), 'r', encoding='utf-8') as fh:
+                _cache_mapeamento.update(json.load(fh))
+        except Exception:
+            pass
+    return _cache_mapeamento
+
+
+def _consultar_cache_mapeamento(assinatura):
+    """Retorna a entrada do cache ({'numero': idx, 'cnpj': idx, 'acao': idx|None, 'confirmado': bool}) ou None."""
+    with _cache_mapeamento_lock:
+        cache = _carregar_cache_mapeamento()
+        entrada = cache.get(assinatura)
+        if entrada is not None:
+            cache.move_to_end(assinatura)
+        return entrada
+
+
+def _gravar_cache_mapeamento(assinatura, entrada):
+    """Grava a entrada (LRU: remove os layouts menos usados acima de CACHE_MAPEAMENTO_MAX)."""
+    if _cache_mapeamento_adiado is not None:
+        _cache_mapeamento_adiado.append((assinatura, entrada))
+        return
+    with _cache_mapeamento_lock:
+        cache = _carregar_cache_mapeamento()
+        if cache.get(assinatura) == entrada:
+            cache.move_to_end(assinatura)
+            return
+        cache[assinatura] = entrada
+        cache.move_to_end(assinatura)
+        while len(cache) > CACHE_MAPEAMENTO_MAX:
+            cache.popitem(last=False)
+        try:
+            arquivo = _arquivo_cache_mapeamento()
+            arquivo.parent.mkdir(parents=True, exist_ok=True)
+            tmp = arquivo.with_suffix('.tmp')
+            with open(tmp, 'w', encoding='utf-8') as fh:
+                json.dump(cache, fh)
+            os.replace(tmp, arquivo)
+        except Exception as e:
+            print(f"✗ Aviso: não foi possível gravar o cache de mapeamento: {e}")
+
+
+def _resolver_mapeamento(df, explicit_mapping=None, usar_cache=True):
+    """Identifica as colunas originais de 'numero', 'cnpj' e 'acao'.
+
+    Layouts de cabeçalho já vistos são resolvidos pelo cache (posições das colunas), sem
+    detecção; o mapeamento explícito informado pelo usuário é gravado como confirmado e
+    reaproveitado nas próximas planilhas com o mesmo cabeçalho.
+    Retorna (numero_col, cnpj_col, acao_col); levanta ValueError se 'numero' ou
+    'cnpj' não forem encontradas.
+    """
+    colunas = list(df.columns)
+    norm_map = {col: _normalize_col(col) for col in colunas}
+    assinatura = _assinatura_cabecalho([norm_map[c] for c in colunas]) if usar_cache else None
+
+    # se explicit_mapping foi fornecido, tente usar os nomes indicados
+    numero_col = None
+    cnpj_col = None
+    acao_col = None
+    if explicit_mapping and isinstance(explicit_mapping, dict):
+        num_try = explicit_mapping.get('numero') or explicit_mapping.get('numero_col')
+        cnpj_try = explicit_mapping.get('cnpj') or explicit_mapping.get('cnpj_col')
+        acao_try = explicit_mapping.get('acao') or explicit_mapping.get('acao_col')
+        if num_try and num_try in df.columns:
+            numero_col = num_try
+        if cnpj_try and cnpj_try in df.columns:
+            cnpj_col = cnpj_try
+        if acao_try and acao_try in df.columns:
+            acao_col = acao_try
+    confirmado = bool(numero_col or cnpj_col or acao_col)
+
+    # sem mapeamento explícito: um layout já conhecido dispensa a detecção
+    if assinatura and not confirmado:
+        entrada = _consultar_cache_mapeamento(assinatura)
+        if entrada:
+            try:
+                acao_idx = entrada.get('acao')
+                return (colunas[entrada['numero']], colunas[entrada['cnpj']],
+                        colunas[acao_idx] if acao_idx is not None else None)
+            except (IndexError, KeyError, TypeError):
+                pass
+
+    # se algum não foi fornecido/validado, tenta detecção automática
+    if not numero_col:
+        numero_col = _find_column(df, ['numero', 'num', 'did', 'id', 'numeroid', 'msisdn', 'telefone', 'telefone1', 'telefone2', 'tel', 'phone', 'celular', 'mobile'], norm_map)
+    if not cnpj_col:
+        cnpj_col = _find_column(df, ['cnpj', 'cpf/cnpj', 'cpfcnpj', 'cpf', 'taxid', 'taxidnumber', 'documento'], norm_map)
+    if not acao_col:
+        acao_col = _find_column(df, ['acao', 'action', 'operacao', 'operacao'], norm_map)
+
+    if not numero_col or not cnpj_col:
+        print(f"✗ Erro: Colunas necessárias não encontradas. Esperadas algo como 'numero' e 'cnpj'.")
+        print(f"   Colunas disponíveis: {df.columns.tolist()}")
+        # ao invés de sair, retorna erro controlado
+        raise ValueError(f"Colunas necessárias faltando. Disponíveis: {df.columns.tolist()}")
+
+    if assinatura:
+        _gravar_cache_mapeamento(assinatura, {
+            'numero': colunas.index(numero_col),
+            'cnpj': colunas.index(cnpj_col),
+            'acao': colunas.index(acao_col) if acao_col else None,
+            'confirmado': confirmado,
+        })
+    return numero_col, cnpj_col, acao_col
+
+
+def _normalizar_numeros(serie):
+    """Normaliza a coluna 'numero' de forma vetorizada (operações de string do pandas).
+
+    Remove quaisquer caracteres não-dígitos, remove prefixos de acesso internacional
+    '00' repetidos e o código de país '55' quando o restante tem mais de 8 dígitos.
+    Valores nulos são preservados como nulos.
+    """
+    nulos = serie.isna()
+    # remove tudo que não for dígito
+    s = serie.astype(str).str.replace(r'\D', '', regex=True)
+    # remover prefixos de acesso internacional repetidos, ex: '00'
+    s = s.str.replace(r'^(?:00)+', '', regex=True)
+    # remover código de país BR '55' se presente e o restante parecer ter DDD+numero
+    com_ddi = s.str.startswith('55') & (s.str.len() > 8)
+    s = s.where(~com_ddi, s.str.slice(2))
+    return s.mask(nulos)
+
+
+def _inteiros_sem_decimal(serie):
+    """Coluna float só com valores inteiros (o pandas lê assim uma coluna numérica com células
+    vazias) como Int64: sem isso o texto seria '11987654321.0' e o '0' viraria mais um dígito."""
+    if pd.api.types.is_float_dtype(serie):
+        valores = serie.dropna()
+        if (valores % 1 == 0).all():
+            return serie.astype('Int64')
+    return serie
+
+
+def _formatar_colunas(df, numero_col, cnpj_col, acao_col):
+    """Seleciona as colunas já mapeadas, renomeia para o padrão e normaliza os valores."""
+    # Seleciona as colunas encontradas e renomeia para os nomes padrão
+    cols_to_take = [numero_col, cnpj_col]
+    if acao_col:
+        cols_to_take.insert(1, acao_col)
+    df_selected = df[cols_to_take].copy()
+    rename_map = {numero_col: 'numero', cnpj_col: 'cnpj'}
+    if acao_col:
+        rename_map[acao_col] = 'acao'
+    df_selected = df_selected.rename(columns=rename_map)
+
+    # Se não existe coluna 'acao', crie e preencha com valor global (se existir)
+    if 'acao' not in df_selected.columns:
+        user_action = globals().get('SELECTED_ACTION')
+        fill_val = user_action if user_action else ''
+        df_selected['acao'] = fill_val
+
+    # Limpeza e normalização do campo 'numero' (vetorizada)
+    df_selected['numero'] = _normalizar_numeros(_inteiros_sem_decimal(df_selected['numero']))
+
+    # Formata cada coluna
+    df_selected['numero'] = pd.to_numeric(df_selected['numero'], errors='coerce').astype('Int64')
+    df_selected['acao'] = df_selected['acao'].astype(str)
+    # remover pontuação de CPF/CNPJ (apenas dígitos)
+    df_selected['cnpj'] = _inteiros_sem_decimal(df_selected['cnpj']).astype(str).str.replace(r'\D', '', regex=True)
+
+    # Garante a ordem correta das colunas de saída
+    return df_selected[['numero', 'acao', 'cnpj']]
+
+
+def selecionar_e_formatar_dados(df, explicit_mapping=None, medicao=None, colunas_map=None):
     """Seleciona apenas as 3 colunas necessárias e formata com os tipos corretos.
 
     Retorna uma tupla (df_selected, mapping) onde mapping é um dict com as colunas
-    originais encontradas para 'numero', 'cnpj' e opcionalmente 'acao'.
+    originais encontradas para 'numero', 'cnpj' e opcionalmente 'acao'. `medicao`
+    (instrumentacao.Medicao) recebe os tempos de detecção e normalização. `colunas_map`
+    (numero, cnpj, acao) é o mapeamento já resolvido pelo cabeçalho (_mapeamento_do_cabecalho):
+    se as colunas existirem no df, dispensa uma nova resolução.
     """
+    medicao = medicao or SEM_MEDICAO
     try:
-        # caso o Excel tenha importado um CSV inteiro em UMA coluna (ex.: 'numero,acao,cnpj'),
-        # dividir essa coluna por delimitador comum e reconstruir o DataFrame
-        if df.shape[1] == 1:
-            first_val = None
-            if len(df) > 0:
-                first_val = df.iloc[0, 0]
-            # detectar delimitador simples
-            delim = None
-            for d in [',', ';', '\t']:
-                if isinstance(first_val, str) and d in first_val:
-                    delim = d
-                    break
-            if delim:
-                splitted = df[df.columns[0]].astype(str).str.split(delim, expand=True)
-                # checar se primeira linha é header (contém palavras como 'numero'/'acao'/'cnpj')
-                header_row = [s.strip() for s in splitted.iloc[0].tolist()]
-                header_norms = [_normalize_col(x) for x in header_row]
-                # aceita variações de telefone e cpf/cnpj
-                if any(h in ('numero', 'acao', 'cnpj', 'cpfcnpj', 'taxid', 'did', 'telefone', 'tel', 'cpf') for h in header_norms):
-                    # usa primeira linha como header
-                    new_df = splitted.copy()
-                    new_df.columns = header_row
-                    new_df = new_df.drop(index=0).reset_index(drop=True)
-                else:
-                    # cria nomes genéricos
-                    new_df = splitted
-                    new_df.columns = [f'col{i+1}' for i in range(new_df.shape[1])]
-                df = new_df
-
-        # tenta identificar colunas equivalentes
-        # se explicit_mapping foi fornecido, tente usar os nomes indicados
-        numero_col = None
-        cnpj_col = None
-        acao_col = None
-        if explicit_mapping and isinstance(explicit_mapping, dict):
-            num_try = explicit_mapping.get('numero') or explicit_mapping.get('numero_col')
-            cnpj_try = explicit_mapping.get('cnpj') or explicit_mapping.get('cnpj_col')
-            acao_try = explicit_mapping.get('acao') or explicit_mapping.get('acao_col')
-            if num_try and num_try in df.columns:
-                numero_col = num_try
-            if cnpj_try and cnpj_try in df.columns:
-                cnpj_col = cnpj_try
-            if acao_try and acao_try in df.columns:
-                acao_col = acao_try
-
-        # se algum não foi fornecido/validado, tenta detecção automática
-        if not numero_col:
-            numero_col = _find_column(df, ['numero', 'num', 'did', 'id', 'numeroid', 'msisdn', 'telefone', 'telefone1', 'telefone2', 'tel', 'phone', 'celular', 'mobile'])
-        if not cnpj_col:
-            cnpj_col = _find_column(df, ['cnpj', 'cpf/cnpj', 'cpfcnpj', 'cpf', 'taxid', 'taxidnumber', 'documento'])
-        if not acao_col:
-            acao_col = _find_column(df, ['acao', 'action', 'operacao', 'operacao'])
-        acao_col = _find_column(df, ['acao', 'action', 'operacao', 'operacao'])
-
-        if not numero_col or not cnpj_col:
-            print(f"✗ Erro: Colunas necessárias não encontradas. Esperadas algo como 'numero' e 'cnpj'.")
-            print(f"   Colunas disponíveis: {df.columns.tolist()}")
-            # ao invés de sair, retorna erro controlado
-            raise ValueError(f"Colunas necessárias faltando. Disponíveis: {df.columns.tolist()}")
-
-        # Seleciona as colunas encontradas e renomeia para os nomes padrão
-        df_selected = df.copy()
-        cols_to_take = [numero_col, cnpj_col]
-        if acao_col:
-            cols_to_take.insert(1, acao_col)
-        df_selected = df_selected[cols_to_take]
-        rename_map = {numero_col: 'numero', cnpj_col: 'cnpj'}
-        if acao_col:
-            rename_map[acao_col] = 'acao'
-        df_selected = df_selected.rename(columns=rename_map)
-
-
-        # Se não existe coluna 'acao', crie e preencha com valor global (se existir)
-        if 'acao' not in df_selected.columns:
-            user_action = globals().get('SELECTED_ACTION')
-            fill_val = user_action if user_action else ''
-            df_selected['acao'] = fill_val
-
-        # Limpeza e normalização do campo 'numero': remover quaisquer caracteres não-dígitos
-        # e remover prefixos internacionais como '00' e o código de país '55' caso existam
-        def _normalize_num(n):
-            if pd.isna(n):
-                return n
-            s = str(n)
-            # remove tudo que não for dígito
-            s = re.sub(r'\D', '', s)
-            # remover prefixos de acesso internacional repetidos, ex: '00'
-            while s.startswith('00'):
-                s = s[2:]
-            # remover código de país BR '55' se presente e o restante parecer ter DDD+numero
-            if s.startswith('55') and len(s) > 8:
-                s = s[2:]
-            return s
-
-        df_selected['numero'] = df_selected['numero'].apply(_normalize_num)
-
-        # Formata cada coluna
-        df_selected['numero'] = pd.to_numeric(df_selected['numero'], errors='coerce').astype('Int64')
-        df_selected['acao'] = df_selected['acao'].astype(str)
-        # remover pontuação de CPF/CNPJ (apenas dígitos)
-        df_selected['cnpj'] = df_selected['cnpj'].astype(str).str.replace(r'\D', '', regex=True)
-
-        # Garante a ordem correta das colunas de saída
-        df_selected = df_selected[['numero', 'acao', 'cnpj']]
+        with medicao.etapa('deteccao_colunas'):
+            # caso o Excel tenha importado um CSV inteiro em UMA coluna (ex.: 'numero,acao,cnpj'),
+            # dividir essa coluna por delimitador comum e reconstruir o DataFrame
+            df, _, _ = _dividir_coluna_unica(df)
+
+            # tenta identificar colunas equivalentes (se o upload ainda não tiver o mapeamento)
+            if _mapeamento_aplicavel(colunas_map, df.columns):
+                numero_col, cnpj_col, acao_col = colunas_map
+            else:
+                numero_col, cnpj_col, acao_col = _resolver_mapeamento(df, explicit_mapping)
+
+        with medicao.etapa('normalizacao'):
+            df_selected = _formatar_colunas(df, numero_col, cnpj_col, acao_col)
 
         mapping = {
             'numero': numero_col,
@@ -458,167 +715,2360 @@ if __name__ == "__main__":
     main()
 
 
-def processar_arquivo_excel(caminho_arquivo_entrada, acao, empresa_raw, tamanho_lote, pasta_base_saida, explicit_mapping=None, output_format='planilha'):
-    """
-    Função principal adaptada para ser chamada por uma API.
-    Recebe todos os parâmetros necessários e retorna um dicionário com o resultado.
+# ============================================================================
+# FUNÇÕES DE APOIO À API
+# ============================================================================
+
+# Quantidade de lotes lidos por bloco no modo streaming (o bloco tem LOTES_POR_BLOCO * tamanho_lote linhas)
+LOTES_POR_BLOCO = 20
+
+# Tamanho máximo (bytes) do ZIP de saída mantido em memória antes de ir para arquivo temporário
+ZIP_MAX_MEMORIA = 32 * 1024 * 1024
+
+# Serialização paralela dos lotes: quantidade de workers (1 = sequencial) e tipo de pool
+WORKERS_ESCRITA = int(os.environ.get('AIA_WORKERS_ESCRITA', '1'))
+POOL_ESCRITA = os.environ.get('AIA_POOL_ESCRITA', 'processos')
+# Leitura/normalização de vários arquivos (ou abas) enviados juntos: quantidade de workers e
+# tipo de pool. O padrão são threads: o pool de processos devolve cada DataFrame serializado
+# ao processo principal (cópia inteira em memória) e só compensa com CPUs de sobra
+WORKERS_LEITURA = int(os.environ.get('AIA_WORKERS_LEITURA', str(os.cpu_count() or 1)))
+POOL_LEITURA = os.environ.get('AIA_POOL_LEITURA', 'threads')
+# Pool das abas de uma pasta de trabalho (`abas`): o parse do XML de cada aba é CPU puro e
+# não avança em paralelo entre threads (GIL); por padrão cada aba vai para um processo
+POOL_ABAS = os.environ.get('AIA_POOL_ABAS', 'processos')
+
+# Gerador dos .xlsx do formato 'lista': 'rapido' (SpreadsheetML direto) ou 'openpyxl'
+MOTOR_XLSX = os.environ.get('AIA_MOTOR_XLSX', 'rapido')
+
+# Colunas (e ordem) dos arquivos de saída
+COLUNAS_SAIDA = ('numero', 'acao', 'cnpj')
+# Linhas pré-renderizadas por vez nos lotes .csv (limita a memória do buffer de _csv_lotes_bytes)
+LINHAS_POR_RENDERIZACAO = 100_000
+
+_POOLS_ESCRITA = {}
+_POOLS_LOCK = threading.Lock()
+
+EXTENSOES_XLSX = ('.xlsx', '.xlsm', '.xltx', '.xltm')
+# Valores de `abas` que selecionam todas as abas com dados de cada pasta de trabalho
+ABAS_TODAS = ('todas', '*')
+# Formatos colunares gerados pelos sistemas de origem (leitura via pyarrow)
+EXTENSOES_COLUNARES = ('.parquet', '.feather')
+
+# Bytes do início do CSV usados para detectar o delimitador
+AMOSTRA_DELIMITADOR = 64 * 1024
+
+
+def _detectar_delimitador(caminho_in):
+    """Detecta o delimitador do CSV pelas primeiras linhas completas (csv.Sniffer), ou None.
+
+    Só a amostra é interpretada em Python; a leitura em si usa o parser em C do pandas,
+    bem mais rápido que o engine='python' necessário para sep=None.
     """
+    with open(caminho_in, 'rb') as fh:
+        amostra = fh.read(AMOSTRA_DELIMITADOR)
+    if len(amostra) == AMOSTRA_DELIMITADOR and b'\n' in amostra:
+        # descarta a última linha, possivelmente cortada no meio
+        amostra = amostra[:amostra.rindex(b'\n')]
     try:
-        # Sanitização
-        company = re.sub(r'[^A-Za-z0-9_-]', '', empresa_raw.replace(' ', '_'))
-        if not company:
-            return {"success": False, "error": "Nome da empresa inválido."}
+        texto = amostra.decode('utf-8-sig')
+    except UnicodeDecodeError:
+        texto = amostra.decode('latin-1')
+    try:
+        return csv.Sniffer().sniff(texto, delimiters=',;\t|').delimiter
+    except csv.Error:
+        return None
 
-        prefix_map = {
-            'criar': 'Cadastro_numeros',
-            'alterar': 'Alterar_numeros',
-            'deletar': 'Deletar_numeros'
-        }
-        prefix = prefix_map.get(acao.lower(), 'Cadastro_numeros')
-        file_prefix = f"{prefix}_{company}"
 
-        # Pasta de saída
-        pasta_saida_final = Path(pasta_base_saida) / f"uploads_{company}"
-        pasta_saida_final.mkdir(parents=True, exist_ok=True)
+def _colunas_necessarias(colunas, explicit_mapping, colunas_map=None):
+    """Colunas que o mapeamento vai usar (para usecols/columns), ou None para ler todas.
 
-        # Carrega o arquivo (Excel ou CSV) escolhendo engine por extensão e com fallback
-        caminho_in = Path(caminho_arquivo_entrada)
-        suffix_in = caminho_in.suffix.lower()
-        df = None
-        if suffix_in in ('.csv',):
-            try:
-                df = pd.read_csv(caminho_in, sep=None, engine='python')
-            except Exception:
-                df = pd.read_csv(caminho_in, encoding='utf-8', sep=';')
+    Com `colunas_map` (o mapeamento do upload, já resolvido) só filtra o cabeçalho; sem ele
+    detecta as colunas sem consultar nem gravar o cache de mapeamento, que é atualizado uma
+    única vez por upload (_mapeamento_do_cabecalho ou selecionar_e_formatar_dados).
+    """
+    if len(colunas) <= 1:
+        # CSV inteiro em uma coluna: dividido depois por _dividir_coluna_unica
+        return None
+    if colunas_map is None:
+        try:
+            colunas_map = _resolver_mapeamento(pd.DataFrame(columns=colunas), explicit_mapping, usar_cache=False)
+        except ValueError:
+            # colunas ausentes: lê tudo para a mensagem de erro listar as colunas disponíveis
+            return None
+    if not _mapeamento_aplicavel(colunas_map, colunas):
+        return None
+    return [c for c in colunas if c in colunas_map]
+
+
+def _mapeamento_aplicavel(colunas_map, colunas):
+    """True se `colunas_map` (numero, cnpj, acao) foi informado e as suas colunas existem em `colunas`."""
+    return bool(colunas_map) and all(c in colunas for c in colunas_map if c is not None)
+
+
+# Linhas lidas do início do arquivo para resolver o mapeamento (e dividir um CSV em uma coluna)
+LINHAS_CABECALHO = 50
+
+
+def _cabecalho_entrada(caminho_in, aba=None):
+    """Nomes das colunas do arquivo (ou da aba), como os leitores os produzem, lendo só o início.
+
+    Num CSV inteiro em uma coluna, os nomes já divididos (_dividir_coluna_unica nas primeiras
+    LINHAS_CABECALHO linhas). Retorna None se o início do arquivo não puder ser lido.
+    """
+    suffix_in = caminho_in.suffix.lower()
+    try:
+        if suffix_in in EXTENSOES_XLSX:
+            _, linhas = _xlsx_ler_inicio(caminho_in, LINHAS_CABECALHO + 1, aba)
+            if not linhas:
+                return None
+            colunas = _xlsx_nomes_cabecalho({i: _xlsx_texto(v) for i, v in enumerate(linhas[0]) if v is not None})
+            amostra = pd.DataFrame([[_xlsx_texto(v) for v in linha[:len(colunas)]] for linha in linhas[1:]],
+                                   columns=colunas) if len(colunas) == 1 else pd.DataFrame(columns=colunas)
+        elif suffix_in in ('.csv',):
+            amostra = _ler_csv(caminho_in, todas_colunas=True, nrows=LINHAS_CABECALHO)
+        elif suffix_in in EXTENSOES_COLUNARES:
+            amostra = pd.DataFrame(columns=_colunas_colunar(caminho_in))
         else:
-            engine = None
-            if suffix_in in ('.xlsx', '.xlsm', '.xltx', '.xltm'):
-                engine = 'openpyxl'
-            elif suffix_in in ('.xls',):
-                engine = 'xlrd'
-            try:
-                if engine:
-                    df = pd.read_excel(caminho_in, engine=engine)
-                else:
-                    df = pd.read_excel(caminho_in)
-            except Exception:
-                # fallback para CSV caso o arquivo seja realmente um CSV com extensão trocada
-                try:
-                    df = pd.read_csv(caminho_in, sep=None, engine='python')
-                except Exception as e:
-                    return {"success": False, "error": f"Falha ao ler arquivo de entrada: {e}"}
-        # tenta usar a função de seleção/formatacao que faz mapeamento automático
+            amostra = pd.read_excel(caminho_in, nrows=LINHAS_CABECALHO, dtype=str, sheet_name=0 if aba is None else aba)
+    except Exception:
+        return None
+    if amostra.shape[1] == 1 and len(amostra):
+        amostra, _, _ = _dividir_coluna_unica(amostra)
+    return list(amostra.columns)
+
+
+def _mapeamento_do_cabecalho(caminho_in, explicit_mapping, aba=None):
+    """Resolve o mapeamento de colunas de um arquivo (ou aba) pelo cabeçalho: uma vez por upload.
+
+    É a única consulta/gravação do cache de mapeamento do upload; o resultado segue para os
+    leitores (colunas lidas) e para selecionar_e_formatar_dados. Retorna (colunas_map, posicoes):
+    os nomes de 'numero', 'cnpj' e 'acao' (ou None) e as posições dessas colunas no cabeçalho,
+    que identificam o df normalizado na chave do cache de resultados. (None, None) se o
+    cabeçalho não puder ser lido ou não tiver as colunas (o erro sai na leitura completa).
+    """
+    colunas = _cabecalho_entrada(Path(caminho_in), aba)
+    if not colunas:
+        return None, None
+    try:
+        colunas_map = _resolver_mapeamento(pd.DataFrame(columns=colunas), explicit_mapping)
+    except ValueError:
+        return None, None
+    return colunas_map, [colunas.index(c) if c is not None else None for c in colunas_map]
+
+
+def _ler_csv(caminho_in, explicit_mapping=None, todas_colunas=False, colunas_map=None, **kwargs):
+    """Lê o CSV com o parser em C e só as colunas necessárias (ver _colunas_necessarias).
+
+    `todas_colunas=True` dispensa o usecols (ex.: inspeção). `kwargs` vai para o pd.read_csv
+    (ex.: chunksize, nrows). Sem delimitador detectável, mantém a leitura original
+    (engine='python' com sep=None, depois ';').
+    """
+    delim = _detectar_delimitador(caminho_in)
+    if delim is not None:
         try:
-            df_sel, mapping = selecionar_e_formatar_dados(df, explicit_mapping=explicit_mapping)
-        except Exception as e:
-            return {"success": False, "error": f"Erro ao mapear/formatar colunas: {e}"}
+            colunas = list(pd.read_csv(caminho_in, sep=delim, nrows=0).columns)
+            usecols = None if todas_colunas else _colunas_necessarias(colunas, explicit_mapping, colunas_map)
+            return pd.read_csv(caminho_in, sep=delim, usecols=usecols, **kwargs)
+        except Exception:
+            pass
+    try:
+        return pd.read_csv(caminho_in, sep=None, engine='python', **kwargs)
+    except Exception:
+        return pd.read_csv(caminho_in, encoding='utf-8', sep=';', **kwargs)
 
-        # Sobrescreve a ação conforme parâmetro (garante consistência)
-        df_sel['acao'] = acao.lower()
 
-        # Se o formato solicitado é 'lista', adicionar vírgula à direita do número
-        if str(output_format).lower() == 'lista':
-            try:
-                # garantir que número seja string, remover espaços/whitespace e manter apenas dígitos
-                # antes de adicionar a vírgula final; NÃO prefixamos aspa, pois vamos gerar XLSX
-                def _append_comma(s):
-                    if s is None:
-                        return ''
-                    ss = str(s)
-                    # remove todos tipos de whitespace (inclui espaços normais e NBSP)
-                    ss = re.sub(r"\s+", "", ss)
-                    ss = ss.replace('\u00A0', '')
-                    # mantém apenas dígitos (remove pontuação/resíduos)
-                    ss = re.sub(r"[^0-9]", "", ss)
-                    if not ss:
-                        return ''
-                    # adiciona vírgula ao final, ex: 13920038582,
-                    return ss + ','
-
-                df_sel['numero'] = df_sel['numero'].apply(_append_comma)
-            except Exception:
-                pass
+def _colunas_colunar(caminho_in):
+    """Nomes das colunas de um Parquet/Feather, lidos só dos metadados."""
+    if caminho_in.suffix.lower() == '.parquet':
+        import pyarrow.parquet as pq
+        return pq.read_schema(caminho_in).names
+    import pyarrow.ipc as ipc
+    with ipc.open_file(caminho_in) as leitor:
+        return leitor.schema.names
 
-        # preparar preview com primeiras linhas para retorno (ajuda no debug/validação)
+
+def _ler_colunar(caminho_in, explicit_mapping=None, todas_colunas=False, colunas_map=None):
+    """Lê um Parquet/Feather inteiro, só com as colunas necessárias."""
+    colunas = None if todas_colunas else _colunas_necessarias(_colunas_colunar(caminho_in), explicit_mapping,
+                                                               colunas_map)
+    if caminho_in.suffix.lower() == '.parquet':
+        return pd.read_parquet(caminho_in, columns=colunas)
+    return pd.read_feather(caminho_in, columns=colunas)
+
+
+def _ler_excel(caminho_in, engine, explicit_mapping=None, todas_colunas=False, aba=None, colunas_map=None):
+    """Lê a planilha em duas fases: o cabeçalho e depois só as colunas necessárias, como texto.
+
+    Com dtype=str os números chegam como foram gravados: sem a conversão para float que
+    colunas com células vazias sofreriam (11999990001 -> '11999990001.0'). O .xlsx é lido
+    direto do XML (_xlsx_ler_blocos); se isso falhar, e nos demais formatos, pelo pandas.
+    `aba` é o nome da aba a ler (padrão: a primeira).
+    """
+    if engine == 'openpyxl':
         try:
-            preview = df_sel.head(5).to_dict(orient='records')
+            return next(_xlsx_ler_blocos(caminho_in, None, explicit_mapping, todas_colunas, aba, colunas_map))
         except Exception:
-            preview = []
+            pass
+    aba = 0 if aba is None else aba
+    usecols = None
+    if not todas_colunas:
+        cabecalho = list(pd.read_excel(caminho_in, engine=engine, nrows=0, sheet_name=aba).columns)
+        necessarias = _colunas_necessarias(cabecalho, explicit_mapping, colunas_map)
+        if necessarias is not None:
+            # por posição: nomes repetidos no cabeçalho chegam renomeados ('a', 'a.1')
+            usecols = [i for i, c in enumerate(cabecalho) if c in necessarias]
+    return pd.read_excel(caminho_in, engine=engine, usecols=usecols, dtype=str, sheet_name=aba)
 
-        total_linhas = len(df_sel)
-        arquivos_criados = []
 
-        # Ajusta tamanho de lote
+def _carregar_entrada(caminho_in, explicit_mapping=None, todas_colunas=False, aba=None, colunas_map=None):
+    """Carrega o arquivo (Excel, CSV, Parquet ou Feather) inteiro escolhendo engine por extensão e com fallback.
+
+    Lê só as colunas que o mapeamento (`colunas_map` já resolvido, ou `explicit_mapping`/detecção
+    automática) vai usar, a menos que `todas_colunas` seja informado (ex.: inspeção). `aba`
+    (nome) só vale para Excel; sem ela é lida a primeira aba.
+    """
+    suffix_in = caminho_in.suffix.lower()
+    if suffix_in in ('.csv',):
+        return _ler_csv(caminho_in, explicit_mapping, todas_colunas, colunas_map)
+    if suffix_in in EXTENSOES_COLUNARES:
+        return _ler_colunar(caminho_in, explicit_mapping, todas_colunas, colunas_map)
+    engine = None
+    if suffix_in in EXTENSOES_XLSX:
+        engine = 'openpyxl'
+    elif suffix_in in ('.xls',):
+        engine = 'xlrd'
+    try:
+        return _ler_excel(caminho_in, engine, explicit_mapping, todas_colunas, aba, colunas_map)
+    except Exception:
+        # fallback para CSV caso o arquivo seja realmente um CSV com extensão trocada
+        return _ler_csv(caminho_in, explicit_mapping, todas_colunas, colunas_map)
+
+
+def _ler_em_blocos(caminho_in, linhas_por_bloco, explicit_mapping=None, aba=None, colunas_map=None):
+    """Lê o arquivo de entrada em blocos de DataFrame, sem carregar a planilha inteira.
+
+    Para .xlsx lê o XML da aba (`aba` ou a primeira) em fluxo (_xlsx_ler_blocos); para .csv usa
+    `pd.read_csv(chunksize=...)` e para .parquet os row groups (iter_batches), todos só
+    com as colunas necessárias. Formatos sem leitura incremental (ex.: .xls) são
+    carregados inteiros e fatiados.
+    """
+    suffix_in = caminho_in.suffix.lower()
+    if suffix_in in EXTENSOES_XLSX:
         try:
-            tamanho_lote = int(tamanho_lote)
+            for bloco in _xlsx_ler_blocos(caminho_in, linhas_por_bloco, explicit_mapping, aba=aba,
+                                          colunas_map=colunas_map):
+                if len(bloco):
+                    yield bloco
+        except _XlsxNaoSuportado:
+            # o cabeçalho é a primeira coisa lida: nenhum bloco saiu ainda; lê pelo pandas
+            df = _carregar_entrada(caminho_in, explicit_mapping, aba=aba, colunas_map=colunas_map)
+            for i in range(0, len(df), linhas_por_bloco):
+                yield df.iloc[i: i + linhas_por_bloco]
+        except ValueError:
+            # aba sem nenhuma linha: arquivo vazio
+            return
+    elif suffix_in in ('.csv',):
+        with _ler_csv(caminho_in, explicit_mapping, colunas_map=colunas_map, chunksize=linhas_por_bloco) as leitor:
+            for bloco in leitor:
+                yield bloco
+    elif suffix_in == '.parquet':
+        import pyarrow.parquet as pq
+        arquivo = pq.ParquetFile(caminho_in)
+        colunas = _colunas_necessarias(arquivo.schema_arrow.names, explicit_mapping, colunas_map)
+        for lote in arquivo.iter_batches(batch_size=linhas_por_bloco, columns=colunas):
+            yield lote.to_pandas()
+    else:
+        df = _carregar_entrada(caminho_in, explicit_mapping, aba=aba, colunas_map=colunas_map)
+        for i in range(0, len(df), linhas_por_bloco):
+            yield df.iloc[i: i + linhas_por_bloco]
+
+
+def _estimar_total_linhas(caminho_in, aba=None):
+    """Estimativa barata do total de linhas de dados (sem ler a planilha), ou None.
+
+    Para .xlsx usa a dimensão gravada na aba (<dimension ref=...>); para .parquet,
+    o total gravado nos metadados.
+    """
+    if caminho_in.suffix.lower() == '.parquet':
+        try:
+            import pyarrow.parquet as pq
+            return pq.ParquetFile(caminho_in).metadata.num_rows
         except Exception:
-            tamanho_lote = TAMANHO_LOTE
-        if tamanho_lote <= 0:
-            tamanho_lote = TAMANHO_LOTE
+            return None
+    if caminho_in.suffix.lower() not in EXTENSOES_XLSX:
+        return None
+    try:
+        dimensao, _ = _xlsx_ler_inicio(caminho_in, 1, aba)
+    except Exception:
+        return None
+    total = _xlsx_total_pela_dimensao(dimensao)
+    return max(total - 1, 0) if total else None
 
-        contador_arquivo = 1
-        for i in range(0, total_linhas, tamanho_lote):
-            fatia = df_sel.iloc[i: i + tamanho_lote]
-            numero_padronizado = str(contador_arquivo).zfill(3)
-            fatia = fatia.copy()
-            fatia['numero'] = fatia['numero'].astype(str)
-            fatia['acao'] = fatia['acao'].astype(str)
-            fatia['cnpj'] = fatia['cnpj'].astype(str)
 
-            # Se o formato for 'lista', geramos apenas .xlsx (sem aspa). Se for 'planilha', geramos apenas .csv
-            if str(output_format).lower() == 'lista':
-                try:
-                    xlsx_path = pasta_saida_final / f"{file_prefix}_{numero_padronizado}.xlsx"
-                    df_xlsx = fatia.copy()
-                    # remove possível aspa inicial e garante vírgula no final
-                    df_xlsx['numero'] = df_xlsx['numero'].astype(str).str.lstrip("'")
-                    df_xlsx['numero'] = df_xlsx['numero'].apply(lambda s: s if s.endswith(',') else (s + ',' if s else s))
-                    # escreve XLSX com formatacao de texto na coluna A
-                    try:
-                        with pd.ExcelWriter(xlsx_path, engine='openpyxl') as writer:
-                            df_xlsx.to_excel(writer, index=False, sheet_name='Sheet1')
-                            wb = writer.book
-                            ws = writer.sheets['Sheet1']
-                            for cell in ws['A']:
-                                cell.number_format = '@'
-                    except Exception:
-                        df_xlsx.to_excel(xlsx_path, index=False)
-                    arquivos_criados.append(str(xlsx_path.name))
-                except Exception:
-                    pass
-            else:
-                nome_saida = pasta_saida_final / f"{file_prefix}_{numero_padronizado}.csv"
-                fatia.to_csv(nome_saida, index=False, encoding='utf-8-sig', sep=';', quoting=csv.QUOTE_ALL)
-                arquivos_criados.append(str(nome_saida.name))
-            contador_arquivo += 1
+def _listar_abas(caminho_in, com_dados=False):
+    """Nomes das abas de uma pasta de trabalho (.xlsx/.xls), na ordem do arquivo, ou None.
+
+    None indica um arquivo sem abas (CSV, Parquet, Feather ou CSV com extensão de Excel).
+    Com `com_dados` ficam de fora as abas sem nenhuma linha preenchida.
+    """
+    suffix_in = caminho_in.suffix.lower()
+    if suffix_in in EXTENSOES_XLSX:
+        try:
+            with zipfile.ZipFile(caminho_in) as zf:
+                abas = [nome for nome, _ in _xlsx_abas(zf)]
+            if com_dados:
+                abas = [aba for aba in abas if _xlsx_ler_inicio(caminho_in, 1, aba)[1]]
+            return abas
+        except Exception:
+            engine = 'openpyxl'
+    elif suffix_in in ('.xls',):
+        engine = 'xlrd'
+    else:
+        return None
+    try:
+        with pd.ExcelFile(caminho_in, engine=engine) as livro:
+            abas = list(livro.sheet_names)
+            if com_dados:
+                abas = [aba for aba in abas if not livro.parse(aba, nrows=1, header=None).empty]
+        return abas
+    except Exception:
+        return None
+
+
+def _formatar_numeros_lista(serie):
+    """Formata a coluna 'numero' para o formato 'lista' (vetorizado): apenas dígitos seguidos de vírgula.
+
+    Nulos e valores sem nenhum dígito viram ''. Aplicada uma vez sobre a coluna inteira,
+    antes da divisão em lotes (_serializar_lote não reformata o número).
+    """
+    # mantém apenas dígitos (remove whitespace, NBSP, pontuação e resíduos)
+    digitos = serie.astype(str).str.replace(r'[^0-9]', '', regex=True).fillna('')
+    # adiciona vírgula ao final, ex: 13920038582,
+    return digitos.where(digitos == '', digitos + ',')
+
+
+# Partes fixas do pacote XLSX gerado por _xlsx_lista_bytes
+_XLSX_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    '<Override PartName="/xl/worksheets/sheet1.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+    '<Override PartName="/xl/styles.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+    '</Types>'
+)
+_XLSX_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="xl/workbook.xml"/>'
+    '</Relationships>'
+)
+_XLSX_WORKBOOK = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+    'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+    '<sheets><sheet name="Sheet1" sheetId="1" r:id="rId1"/></sheets></workbook>'
+)
+_XLSX_WORKBOOK_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" Target="worksheets/sheet1.xml"/>'
+    '<Relationship Id="rId2" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles" Target="styles.xml"/>'
+    '</Relationships>'
+)
+# estilos: 0 = padrão, 1 = texto ('@'), 2 = cabeçalho com texto ('@'), 3 = cabeçalho
+# (cabeçalho em negrito, centralizado e com borda fina, como o pandas gera)
+_XLSX_STYLES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<styleSheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+    '<fonts count="2"><font><sz val="11"/><name val="Calibri"/><family val="2"/></font>'
+    '<font><b/><sz val="11"/><name val="Calibri"/><family val="2"/></font></fonts>'
+    '<fills count="2"><fill><patternFill patternType="none"/></fill><fill><patternFill patternType="gray125"/></fill></fills>'
+    '<borders count="2"><border><left/><right/><top/><bottom/><diagonal/></border>'
+    '<border><left style="thin"/><right style="thin"/><top style="thin"/><bottom style="thin"/><diagonal/></border></borders>'
+    '<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>'
+    '<cellXfs count="4">'
+    '<xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>'
+    '<xf numFmtId="49" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/>'
+    '<xf numFmtId="49" fontId="1" fillId="0" borderId="1" xfId="0" applyNumberFormat="1" applyFont="1" applyBorder="1" applyAlignment="1">'
+    '<alignment horizontal="center" vertical="top"/></xf>'
+    '<xf numFmtId="0" fontId="1" fillId="0" borderId="1" xfId="0" applyFont="1" applyBorder="1" applyAlignment="1">'
+    '<alignment horizontal="center" vertical="top"/></xf>'
+    '</cellXfs>'
+    '<cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles>'
+    '</styleSheet>'
+)
+# caracteres de controle não permitidos em XML
+_XML_INVALIDO = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+
+def _xlsx_celula(ref, valor, estilo):
+    """Célula de texto (inline string) do SpreadsheetML; valor vazio gera só a célula formatada."""
+    estilo_attr = f' s="{estilo}"' if estilo else ''
+    if not valor:
+        return f'<c r="{ref}"{estilo_attr}/>'
+    texto = _XML_INVALIDO.sub('', valor).replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
+    espaco = ' xml:space="preserve"' if texto != texto.strip() else ''
+    return f'<c r="{ref}"{estilo_attr} t="inlineStr"><is><t{espaco}>{texto}</t></is></c>'
+
+
+def _xlsx_lista_bytes(valores, colunas=COLUNAS_SAIDA):
+    """Gera um XLSX mínimo para o esquema fixo (numero, acao, cnpj), com a coluna A como texto.
+
+    Alternativa rápida ao openpyxl: monta o SpreadsheetML diretamente (strings inline) e
+    compacta em memória, sem criar um objeto por célula. `valores` são as colunas do lote
+    (arrays de texto, ver _colunas_texto).
+    """
+    letras = 'ABCDEFGHIJKLMNOPQRSTUVWXYZ'[:len(colunas)]
+    linhas = ['<row r="1">' + ''.join(
+        _xlsx_celula(f'{letra}1', str(nome), 2 if letra == 'A' else 3) for letra, nome in zip(letras, colunas)
+    ) + '</row>']
+    for i, registro in enumerate(zip(*[v.tolist() for v in valores]), start=2):
+        linhas.append(f'<row r="{i}">' + ''.join(
+            _xlsx_celula(f'{letra}{i}', v, 1 if letra == 'A' else 0) for letra, v in zip(letras, registro)
+        ) + '</row>')
+    sheet = (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+        f'<dimension ref="A1:{letras[-1]}{len(linhas)}"/>'
+        '<sheetData>' + ''.join(linhas) + '</sheetData></worksheet>'
+    )
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', compression=zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr('[Content_Types].xml', _XLSX_CONTENT_TYPES)
+        zf.writestr('_rels/.rels', _XLSX_RELS)
+        zf.writestr('xl/workbook.xml', _XLSX_WORKBOOK)
+        zf.writestr('xl/_rels/workbook.xml.rels', _XLSX_WORKBOOK_RELS)
+        zf.writestr('xl/styles.xml', _XLSX_STYLES)
+        zf.writestr('xl/worksheets/sheet1.xml', sheet)
+    return buffer.getvalue()
+
+
+def _colunas_texto(df):
+    """Converte as colunas de saída (numero, acao, cnpj) para o texto final, uma única vez.
+
+    Retorna uma lista com os arrays de texto do pandas (nulos como ''), contíguos; os lotes
+    são fatias desses arrays (views), sem cópia nem nova conversão por lote. No formato
+    'lista' o número já deve vir formatado por _formatar_numeros_lista.
+    """
+    return [df[c].astype(str).fillna('').array for c in COLUNAS_SAIDA]
+
+
+# Cabeçalho de cada lote .csv do formato 'planilha', igual ao do DataFrame.to_csv usado antes:
+# BOM do utf-8-sig, todos os campos entre aspas, separador ';' e fim de linha do sistema
+_CSV_CABECALHO = '\ufeff' + ';'.join(f'"{c}"' for c in COLUNAS_SAIDA) + os.linesep
+
+
+def _csv_lotes_bytes(colunas, tamanho_lote):
+    """Pré-renderiza de uma vez os lotes .csv ('planilha') das colunas (de _colunas_texto).
+
+    Gera um único buffer com os arquivos em sequência, cada um com BOM e cabeçalho, e
+    retorna (buffer, limites): o lote k ocupa buffer[limites[k]:limites[k + 1]]. O conteúdo
+    é idêntico byte a byte ao do to_csv(sep=';', quoting=QUOTE_ALL, encoding='utf-8-sig'),
+    sem o custo fixo de uma chamada por lote.
+    """
+    linhas = None
+    for valores in colunas:
+        campo = pd.Series(valores, copy=False)
+        if campo.str.contains('"', regex=False).any():
+            campo = campo.str.replace('"', '""', regex=False)
+        linhas = '"' + campo if linhas is None else linhas + '";"' + campo
+    linhas = (linhas + '"' + os.linesep).tolist()
+    textos = [_CSV_CABECALHO + ''.join(linhas[i: i + tamanho_lote]) for i in range(0, len(linhas), tamanho_lote)]
+    buffer = ''.join(textos).encode('utf-8')
+    # o BOM é 1 caractere e 3 bytes: se todo o resto for ASCII, cada lote tem len + 2 bytes
+    if len(buffer) == sum(map(len, textos)) + 2 * len(textos):
+        tamanhos = [len(t) + 2 for t in textos]
+    else:
+        tamanhos = [len(t.encode('utf-8')) for t in textos]
+    return buffer, [0] + np.cumsum(tamanhos).tolist()
 
-        # Empacota conteúdo dos arquivos para enviar ao cliente (base64)
-        files_data = []
-        for p in arquivos_criados:
-            fullpath = pasta_saida_final / p
+
+def _serializar_lote(fatia, output_format, motor_xlsx='rapido'):
+    """Serializa um lote em bytes: .xlsx para 'lista', .csv para 'planilha'. Retorna (extensao, dados).
+
+    `fatia` é a lista de colunas do lote já em texto (fatias de _colunas_texto).
+    `motor_xlsx` escolhe o gerador do .xlsx: 'rapido' (_xlsx_lista_bytes) ou 'openpyxl'.
+    """
+    # Se o formato for 'lista', geramos apenas .xlsx (sem aspa). Se for 'planilha', geramos apenas .csv
+    if str(output_format).lower() == 'lista':
+        # escreve XLSX com formatacao de texto na coluna A
+        if motor_xlsx == 'rapido':
             try:
-                with open(fullpath, 'rb') as fh:
-                    data = fh.read()
-                b64 = base64.b64encode(data).decode('ascii')
-                files_data.append({
-                    'name': p,
-                    'content_b64': b64
-                })
+                return 'xlsx', _xlsx_lista_bytes(fatia)
             except Exception:
-                # se falhar ao ler, ainda inclui o nome
-                files_data.append({'name': p, 'content_b64': None})
+                pass
+        df_xlsx = pd.DataFrame(dict(zip(COLUNAS_SAIDA, fatia)))
+        buffer = io.BytesIO()
+        try:
+            with pd.ExcelWriter(buffer, engine='openpyxl') as writer:
+                df_xlsx.to_excel(writer, index=False, sheet_name='Sheet1')
+                ws = writer.sheets['Sheet1']
+                for cell in ws['A']:
+                    cell.number_format = '@'
+        except Exception:
+            buffer = io.BytesIO()
+            df_xlsx.to_excel(buffer, index=False)
+        return 'xlsx', buffer.getvalue()
+    buffer, _ = _csv_lotes_bytes(fatia, len(fatia[0]))
+    return 'csv', buffer
 
-        return {
-            "success": True,
-            "total_files": len(arquivos_criados),
-            "total_lines": total_linhas,
-            "output_folder": str(pasta_saida_final),
-            "files": arquivos_criados,
-            "files_data": files_data,
-            "column_mapping": mapping,
-            "preview": preview,
-            "requested_format": output_format
-        }
 
-    except Exception as e:
-        return {"success": False, "error": str(e)}
\ No newline at end of file
+class _DestinoPasta:
+    """Grava cada lote como um arquivo na pasta de saída."""
+
+    def __init__(self, pasta):
+        self.pasta = pasta
+
+    def gravar(self, nome, dados):
+        with open(self.pasta / nome, 'wb') as fh:
+            fh.write(dados)
+
+
+class _DestinoZip:
+    """Grava cada lote diretamente em um ZIP, sem passar pela pasta de saída.
+
+    O ZIP fica em memória até ZIP_MAX_MEMORIA bytes e depois passa para um arquivo temporário.
+    """
+
+    def __init__(self):
+        self.arquivo = tempfile.SpooledTemporaryFile(max_size=ZIP_MAX_MEMORIA)
+        self.zip = zipfile.ZipFile(self.arquivo, 'w', compression=zipfile.ZIP_DEFLATED)
+
+    def gravar(self, nome, dados):
+        self.zip.writestr(nome, dados)
+
+    def finalizar(self):
+        """Fecha o ZIP e retorna o arquivo posicionado no início, pronto para leitura."""
+        self.zip.close()
+        self.arquivo.seek(0)
+        return self.arquivo
+
+
+def encerrar_pools_escrita():
+    """Finaliza os pools de escrita compartilhados (chamado no encerramento do servidor)."""
+    with _POOLS_LOCK:
+        pools = list(_POOLS_ESCRITA.values())
+        _POOLS_ESCRITA.clear()
+    for pool in pools:
+        pool.shutdown(wait=True)
+
+
+def _contexto_processos():
+    """Contexto multiprocessing dos pools de processos: 'forkserver' (ou 'spawn'), nunca 'fork'.
+
+    O backend roda dentro de servidores com várias threads (waitress, gunicorn gthread); um
+    fork feito nesse estado copia locks mantidos por outras threads e pode travar o filho.
+    """
+    metodo = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+    return multiprocessing.get_context(metodo)
+
+
+def _obter_pool_escrita(workers, tipo_pool):
+    """Retorna um pool de escrita compartilhado (criado sob demanda) para o tipo/tamanho pedido."""
+    chave = (tipo_pool, workers)
+    with _POOLS_LOCK:
+        pool = _POOLS_ESCRITA.get(chave)
+        if pool is None:
+            if tipo_pool == 'threads':
+                pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='aia-escrita')
+            else:
+                pool = ProcessPoolExecutor(max_workers=workers, mp_context=_contexto_processos())
+            _POOLS_ESCRITA[chave] = pool
+        return pool
+
+
+class _EscritorLotes:
+    """Serializa os lotes (em paralelo, se configurado) e grava no destino em ordem.
+
+    Com workers > 1 a serialização é distribuída em um pool de processos ou threads, com no
+    máximo 2 * workers lotes em andamento; a gravação e a lista de arquivos criados seguem
+    sempre a numeração (_001, _002, ...). Os .csv enviados por enviar_colunas não passam
+    pelo pool: são pré-renderizados em bloco no próprio processo.
+    """
+
+    def __init__(self, destino, file_prefix, output_format, workers=1, tipo_pool='processos', progresso=None,
+                 motor_xlsx='rapido'):
+        self.destino = destino
+        self.file_prefix = file_prefix
+        self.output_format = output_format
+        self.motor_xlsx = motor_xlsx
+        self.progresso = progresso
+        self.total_linhas = None
+        self.arquivos_criados = []
+        self.pool = _obter_pool_escrita(workers, tipo_pool) if workers > 1 else None
+        self.max_em_andamento = 2 * workers
+        self.pendentes = deque()
+
+    def enviar(self, fatia, contador_arquivo, linhas_ate_aqui):
+        """Agenda a gravação do lote `contador_arquivo` (que termina na linha `linhas_ate_aqui`)."""
+        if self.pool is None:
+            self._gravar(contador_arquivo, linhas_ate_aqui, lambda: _serializar_lote(fatia, self.output_format, self.motor_xlsx))
+            return
+        while len(self.pendentes) >= self.max_em_andamento:
+            self._concluir_mais_antigo()
+        futuro = self.pool.submit(_serializar_lote, fatia, self.output_format, self.motor_xlsx)
+        self.pendentes.append((contador_arquivo, linhas_ate_aqui, futuro))
+
+    def enviar_colunas(self, colunas, tamanho_lote, contador_arquivo, linhas_antes=0):
+        """Divide as colunas (de _colunas_texto) em lotes de `tamanho_lote` e agenda cada um.
+
+        No formato 'planilha' os .csv são pré-renderizados em blocos de até
+        LINHAS_POR_RENDERIZACAO linhas (_csv_lotes_bytes) e cada lote é gravado como uma
+        fatia (memoryview) do buffer, sem passar pelo pool. Retorna o próximo contador_arquivo.
+        """
+        total = len(colunas[0])
+        if str(self.output_format).lower() == 'lista':
+            for i in range(0, total, tamanho_lote):
+                self.enviar([c[i: i + tamanho_lote] for c in colunas], contador_arquivo,
+                            linhas_antes + min(i + tamanho_lote, total))
+                contador_arquivo += 1
+            return contador_arquivo
+        # mantém a ordem de gravação se houver lotes enviados antes pelo pool
+        while self.pendentes:
+            self._concluir_mais_antigo()
+        passo = max(LINHAS_POR_RENDERIZACAO // tamanho_lote, 1) * tamanho_lote
+        for inicio in range(0, total, passo):
+            buffer, limites = _csv_lotes_bytes([c[inicio: inicio + passo] for c in colunas], tamanho_lote)
+            visao = memoryview(buffer)
+            for k in range(len(limites) - 1):
+                dados = visao[limites[k]: limites[k + 1]]
+                self._gravar(contador_arquivo, linhas_antes + min(inicio + (k + 1) * tamanho_lote, total),
+                             lambda: ('csv', dados))
+                contador_arquivo += 1
+        return contador_arquivo
+
+    def finalizar(self):
+        """Aguarda os lotes pendentes e retorna a lista de arquivos criados, em ordem."""
+        while self.pendentes:
+            self._concluir_mais_antigo()
+        return self.arquivos_criados
+
+    def _concluir_mais_antigo(self):
+        contador_arquivo, linhas_ate_aqui, futuro = self.pendentes.popleft()
+        self._gravar(contador_arquivo, linhas_ate_aqui, futuro.result)
+
+    def _gravar(self, contador_arquivo, linhas_ate_aqui, obter_dados):
+        numero_padronizado = str(contador_arquivo).zfill(3)
+        try:
+            extensao, dados = obter_dados()
+        except Exception:
+            # no formato 'lista' um lote com falha é ignorado (comportamento original)
+            if str(self.output_format).lower() != 'lista':
+                raise
+        else:
+            nome = f"{self.file_prefix}_{numero_padronizado}.{extensao}"
+            self.destino.gravar(nome, dados)
+            self.arquivos_criados.append(nome)
+        if self.progresso:
+            self.progresso(linhas_ate_aqui, self.total_linhas, contador_arquivo)
+
+
+def _processar_em_fluxo(caminhos_in, acao, tamanho_lote, escritor, explicit_mapping, output_format, medicao=SEM_MEDICAO, deduplicador=None, validador=None, abas=None):
+    """Modo streaming: lê, normaliza e envia os lotes ao escritor bloco a bloco.
+
+    O pico de memória depende de `tamanho_lote` (e de LOTES_POR_BLOCO), não do tamanho
+    do arquivo. Os tempos de cada etapa são somados bloco a bloco em `medicao`.
+    Vários arquivos (`caminhos_in`) são lidos em sequência, cada um com o seu mapeamento,
+    e formam uma única sequência de lotes. Retorna (total_linhas, mapping, preview,
+    linhas_por_arquivo, mappings), com `mapping` do primeiro arquivo.
+    `validador` (_Validador) e `deduplicador` (_Deduplicador), se informados, filtram cada
+    bloco antes da escrita. `abas` (uma por arquivo, None = primeira aba) permite ler várias
+    abas da mesma pasta de trabalho, em sequência.
+    """
+    abas = abas or [None] * len(caminhos_in)
+    if escritor.progresso:
+        estimativas = [_estimar_total_linhas(c, aba) for c, aba in zip(caminhos_in, abas)]
+        escritor.total_linhas = None if None in estimativas else sum(estimativas)
+    total_linhas = 0
+    linhas_enviadas = 0
+    preview = []
+    pendente = None
+    contador_arquivo = 1
+    linhas_por_arquivo = []
+    mappings = []
+    linhas_lidas = 0
+
+    for caminho_in, aba in zip(caminhos_in, abas):
+        mapping = None
+        with medicao.etapa('deteccao_colunas'):
+            # mapeamento resolvido uma vez pelo cabeçalho; sem ele, pelo primeiro bloco
+            colunas_map, _ = _mapeamento_do_cabecalho(caminho_in, explicit_mapping, aba)
+        resolvido = False
+        delim = None
+        colunas_split = None
+        linhas_arquivo = 0
+        try:
+            for bloco in medicao.iterar('leitura', _ler_em_blocos(caminho_in, tamanho_lote * LOTES_POR_BLOCO, explicit_mapping,
+                                                                  aba, colunas_map)):
+                with medicao.etapa('deteccao_colunas'):
+                    # CSV inteiro em uma coluna: delimitador e cabeçalho vêm do primeiro bloco
+                    bloco, delim, colunas_split = _dividir_coluna_unica(bloco, delim, colunas_split)
+                    if not resolvido:
+                        if not _mapeamento_aplicavel(colunas_map, bloco.columns):
+                            colunas_map = _resolver_mapeamento(bloco, explicit_mapping)
+                        mapping = dict(zip(('numero', 'cnpj', 'acao'), colunas_map))
+                        resolvido = True
+                with medicao.etapa('normalizacao'):
+                    df_bloco = _formatar_colunas(bloco, *colunas_map)
+                    # como no modo completo, a ação do parâmetro prevalece sobre a coluna de ação
+                    df_bloco['acao'] = acao.lower()
+                linhas_lidas += len(df_bloco)
+                if validador is not None:
+                    with medicao.etapa('validacao'):
+                        df_bloco = df_bloco[validador.mascara(df_bloco, linhas_lidas - len(df_bloco))].reset_index(drop=True)
+                if deduplicador is not None:
+                    with medicao.etapa('deduplicacao'):
+                        df_bloco = df_bloco[deduplicador.mascara(df_bloco)].reset_index(drop=True)
+                if str(output_format).lower() == 'lista':
+                    with medicao.etapa('transformacao_lista'):
+                        df_bloco['numero'] = _formatar_numeros_lista(df_bloco['numero'])
+                if not preview:
+                    preview = df_bloco.head(5).to_dict(orient='records')
+
+                linhas_arquivo += len(df_bloco)
+                total_linhas += len(df_bloco)
+                # junta o resto do bloco anterior (inclusive do arquivo anterior) para manter
+                # todos os lotes com tamanho_lote linhas
+                if pendente is not None and len(pendente):
+                    df_bloco = pd.concat([pendente, df_bloco], ignore_index=True)
+                cheios = len(df_bloco) // tamanho_lote * tamanho_lote
+                with medicao.etapa('escrita_lotes'):
+                    contador_arquivo = escritor.enviar_colunas(_colunas_texto(df_bloco.iloc[:cheios]), tamanho_lote,
+                                                               contador_arquivo, linhas_enviadas)
+                    linhas_enviadas += cheios
+                pendente = df_bloco.iloc[cheios:]
+
+            if mapping is None:
+                raise ValueError("Arquivo de entrada vazio.")
+        except Exception as e:
+            if len(caminhos_in) > 1:
+                rotulo = Path(caminho_in).name if aba is None else f"{Path(caminho_in).name} [{aba}]"
+                raise ValueError(f"{rotulo}: {e}") from e
+            raise
+        linhas_por_arquivo.append(linhas_arquivo)
+        mappings.append(mapping)
+
+    escritor.total_linhas = total_linhas
+    if pendente is not None and len(pendente):
+        with medicao.etapa('escrita_lotes'):
+            escritor.enviar_colunas(_colunas_texto(pendente), tamanho_lote, contador_arquivo, linhas_enviadas)
+
+    return total_linhas, mappings[0], preview, linhas_por_arquivo, mappings
+
+
+class _ErroEntrada(Exception):
+    """Falha ao ler ou mapear um arquivo de entrada; `etapa` indica onde ocorreu."""
+
+    def __init__(self, mensagem, etapa):
+        super().__init__(mensagem, etapa)
+        self.mensagem = mensagem
+        self.etapa = etapa
+
+    def __str__(self):
+        return self.mensagem
+
+
+def _selecao_abas(abas):
+    """Normaliza o parâmetro `abas`: None (só a primeira aba), 'todas' ou a lista de nomes."""
+    if abas is None:
+        return None
+    if isinstance(abas, str):
+        abas = [abas]
+    abas = [str(a) for a in abas if a is not None and str(a).strip()]
+    if not abas:
+        return None
+    if len(abas) == 1 and abas[0].strip().lower() in ABAS_TODAS:
+        return 'todas'
+    return list(dict.fromkeys(abas))
+
+
+def _expandir_abas(caminhos_in, nomes, hashes, abas):
+    """Desdobra as pastas de trabalho nas abas pedidas: cada aba vira uma unidade de entrada.
+
+    `abas` é 'todas' (as abas com dados de cada pasta de trabalho) ou uma lista de nomes
+    (sem diferenciar maiúsculas), que toda pasta de trabalho enviada precisa ter. Arquivos
+    sem abas (CSV, Parquet...) seguem como uma unidade só. Retorna (caminhos, nomes,
+    hashes, abas), uma posição por unidade (aba None nos arquivos sem abas).
+    Levanta ValueError se faltar alguma aba pedida.
+    """
+    unidades = []
+    for caminho_in, nome, hash_conteudo in zip(caminhos_in, nomes, hashes):
+        existentes = _listar_abas(caminho_in, com_dados=abas == 'todas')
+        if existentes is None:
+            selecionadas = [None]
+        elif abas == 'todas':
+            if not existentes:
+                raise ValueError(f"{nome}: nenhuma aba com dados.")
+            selecionadas = existentes
+        else:
+            # nome exato ou, sem ele, a primeira aba com o mesmo nome sem diferenciar maiúsculas
+            por_nome = {}
+            for aba in existentes:
+                por_nome.setdefault(aba.strip().lower(), aba)
+            faltantes = [a for a in abas if a not in existentes and a.strip().lower() not in por_nome]
+            if faltantes:
+                raise ValueError(f"{nome}: aba(s) não encontrada(s): {', '.join(faltantes)}. "
+                                 f"Abas disponíveis: {', '.join(existentes)}.")
+            selecionadas = list(dict.fromkeys(a if a in existentes else por_nome[a.strip().lower()] for a in abas))
+        unidades.extend((caminho_in, nome, hash_conteudo, aba) for aba in selecionadas)
+    return tuple(list(coluna) for coluna in zip(*unidades))
+
+
+def _normalizar_arquivo(caminho_in, explicit_mapping, medicao=None, aba=None, colunas_map=None):
+    """Lê o arquivo (ou a aba `aba`) e aplica selecionar_e_formatar_dados. Retorna (df_sel, mapping, timings).
+
+    Executada também nos workers do pool de leitura (vários arquivos/abas em paralelo);
+    sem `medicao`, mede as próprias etapas e devolve o resumo em `timings`. `colunas_map` é o
+    mapeamento já resolvido pelo cabeçalho (_mapeamento_do_cabecalho), se houver.
+    """
+    propria = medicao is None
+    medicao = medicao or Medicao()
+    try:
+        with medicao.etapa('leitura'):
+            df = _carregar_entrada(Path(caminho_in), explicit_mapping, aba=aba, colunas_map=colunas_map)
+    except Exception as e:
+        raise _ErroEntrada(f"Falha ao ler arquivo de entrada: {e}", 'leitura')
+    # tenta usar a função de seleção/formatacao que faz mapeamento automático
+    try:
+        df_sel, mapping = selecionar_e_formatar_dados(df, explicit_mapping=explicit_mapping, medicao=medicao,
+                                                      colunas_map=colunas_map)
+    except Exception as e:
+        raise _ErroEntrada(f"Erro ao mapear/formatar colunas: {e}", medicao.etapa_falha or 'deteccao_colunas')
+    return df_sel, mapping, (medicao.resumo() if propria else None)
+
+
+def _normalizar_arquivo_em_processo(caminho_in, explicit_mapping, aba=None, colunas_map=None):
+    """_normalizar_arquivo para o pool de processos: devolve também as entradas novas do cache de mapeamento.
+
+    O processo filho não grava cache_mapeamentos.json (vários filhos gravando ao mesmo tempo
+    perderiam entradas); o processo principal grava o que vier em `entradas_cache`.
+    Retorna (df_sel, mapping, timings, entradas_cache).
+    """
+    global _cache_mapeamento_adiado
+    _cache_mapeamento_adiado = []
+    try:
+        return _normalizar_arquivo(caminho_in, explicit_mapping, aba=aba, colunas_map=colunas_map) + \
+            (_cache_mapeamento_adiado,)
+    finally:
+        _cache_mapeamento_adiado = None
+
+
+def _normalizar_arquivos(caminhos_in, nomes, explicit_mapping, medicao, abas=None, colunas_maps=None,
+                         tipo_pool=None):
+    """Normaliza vários arquivos (em paralelo no pool de leitura, se houver mais de um).
+
+    `abas` (uma por arquivo, None = primeira aba) permite ler várias abas da mesma pasta
+    de trabalho, cada uma em um worker e com o seu próprio mapeamento de colunas. O pool
+    (até AIA_WORKERS_LEITURA workers) é `tipo_pool` ('threads' ou 'processos'; padrão
+    AIA_POOL_LEITURA). No pool de processos o cache de mapeamento é gravado só por este processo.
+    `colunas_maps` traz o mapeamento já resolvido de cada arquivo (ou None).
+    Retorna a lista de (df_sel, mapping, timings) na mesma ordem de `caminhos_in`.
+    """
+    abas = abas or [None] * len(caminhos_in)
+    colunas_maps = colunas_maps or [None] * len(caminhos_in)
+    workers = min(len(caminhos_in), max(WORKERS_LEITURA, 1))
+    if len(caminhos_in) == 1:
+        return [_normalizar_arquivo(caminhos_in[0], explicit_mapping, medicao, abas[0], colunas_maps[0])]
+    resultados = []
+    try:
+        with medicao.etapa('leitura'):
+            if workers > 1:
+                processos = (tipo_pool or POOL_LEITURA) != 'threads'
+                pool = _obter_pool_escrita(workers, 'processos' if processos else 'threads')
+                funcao = _normalizar_arquivo_em_processo if processos else _normalizar_arquivo
+                futuros = [pool.submit(funcao, str(c), explicit_mapping, aba=aba, colunas_map=colunas_map)
+                           for c, aba, colunas_map in zip(caminhos_in, abas, colunas_maps)]
+                for nome, futuro in zip(nomes, futuros):
+                    try:
+                        resultado = futuro.result()
+                    except _ErroEntrada as e:
+                        raise _ErroEntrada(f"{nome}: {e.mensagem}", e.etapa)
+                    if processos:
+                        for assinatura, entrada in resultado[3]:
+                            _gravar_cache_mapeamento(assinatura, entrada)
+                    resultados.append(resultado[:3])
+            else:
+                for nome, caminho_in, aba, colunas_map in zip(nomes, caminhos_in, abas, colunas_maps):
+                    try:
+                        resultados.append(_normalizar_arquivo(caminho_in, explicit_mapping, aba=aba,
+                                                              colunas_map=colunas_map))
+                    except _ErroEntrada as e:
+                        raise _ErroEntrada(f"{nome}: {e.mensagem}", e.etapa)
+    except _ErroEntrada as e:
+        medicao.etapa_falha = e.etapa
+        raise
+    return resultados
+
+
+def _resumo_por_arquivo(nomes, linhas, mappings, tamanho_lote, cache_hits=None, timings=None, extras=None):
+    """Totais de cada arquivo (ou aba) de entrada e a faixa de linhas/lotes que ele ocupa na saída.
+
+    `extras` ({campo: lista por arquivo}) acrescenta contagens a cada item (ex.: removidos).
+    """
+    resumo = []
+    inicio = 0
+    for i, (nome, n) in enumerate(zip(nomes, linhas)):
+        item = {
+            'arquivo': nome,
+            'linhas': n,
+            'linha_inicial': inicio + 1 if n else None,
+            'linha_final': inicio + n if n else None,
+            'lote_inicial': inicio // tamanho_lote + 1 if n else None,
+            'lote_final': (inicio + n - 1) // tamanho_lote + 1 if n else None,
+            'column_mapping': mappings[i],
+        }
+        if cache_hits is not None:
+            item['cache_hit'] = cache_hits[i]
+        if timings is not None and timings[i]:
+            item['timings'] = timings[i]
+        for campo, valores in (extras or {}).items():
+            item[campo] = valores[i]
+        resumo.append(item)
+        inicio += n
+    return resumo
+
+
+# ============================================================================
+# VALIDAÇÃO DE LINHAS (TELEFONE, DDD E CPF/CNPJ)
+# ============================================================================
+
+# Motivos de rejeição gravados na coluna 'motivo' do arquivo de rejeitados (na ordem em que
+# são verificados: cada linha recebe apenas o primeiro motivo encontrado)
+MOTIVOS_REJEICAO = {
+    'numero_ausente': 'número vazio ou não numérico',
+    'numero_tamanho': 'número sem 10 (fixo) ou 11 (celular) dígitos incluindo o DDD',
+    'ddd_invalido': 'DDD inexistente no Brasil',
+    'numero_formato': 'celular sem o 9 inicial ou fixo iniciando fora de 2-5',
+    'documento_ausente': 'CPF/CNPJ vazio',
+    'documento_invalido': 'CPF/CNPJ com tamanho ou dígitos verificadores inválidos',
+}
+
+DDDS_VALIDOS = np.array([
+    11, 12, 13, 14, 15, 16, 17, 18, 19, 21, 22, 24, 27, 28, 31, 32, 33, 34, 35, 37, 38,
+    41, 42, 43, 44, 45, 46, 47, 48, 49, 51, 53, 54, 55, 61, 62, 63, 64, 65, 66, 67, 68, 69,
+    71, 73, 74, 75, 77, 79, 81, 82, 83, 84, 85, 86, 87, 88, 89, 91, 92, 93, 94, 95, 96, 97, 98, 99,
+])
+_DDD_VALIDO = np.zeros(100, dtype=bool)
+_DDD_VALIDO[DDDS_VALIDOS] = True
+
+_PESOS_CPF = np.arange(11, 1, -1)
+_PESOS_CNPJ = np.array([6, 5, 4, 3, 2, 9, 8, 7, 6, 5, 4, 3, 2])
+
+
+def _matriz_digitos(valores, largura):
+    """Matriz (linhas x largura) com os dígitos de cada valor inteiro, completando com zeros à esquerda."""
+    return valores[:, None] // 10 ** np.arange(largura - 1, -1, -1, dtype=np.int64) % 10
+
+
+def _validar_cpf(digitos):
+    """Máscara de CPFs válidos (matriz n x 11) pelos dois dígitos verificadores."""
+    d1 = (digitos[:, :9] @ _PESOS_CPF[1:]) * 10 % 11 % 10
+    d2 = (digitos[:, :10] @ _PESOS_CPF) * 10 % 11 % 10
+    repetidos = (digitos == digitos[:, :1]).all(axis=1)
+    return (d1 == digitos[:, 9]) & (d2 == digitos[:, 10]) & ~repetidos
+
+
+def _validar_cnpj(digitos):
+    """Máscara de CNPJs válidos (matriz n x 14) pelos dois dígitos verificadores."""
+    r1 = (digitos[:, :12] @ _PESOS_CNPJ[1:]) % 11
+    r2 = (digitos[:, :13] @ _PESOS_CNPJ) % 11
+    d1 = np.where(r1 < 2, 0, 11 - r1)
+    d2 = np.where(r2 < 2, 0, 11 - r2)
+    repetidos = (digitos == digitos[:, :1]).all(axis=1)
+    return (d1 == digitos[:, 12]) & (d2 == digitos[:, 13]) & ~repetidos
+
+
+def _motivos_rejeicao(df):
+    """Código do motivo de rejeição de cada linha, calculado de forma vetorizada.
+
+    0 = linha válida; n > 0 = n-ésimo motivo de MOTIVOS_REJEICAO.
+
+    `numero` é o telefone já normalizado (DDD + número, sem o 55); `cnpj` só tem dígitos.
+    Documentos com até 11 dígitos são tratados como CPF e com 12 a 14 como CNPJ,
+    completando com zeros à esquerda (o Excel descarta os zeros de células numéricas).
+    """
+    numeros = df['numero'].to_numpy(dtype='int64', na_value=0)
+    fixo = (numeros >= 10 ** 9) & (numeros < 10 ** 10)
+    celular = (numeros >= 10 ** 10) & (numeros < 10 ** 11)
+    ddd = np.where(celular, numeros // 10 ** 9, numeros // 10 ** 8) % 100
+    primeiro_digito = np.where(celular, numeros // 10 ** 8, numeros // 10 ** 7) % 10
+    formato_ok = np.where(celular, primeiro_digito == 9, (primeiro_digito >= 2) & (primeiro_digito <= 5))
+
+    documentos = df['cnpj'].fillna('').astype(str)
+    tamanhos = documentos.str.len().to_numpy()
+    valores = np.zeros(len(df), dtype=np.int64)
+    tamanho_ok = (tamanhos >= 1) & (tamanhos <= 14)
+    valores[tamanho_ok] = documentos[tamanho_ok].astype('int64').to_numpy()
+    eh_cpf = tamanho_ok & (tamanhos <= 11)
+    eh_cnpj = tamanho_ok & (tamanhos >= 12)
+    documento_ok = np.zeros(len(df), dtype=bool)
+    documento_ok[eh_cpf] = _validar_cpf(_matriz_digitos(valores[eh_cpf], 11))
+    documento_ok[eh_cnpj] = _validar_cnpj(_matriz_digitos(valores[eh_cnpj], 14))
+
+    return np.select(
+        [numeros == 0, ~(fixo | celular), ~_DDD_VALIDO[ddd], ~formato_ok, tamanhos == 0, ~documento_ok],
+        np.arange(1, len(MOTIVOS_REJEICAO) + 1, dtype=np.int8),
+        default=0,
+    )
+
+
+class _Validador:
+    """Separa as linhas inválidas (ver MOTIVOS_REJEICAO) e as grava em um CSV de rejeitados.
+
+    `mascara(df, inicio)` devolve as linhas a manter; `inicio` é a posição da primeira linha
+    do bloco no upload, usada na coluna 'linha' (1 = primeira linha de dados). Se `df` não
+    tiver todas as linhas do upload, `linhas` traz a posição de cada uma. Os rejeitados
+    vão para um arquivo temporário à medida que aparecem (memória constante no streaming)
+    e `gravar(destino, nome)` os copia para o destino dos lotes.
+    """
+
+    def __init__(self):
+        self.validas = 0
+        self.por_motivo = dict.fromkeys(MOTIVOS_REJEICAO, 0)
+        self.arquivo = None
+        self.nome_arquivo = None
+        self._temp = None
+
+    @property
+    def rejeitadas(self):
+        return sum(self.por_motivo.values())
+
+    def mascara(self, df, inicio=0, linhas=None):
+        codigos = _motivos_rejeicao(df)
+        manter = codigos == 0
+        self.validas += int(manter.sum())
+        if not manter.all():
+            nomes_motivos = np.array(list(MOTIVOS_REJEICAO))
+            rejeitados = df.loc[~manter, ['numero', 'acao', 'cnpj']].copy()
+            posicoes = np.flatnonzero(~manter) if linhas is None else np.asarray(linhas)[~manter]
+            rejeitados.insert(0, 'linha', posicoes + inicio + 1)
+            rejeitados['motivo'] = nomes_motivos[codigos[~manter] - 1]
+            for motivo, total in zip(nomes_motivos, np.bincount(codigos, minlength=len(nomes_motivos) + 1)[1:]):
+                self.por_motivo[motivo] += int(total)
+            primeiro = self._temp is None
+            if primeiro:
+                self._temp = tempfile.SpooledTemporaryFile(max_size=ZIP_MAX_MEMORIA)
+            rejeitados.to_csv(self._temp, index=False, header=primeiro, encoding='utf-8-sig' if primeiro else 'utf-8',
+                              sep=';', quoting=csv.QUOTE_ALL)
+        return manter
+
+    def gravar(self, destino, nome):
+        """Grava o CSV de rejeitados no destino (se houver rejeitados) e retorna o nome gravado."""
+        if self._temp is None:
+            return None
+        self._temp.seek(0)
+        destino.gravar(nome, self._temp.read())
+        self._temp.close()
+        self._temp = None
+        self.nome_arquivo = nome
+        return nome
+
+    def resumo(self):
+        return {
+            'validas': self.validas,
+            'rejeitadas': self.rejeitadas,
+            'por_motivo': {motivo: total for motivo, total in self.por_motivo.items() if total},
+            'arquivo_rejeitados': self.nome_arquivo,
+        }
+
+
+# ============================================================================
+# DEDUPLICAÇÃO DE NÚMEROS (NO UPLOAD E CONTRA O ÍNDICE DA EMPRESA)
+# ============================================================================
+
+# Políticas de deduplicação: 'primeiro'/'ultimo' mantêm uma ocorrência de cada número;
+# 'conflito' mantém a primeira, mas mantém todas as linhas de números com CPF/CNPJ divergentes
+# e as lista no arquivo de conflitos (<prefixo>_conflitos.csv) para revisão
+POLITICAS_DEDUP = ('primeiro', 'ultimo', 'conflito')
+# Quantidade de números com conflito listados no resultado
+AMOSTRA_CONFLITOS = 100
+
+_LOCKS_INDICE = {}
+_LOCKS_INDICE_LOCK = threading.Lock()
+
+
+@contextmanager
+def _trava_arquivo(caminho):
+    """Lock exclusivo entre processos (workers do gunicorn/waitress) sobre o arquivo `caminho`."""
+    caminho.parent.mkdir(parents=True, exist_ok=True)
+    with open(caminho, 'a+b') as fh:
+        if os.name == 'nt':
+            import msvcrt
+            fh.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(fh.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    # LK_LOCK desiste depois de ~10 s: continua esperando
+                    pass
+            try:
+                yield
+            finally:
+                fh.seek(0)
+                msvcrt.locking(fh.fileno(), msvcrt.LK_UNLCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(fh.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(fh.fileno(), fcntl.LOCK_UN)
+
+
+class _IndiceNumeros:
+    """Índice persistente dos números já exportados de uma empresa/ação.
+
+    Array int64 ordenado e sem repetição gravado em .npy e aberto via mmap: a consulta
+    é uma busca binária vetorizada (np.searchsorted), sem carregar o arquivo inteiro.
+    A atualização (ler, intercalar, substituir) é feita sob um lock de threads e um lock
+    de arquivo (<índice>.lock), para jobs simultâneos da mesma empresa não perderem números.
+    """
+
+    def __init__(self, caminho):
+        self.caminho = Path(caminho)
+        with _LOCKS_INDICE_LOCK:
+            self.lock = _LOCKS_INDICE.setdefault(str(self.caminho.resolve()), threading.Lock())
+
+    def carregar(self):
+        try:
+            return np.load(self.caminho, mmap_mode='r')
+        except FileNotFoundError:
+            return np.empty(0, dtype=np.int64)
+        except ValueError:
+            # arquivo vazio não pode ser mapeado
+            return np.load(self.caminho)
+
+    @staticmethod
+    def contem(indice, numeros):
+        """Máscara booleana: quais `numeros` (int64) estão no `indice` ordenado."""
+        if not len(indice) or not len(numeros):
+            return np.zeros(len(numeros), dtype=bool)
+        pos = np.searchsorted(indice, numeros)
+        pos[pos >= len(indice)] = len(indice) - 1
+        return indice[pos] == numeros
+
+    def adicionar(self, numeros):
+        """Inclui `numeros` no índice (gravação atômica: .tmp + os.replace)."""
+        numeros = np.unique(np.asarray(numeros, dtype=np.int64))
+        if not len(numeros):
+            return
+        with self.lock, _trava_arquivo(self.caminho.with_name(self.caminho.name + '.lock')):
+            atual = self.carregar()
+            novo = np.union1d(np.asarray(atual), numeros).astype(np.int64)
+            del atual  # libera o mmap antes de substituir o arquivo (necessário no Windows)
+            self.caminho.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.caminho.with_name(self.caminho.name + '.tmp')
+            with open(tmp, 'wb') as fh:
+                np.save(fh, novo)
+            os.replace(tmp, self.caminho)
+
+
+class _Deduplicador:
+    """Filtra números repetidos no upload e (opcionalmente) já exportados no índice da empresa.
+
+    `mascara(df, linhas)` devolve as linhas a manter. Chamadas sucessivas (streaming) lembram os
+    números já vistos, o que só é possível com a política 'primeiro'; 'ultimo' e
+    'conflito' precisam do upload inteiro em uma única chamada. Linhas sem número
+    válido nunca são removidas. Os números vistos ficam em um array int64 ordenado (como
+    o índice da empresa): a consulta de cada bloco é uma busca binária vetorizada e os
+    novos números são intercalados na posição certa, sem reordenar o array.
+    Na política 'conflito' as linhas de números com CPF/CNPJ divergentes são mantidas e
+    listadas (com a posição no upload, de `linhas`) no CSV que `gravar(destino, nome)` grava.
+    """
+
+    def __init__(self, politica=None, indice=None):
+        self.politica = politica
+        self.indice = indice
+        self._indice_arr = indice.carregar() if indice else None
+        self._vistos = np.empty(0, dtype=np.int64)
+        self._novos = []
+        self.removidos_duplicados = 0
+        self.linhas_em_conflito = 0
+        self.ja_exportados = 0
+        self.conflitos = []
+        self.nome_arquivo = None
+        self._temp = None
+
+    def mascara(self, df, linhas=None):
+        serie = df['numero']
+        validos = serie.notna().to_numpy()
+        numeros = serie.to_numpy(dtype='int64', na_value=0)
+        manter = np.ones(len(df), dtype=bool)
+
+        if self.politica:
+            duplicados = serie.duplicated(keep='last' if self.politica == 'ultimo' else 'first').to_numpy() & validos
+            if len(self._vistos):
+                duplicados |= _IndiceNumeros.contem(self._vistos, numeros) & validos
+            if self.politica == 'conflito':
+                por_numero = df.loc[validos, ['numero', 'cnpj']].groupby('numero')['cnpj'].nunique()
+                divergentes = por_numero.index[por_numero > 1]
+                em_conflito = serie.isin(divergentes).to_numpy()
+                if len(self.conflitos) < AMOSTRA_CONFLITOS:
+                    amostra = df.loc[em_conflito].groupby('numero')['cnpj'].unique()
+                    for numero, cnpjs in amostra.head(AMOSTRA_CONFLITOS - len(self.conflitos)).items():
+                        self.conflitos.append({'numero': int(numero), 'cnpjs': sorted(str(c) for c in cnpjs)})
+                self.linhas_em_conflito += int(em_conflito.sum())
+                if em_conflito.any():
+                    self._anotar_conflitos(df, em_conflito, linhas)
+                # as linhas em conflito ficam todas (nenhuma é tratada como repetida)
+                duplicados &= ~em_conflito
+            self.removidos_duplicados += int(duplicados.sum())
+            manter &= ~duplicados
+
+        if self._indice_arr is not None:
+            exportados = _IndiceNumeros.contem(self._indice_arr, numeros) & validos & manter
+            self.ja_exportados += int(exportados.sum())
+            manter &= ~exportados
+            self._novos.append(numeros[manter & validos])
+
+        if self.politica == 'primeiro':
+            novos = np.unique(numeros[manter & validos])
+            self._vistos = np.insert(self._vistos, np.searchsorted(self._vistos, novos), novos)
+        return manter
+
+    def _anotar_conflitos(self, df, em_conflito, linhas):
+        conflitos = df.loc[em_conflito, ['numero', 'acao', 'cnpj']].copy()
+        posicoes = np.flatnonzero(em_conflito) if linhas is None else np.asarray(linhas)[em_conflito]
+        conflitos.insert(0, 'linha', posicoes + 1)
+        conflitos = conflitos.sort_values(['numero', 'linha'], kind='stable')
+        self._temp = tempfile.SpooledTemporaryFile(max_size=ZIP_MAX_MEMORIA)
+        conflitos.to_csv(self._temp, index=False, encoding='utf-8-sig', sep=';', quoting=csv.QUOTE_ALL)
+
+    def gravar(self, destino, nome):
+        """Grava o CSV de conflitos no destino (se houver conflitos) e retorna o nome gravado."""
+        if self._temp is None:
+            return None
+        self._temp.seek(0)
+        destino.gravar(nome, self._temp.read())
+        self._temp.close()
+        self._temp = None
+        self.nome_arquivo = nome
+        return nome
+
+    def gravar_indice(self):
+        """Acrescenta ao índice da empresa os números exportados neste processamento."""
+        self._indice_arr = None
+        if self.indice is not None and self._novos:
+            self.indice.adicionar(np.concatenate(self._novos))
+            self._novos = []
+
+    def resumo(self):
+        resumo = {
+            'politica': self.politica,
+            'removidos_duplicados': self.removidos_duplicados,
+            'usou_indice': self.indice is not None,
+        }
+        if self.politica == 'conflito':
+            resumo['linhas_em_conflito'] = self.linhas_em_conflito
+            resumo['conflitos'] = self.conflitos
+            resumo['arquivo_conflitos'] = self.nome_arquivo
+        if self.indice is not None:
+            resumo['ja_exportados'] = self.ja_exportados
+        return resumo
+
+
+def _caminho_indice_empresa(pasta_base_saida, company, acao):
+    """Índice dos números exportados da empresa para a ação (um arquivo por empresa/ação).
+
+    Fica fora de uploads_<empresa>/ para não entrar no ZIP baixado da pasta de saída.
+    """
+    acao = re.sub(r'[^a-z]', '', acao.lower()) or 'criar'
+    return Path(pasta_base_saida) / '.indice_numeros' / f"{company}_{acao}.npy"
+
+
+# ============================================================================
+# MODO DELTA (DIFERENÇA CONTRA A ÚLTIMA EXPORTAÇÃO DA EMPRESA)
+# ============================================================================
+
+def _caminho_snapshot_delta(pasta_base_saida, company, acao):
+    """Snapshot do último conjunto exportado da empresa para a ação (sem extensão: .feather ou .pkl).
+
+    Fica fora de uploads_<empresa>/ (como o índice de números) para não entrar no ZIP da pasta.
+    """
+    acao = re.sub(r'[^a-z]', '', acao.lower()) or 'criar'
+    return Path(pasta_base_saida) / '.snapshots' / f"{company}_{acao}"
+
+
+class _Delta:
+    """Compara o upload com o snapshot da última exportação e mantém só o que mudou.
+
+    `mascara(df)` mantém as linhas com número novo ou com CPF/CNPJ diferente do snapshot
+    (junção por hash em `numero`); os números do snapshot ausentes no upload ficam em
+    `removidos`. Sem snapshot anterior, todas as linhas são novas. `gravar_snapshot()`
+    substitui o snapshot pelo upload atual (um registro por número, vale a última linha).
+    """
+
+    def __init__(self, caminho):
+        self.caminho = Path(caminho)
+        self.anterior = self._ler()
+        self.atual = None
+        self.removidos = None
+        self.adicionadas = 0
+        self.alteradas = 0
+        self.inalteradas = 0
+
+    def _ler(self):
+        for sufixo, ler in (('.feather', pd.read_feather), ('.pkl', pd.read_pickle)):
+            arquivo = self.caminho.with_suffix(sufixo)
+            if arquivo.exists():
+                return ler(arquivo)
+        return None
+
+    def mascara(self, df):
+        self.atual = (df.loc[df['numero'].notna(), ['numero', 'cnpj']]
+                      .drop_duplicates('numero', keep='last').reset_index(drop=True))
+        self.atual['cnpj'] = self.atual['cnpj'].fillna('').astype(str)
+        if self.anterior is None:
+            self.adicionadas = len(df)
+            self.removidos = self.atual.iloc[:0]
+            return np.ones(len(df), dtype=bool)
+
+        cnpj_anterior = df['numero'].map(self.anterior.set_index('numero')['cnpj'])
+        novas = cnpj_anterior.isna().to_numpy()
+        alteradas = ~novas & (cnpj_anterior.fillna('') != df['cnpj'].fillna('').astype(str)).to_numpy()
+        self.adicionadas = int(novas.sum())
+        self.alteradas = int(alteradas.sum())
+        self.inalteradas = len(df) - self.adicionadas - self.alteradas
+        self.removidos = self.anterior[~self.anterior['numero'].isin(self.atual['numero'])].reset_index(drop=True)
+        return novas | alteradas
+
+    def gravar_snapshot(self):
+        """Grava o upload atual como snapshot (Feather se houver pyarrow, senão pickle; troca atômica)."""
+        if self.atual is None:
+            return
+        self.caminho.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            destino = self.caminho.with_suffix('.feather')
+            tmp = destino.with_name(destino.name + '.tmp')
+            self.atual.to_feather(tmp)
+        except ImportError:
+            destino = self.caminho.with_suffix('.pkl')
+            tmp = destino.with_name(destino.name + '.tmp')
+            self.atual.to_pickle(tmp)
+        os.replace(tmp, destino)
+        # remove o snapshot no outro formato, se existir, para não ser lido no lugar deste
+        for antigo in (self.caminho.with_suffix('.feather'), self.caminho.with_suffix('.pkl')):
+            if antigo != destino and antigo.exists():
+                antigo.unlink()
+
+    def resumo(self, arquivos_remocao):
+        return {
+            'snapshot_anterior': self.anterior is not None,
+            'adicionadas': self.adicionadas,
+            'alteradas': self.alteradas,
+            'inalteradas': self.inalteradas,
+            'removidas': len(self.removidos) if self.removidos is not None else 0,
+            'arquivos_remocao': arquivos_remocao,
+        }
+
+
+# ============================================================================
+# CACHE DE RESULTADOS (POR HASH DO CONTEÚDO ENVIADO)
+# ============================================================================
+
+def _hash_arquivo(caminho):
+    """SHA-256 do conteúdo do arquivo, lido em blocos."""
+    h = hashlib.sha256()
+    with open(caminho, 'rb') as fh:
+        for bloco in iter(lambda: fh.read(1024 * 1024), b''):
+            h.update(bloco)
+    return h.hexdigest()
+
+
+def _dir_cache_resultados():
+    return DIR_CACHE / 'resultados'
+
+
+def _chave_cache_resultado(hash_conteudo, posicoes, aba=None):
+    """Chave do cache: hash do arquivo + VERSAO_CACHE + posições das colunas mapeadas e aba (mudam o df normalizado).
+
+    `posicoes` são as posições de 'numero', 'cnpj' e 'acao' no cabeçalho, depois de resolvido o
+    mapeamento (_mapeamento_do_cabecalho): um mapeamento confirmado diferente para o mesmo
+    cabeçalho, informado agora ou antes, gera outra chave.
+    """
+    mapa = {'posicoes': list(posicoes)}
+    if aba is not None:
+        mapa['_aba'] = aba
+    sufixo = hashlib.sha1(json.dumps(mapa, sort_keys=True).encode('utf-8')).hexdigest()[:12]
+    return f"{hash_conteudo}_v{VERSAO_CACHE}_{sufixo}"
+
+
+def _ler_cache_resultado(chave):
+    """Retorna (df_sel, mapping) do cache, ou None. Atualiza o mtime (ordem de uso da evicção)."""
+    pasta = _dir_cache_resultados()
+    meta = pasta / f"{chave}.json"
+    if not meta.exists():
+        return None
+    try:
+        with open(meta, 'r', encoding='utf-8') as fh:
+            info = json.load(fh)
+        dados = pasta / info['arquivo']
+        if dados.suffix == '.feather':
+            df_sel = pd.read_feather(dados)
+        else:
+            df_sel = pd.read_pickle(dados)
+        agora = time.time()
+        os.utime(meta, (agora, agora))
+        os.utime(dados, (agora, agora))
+        return df_sel, info['mapping']
+    except Exception:
+        return None
+
+
+def _gravar_cache_resultado(chave, df_sel, mapping):
+    """Grava o df normalizado (Feather se pyarrow estiver disponível, senão pickle) e aplica o limite de tamanho."""
+    pasta = _dir_cache_resultados()
+    try:
+        pasta.mkdir(parents=True, exist_ok=True)
+        df_sel = df_sel.reset_index(drop=True)
+        try:
+            dados = pasta / f"{chave}.feather"
+            tmp = dados.with_name(dados.name + '.tmp')
+            df_sel.to_feather(tmp)
+        except ImportError:
+            dados = pasta / f"{chave}.pkl"
+            tmp = dados.with_name(dados.name + '.tmp')
+            df_sel.to_pickle(tmp)
+        os.replace(tmp, dados)
+        meta = pasta / f"{chave}.json"
+        tmp = meta.with_name(meta.name + '.tmp')
+        with open(tmp, 'w', encoding='utf-8') as fh:
+            json.dump({'arquivo': dados.name, 'mapping': mapping}, fh)
+        os.replace(tmp, meta)
+        _evictar_cache_resultados()
+    except Exception as e:
+        print(f"✗ Aviso: não foi possível gravar o cache de resultados: {e}")
+
+
+def _evictar_cache_resultados():
+    """Remove as entradas usadas há mais tempo até o cache caber em CACHE_RESULTADOS_MAX_MB."""
+    limite = CACHE_RESULTADOS_MAX_MB * 1024 * 1024
+    entradas = []
+    total = 0
+    for meta in _dir_cache_resultados().glob('*.json'):
+        try:
+            chave = meta.stem
+            arquivos = [meta] + [p for p in meta.parent.glob(f"{chave}.*") if p.suffix in ('.feather', '.pkl')]
+            tamanho = sum(p.stat().st_size for p in arquivos)
+            entradas.append((meta.stat().st_mtime, tamanho, arquivos))
+            total += tamanho
+        except OSError:
+            continue
+    for _, tamanho, arquivos in sorted(entradas, key=lambda e: e[0]):
+        if total <= limite:
+            break
+        for p in arquivos:
+            try:
+                p.unlink()
+            except OSError:
+                pass
+        total -= tamanho
+
+
+def _montar_resultado(destino, arquivos_criados, total_linhas, mapping, preview, output_format, file_prefix, streaming=False):
+    """Monta o dicionário de resultado conforme o destino dos lotes (pasta + base64, ou ZIP)."""
+    resultado = {
+        "success": True,
+        "total_files": len(arquivos_criados),
+        "total_lines": total_linhas,
+        "output_folder": None,
+        "files": arquivos_criados,
+        "files_data": [],
+        "column_mapping": mapping,
+        "preview": preview,
+        "requested_format": output_format
+    }
+    if streaming:
+        resultado["streaming"] = True
+
+    if isinstance(destino, _DestinoZip):
+        resultado["zip_name"] = f"{file_prefix}.zip"
+        resultado["zip_file"] = destino.finalizar()
+        return resultado
+
+    pasta_saida_final = destino.pasta
+    resultado["output_folder"] = str(pasta_saida_final)
+    if streaming:
+        return resultado
+
+    # Empacota conteúdo dos arquivos para enviar ao cliente (base64)
+    files_data = []
+    for p in arquivos_criados:
+        fullpath = pasta_saida_final / p
+        try:
+            with open(fullpath, 'rb') as fh:
+                data = fh.read()
+            b64 = base64.b64encode(data).decode('ascii')
+            files_data.append({
+                'name': p,
+                'content_b64': b64
+            })
+        except Exception:
+            # se falhar ao ler, ainda inclui o nome
+            files_data.append({'name': p, 'content_b64': None})
+    resultado["files_data"] = files_data
+    return resultado
+
+
+# Motivo de falha informado no resultado, conforme a etapa em que o erro ocorreu
+MOTIVOS_FALHA = {
+    'leitura': 'arquivo_ilegivel',
+    'deteccao_colunas': 'colunas_ausentes',
+    'normalizacao': 'erro_normalizacao',
+    'transformacao_lista': 'erro_normalizacao',
+    'escrita_lotes': 'erro_escrita',
+    'empacotamento': 'erro_escrita',
+    'deduplicacao': 'erro_deduplicacao',
+    'validacao': 'erro_validacao',
+    'delta': 'erro_delta',
+}
+
+
+def processar_arquivo_excel(caminho_arquivo_entrada, acao, empresa_raw, tamanho_lote, pasta_base_saida, explicit_mapping=None, output_format='planilha', streaming=False, progresso=None, entrega='base64', workers_escrita=None, pool_escrita=None, motor_xlsx=None, usar_cache=None, hash_conteudo=None, nome_arquivo=None, deduplicar=None, usar_indice=False, validar=False, delta=False, abas=None):
+    """
+    Função principal adaptada para ser chamada por uma API.
+    Recebe todos os parâmetros necessários e retorna um dicionário com o resultado.
+
+    Com `streaming=True` o arquivo é lido e gravado em blocos (memória constante) e o
+    conteúdo dos lotes não é devolvido em `files_data` (use o download em ZIP da pasta).
+
+    `explicit_mapping` ('numero_col', 'cnpj_col', 'acao_col') fixa as colunas de origem, nos dois
+    modos e antes da detecção automática. A coluna de ação indicada só aparece em `column_mapping`:
+    nos lotes a ação é sempre `acao` (como no código original, que sobrescrevia a coluna).
+
+    `progresso`, se informado, é chamado como progresso(linhas_processadas, total_linhas,
+    lotes_gravados) à medida que os lotes são gravados (total_linhas pode ser None).
+
+    Com `entrega='zip'` os lotes são gravados direto em um ZIP (sem passar pela pasta de
+    saída) devolvido em `zip_file`, um arquivo aberto posicionado no início; quem chama é
+    responsável por fechá-lo.
+
+    `workers_escrita`/`pool_escrita` ('processos' ou 'threads') controlam a serialização
+    paralela dos lotes; o padrão vem de AIA_WORKERS_ESCRITA/AIA_POOL_ESCRITA.
+
+    `motor_xlsx` ('rapido' ou 'openpyxl') escolhe o gerador dos .xlsx do formato 'lista';
+    o padrão vem de AIA_MOTOR_XLSX.
+
+    Fora do modo streaming, o resultado normalizado é guardado em cache pelo SHA-256 do
+    conteúdo (`hash_conteudo`, calculado se não for informado): reenviar o mesmo arquivo
+    com outra empresa/ação/lote pula a leitura e a normalização. `usar_cache` (padrão
+    AIA_CACHE_RESULTADOS) desliga o cache.
+
+    O resultado traz em `timings` o tempo e o pico de memória de cada etapa (leitura,
+    deteccao_colunas, normalizacao, transformacao_lista, escrita_lotes, empacotamento...);
+    com AIA_LOG_TIMINGS configurado, cada processamento também gera um log JSON
+    (`nome_arquivo` é o nome original do upload, usado só nesse log). Em caso de falha,
+    `motivo_falha` classifica o erro (ver MOTIVOS_FALHA; 'outro' se não se encaixar).
+
+    `caminho_arquivo_entrada` também pode ser uma lista de arquivos (com `nome_arquivo` e
+    `hash_conteudo` como listas na mesma ordem): cada um é normalizado com o seu próprio
+    mapeamento (em paralelo, até AIA_WORKERS_LEITURA workers), os dados são concatenados
+    nessa ordem e divididos em uma única sequência de lotes. `arquivos_entrada` traz os
+    totais de cada arquivo e as faixas de linhas/lotes que ele ocupa na saída.
+
+    `deduplicar` ('primeiro', 'ultimo' ou 'conflito'; ver POLITICAS_DEDUP) remove números
+    repetidos no upload (em vários arquivos, entre todos eles); com `usar_indice=True` também
+    são removidos os números já exportados antes pela mesma empresa/ação (índice persistido
+    em <pasta_base_saida>/.indice_numeros/), e os exportados agora são acrescentados ao índice ao final.
+    As contagens vêm em `deduplicacao`. No modo streaming só a política 'primeiro' é aceita.
+    Na política 'conflito' os números com CPF/CNPJ divergentes ficam nos lotes e as suas linhas
+    vão para `<prefixo>_conflitos.csv`, gravado junto com os lotes (`arquivo_conflitos`).
+
+    Com `validar=True` as linhas com telefone, DDD ou CPF/CNPJ inválidos (ver MOTIVOS_REJEICAO)
+    saem dos lotes e vão para `<prefixo>_rejeitados.csv`, gravado junto com os lotes, com a
+    linha de origem e o motivo; as contagens vêm em `validacao`.
+
+    Com `delta=True` o upload (normalmente a lista completa) é comparado com o snapshot da
+    última exportação da empresa para a mesma ação: só as linhas com número novo ou CPF/CNPJ
+    alterado viram lotes, e os números que saíram da lista viram uma sequência de lotes
+    Deletar_numeros_<empresa> (exceto quando a própria ação é 'deletar'). O snapshot é
+    substituído pelo upload atual ao final; as contagens vêm em `delta`. A comparação e o
+    snapshot usam o upload inteiro, antes da validação e da deduplicação, que só se aplicam
+    às linhas que vão para os lotes. Indisponível no modo streaming.
+
+    Por padrão só a primeira aba de cada pasta de trabalho é lida. `abas='todas'` lê todas
+    as abas com dados e uma lista de nomes lê essas abas (em toda pasta de trabalho
+    enviada). Cada aba é tratada como um arquivo à parte: lida em paralelo no pool de
+    leitura, com o seu próprio mapeamento de colunas e na mesma sequência de lotes;
+    `arquivos_entrada` traz um item por aba (com o campo `aba`).
+    """
+    medicao = Medicao()
+    resultado = _processar_arquivo_excel(
+        caminho_arquivo_entrada, acao, empresa_raw, tamanho_lote, pasta_base_saida, explicit_mapping,
+        output_format, streaming, progresso, entrega, workers_escrita, pool_escrita, motor_xlsx,
+        usar_cache, hash_conteudo, nome_arquivo, deduplicar, usar_indice, validar, delta, abas, medicao)
+    resultado["timings"] = medicao.resumo()
+    if not resultado.get('success'):
+        resultado["motivo_falha"] = MOTIVOS_FALHA.get(medicao.etapa_falha, 'outro')
+    caminhos = caminho_arquivo_entrada if isinstance(caminho_arquivo_entrada, (list, tuple)) else [caminho_arquivo_entrada]
+    try:
+        tamanho_bytes = sum(os.path.getsize(c) for c in caminhos)
+    except OSError:
+        tamanho_bytes = None
+    registrar_log(
+        'processamento',
+        arquivo=nome_arquivo or [Path(c).name for c in caminhos],
+        empresa=empresa_raw,
+        tamanho_bytes=tamanho_bytes,
+        formato=output_format,
+        entrega=entrega,
+        streaming=bool(streaming),
+        success=resultado.get('success'),
+        erro=resultado.get('error'),
+        linhas=resultado.get('total_lines'),
+        lotes=resultado.get('total_files'),
+        cache_hit=resultado.get('cache_hit'),
+        motivo_falha=resultado.get('motivo_falha'),
+        timings=resultado["timings"],
+    )
+    return resultado
+
+
+def _processar_arquivo_excel(caminho_arquivo_entrada, acao, empresa_raw, tamanho_lote, pasta_base_saida, explicit_mapping, output_format, streaming, progresso, entrega, workers_escrita, pool_escrita, motor_xlsx, usar_cache, hash_conteudo, nome_arquivo, deduplicar, usar_indice, validar, delta, abas, medicao):
+    """Corpo de processar_arquivo_excel; as etapas são medidas em `medicao`."""
+    multiplos = isinstance(caminho_arquivo_entrada, (list, tuple))
+    try:
+        # Sanitização
+        company = re.sub(r'[^A-Za-z0-9_-]', '', empresa_raw.replace(' ', '_'))
+        if not company:
+            return {"success": False, "error": "Nome da empresa inválido."}
+
+        prefix_map = {
+            'criar': 'Cadastro_numeros',
+            'alterar': 'Alterar_numeros',
+            'deletar': 'Deletar_numeros'
+        }
+        prefix = prefix_map.get(acao.lower(), 'Cadastro_numeros')
+        file_prefix = f"{prefix}_{company}"
+
+        # Pasta de saída (no modo ZIP os lotes não passam pelo disco)
+        pasta_saida_final = Path(pasta_base_saida) / f"uploads_{company}"
+        if entrega == 'zip':
+            destino = _DestinoZip()
+        else:
+            pasta_saida_final.mkdir(parents=True, exist_ok=True)
+            destino = _DestinoPasta(pasta_saida_final)
+
+        # Ajusta tamanho de lote
+        try:
+            tamanho_lote = int(tamanho_lote)
+        except Exception:
+            tamanho_lote = TAMANHO_LOTE
+        if tamanho_lote <= 0:
+            tamanho_lote = TAMANHO_LOTE
+
+        caminhos_in = [Path(c) for c in (caminho_arquivo_entrada if multiplos else [caminho_arquivo_entrada])]
+        if not caminhos_in:
+            return {"success": False, "error": "Nenhum arquivo de entrada."}
+        if nome_arquivo:
+            nomes = list(nome_arquivo) if multiplos else [nome_arquivo]
+        else:
+            nomes = [c.name for c in caminhos_in]
+        hashes = (hash_conteudo if multiplos else [hash_conteudo]) or [None] * len(caminhos_in)
+
+        # Abas: cada aba pedida de cada pasta de trabalho vira uma unidade de entrada (como um arquivo)
+        abas = _selecao_abas(abas)
+        abas_por_unidade = [None] * len(caminhos_in)
+        if abas is not None:
+            try:
+                with medicao.etapa('leitura'):
+                    caminhos_in, nomes, hashes, abas_por_unidade = _expandir_abas(caminhos_in, nomes, hashes, abas)
+            except ValueError as e:
+                return {"success": False, "error": str(e)}
+        rotulos = [n if a is None else f"{n} [{a}]" for n, a in zip(nomes, abas_por_unidade)]
+        por_unidade = multiplos or abas is not None
+        extras_abas = {'aba': abas_por_unidade} if abas is not None else {}
+
+        # Deduplicação (no upload e/ou contra o índice de números já exportados da empresa)
+        deduplicar = (deduplicar or '').strip().lower() or None
+        if deduplicar and deduplicar not in POLITICAS_DEDUP:
+            return {"success": False, "error": f"Política de deduplicação inválida: '{deduplicar}'. Use uma de: {', '.join(POLITICAS_DEDUP)}."}
+        if streaming and deduplicar not in (None, 'primeiro'):
+            return {"success": False, "error": "No modo streaming a deduplicação só aceita a política 'primeiro'."}
+        deduplicador = None
+        if deduplicar or usar_indice:
+            indice = _IndiceNumeros(_caminho_indice_empresa(pasta_base_saida, company, acao)) if usar_indice else None
+            deduplicador = _Deduplicador(deduplicar, indice)
+        validador = _Validador() if validar else None
+        if delta and streaming:
+            return {"success": False, "error": "O modo delta não está disponível no modo streaming."}
+        comparador = _Delta(_caminho_snapshot_delta(pasta_base_saida, company, acao)) if delta else None
+        nome_rejeitados = f"{file_prefix}_rejeitados.csv"
+
+        # Escritor dos lotes (serialização paralela opcional)
+        if workers_escrita is None:
+            workers_escrita = WORKERS_ESCRITA
+        escritor = _EscritorLotes(destino, file_prefix, output_format, workers=max(int(workers_escrita), 1),
+                                  tipo_pool=pool_escrita or POOL_ESCRITA, progresso=progresso,
+                                  motor_xlsx=motor_xlsx or MOTOR_XLSX)
+
+        if streaming:
+            try:
+                total_linhas, mapping, preview, linhas_por_arquivo, mappings = _processar_em_fluxo(
+                    caminhos_in, acao, tamanho_lote, escritor, explicit_mapping, output_format, medicao,
+                    deduplicador, validador, abas_por_unidade)
+                with medicao.etapa('escrita_lotes'):
+                    arquivos_criados = escritor.finalizar()
+                    if validador is not None:
+                        validador.gravar(destino, nome_rejeitados)
+                if deduplicador is not None:
+                    with medicao.etapa('deduplicacao'):
+                        deduplicador.gravar_indice()
+            except Exception as e:
+                return {"success": False, "error": f"Erro no processamento em streaming: {e}"}
+            with medicao.etapa('empacotamento'):
+                resultado = _montar_resultado(destino, arquivos_criados, total_linhas, mapping, preview,
+                                              output_format, file_prefix, streaming=True)
+            if por_unidade:
+                resultado["arquivos_entrada"] = _resumo_por_arquivo(nomes, linhas_por_arquivo, mappings, tamanho_lote,
+                                                                    extras=extras_abas)
+            if deduplicador is not None:
+                resultado["deduplicacao"] = deduplicador.resumo()
+            if validador is not None:
+                resultado["validacao"] = validador.resumo()
+            return resultado
+
+        # Mapeamento de colunas de cada arquivo/aba, resolvido uma vez pelo cabeçalho (e o cache
+        # de mapeamento consultado/gravado uma vez): segue para a leitura e para a chave do cache
+        colunas_maps = [None] * len(caminhos_in)
+        posicoes_map = [None] * len(caminhos_in)
+        with medicao.etapa('deteccao_colunas'):
+            for i, caminho_in in enumerate(caminhos_in):
+                colunas_maps[i], posicoes_map[i] = _mapeamento_do_cabecalho(caminho_in, explicit_mapping,
+                                                                            abas_por_unidade[i])
+
+        # Cache por conteúdo: o mesmo arquivo (com as mesmas colunas mapeadas) pula leitura e normalização
+        chaves_cache = [None] * len(caminhos_in)
+        normalizados = [None] * len(caminhos_in)
+        if usar_cache is None:
+            usar_cache = CACHE_RESULTADOS
+        if usar_cache:
+            for i, caminho_in in enumerate(caminhos_in):
+                if posicoes_map[i] is None:
+                    # sem o mapeamento resolvido não há como saber qual df normalizado estaria em cache
+                    continue
+                try:
+                    with medicao.etapa('cache'):
+                        chaves_cache[i] = _chave_cache_resultado(hashes[i] or _hash_arquivo(caminho_in), posicoes_map[i],
+                                                                 abas_por_unidade[i])
+                        em_cache = _ler_cache_resultado(chaves_cache[i])
+                    if em_cache is not None:
+                        normalizados[i] = em_cache + (None,)
+                except Exception:
+                    chaves_cache[i] = None
+        cache_hits = [n is not None for n in normalizados]
+
+        # Carrega e normaliza os arquivos/abas fora do cache (vários: em paralelo)
+        faltantes = [i for i, n in enumerate(normalizados) if n is None]
+        if faltantes:
+            try:
+                novos = _normalizar_arquivos([caminhos_in[i] for i in faltantes], [rotulos[i] for i in faltantes],
+                                             explicit_mapping, medicao, [abas_por_unidade[i] for i in faltantes],
+                                             [colunas_maps[i] for i in faltantes],
+                                             POOL_ABAS if abas is not None else POOL_LEITURA)
+            except _ErroEntrada as e:
+                return {"success": False, "error": e.mensagem}
+            for i, normalizado in zip(faltantes, novos):
+                normalizados[i] = normalizado
+                if chaves_cache[i]:
+                    with medicao.etapa('cache'):
+                        _gravar_cache_resultado(chaves_cache[i], normalizado[0], normalizado[1])
+
+        mapping = normalizados[0][1]
+        linhas_por_arquivo = [len(n[0]) for n in normalizados]
+        if len(normalizados) > 1:
+            with medicao.etapa('concatenacao'):
+                df_sel = pd.concat([n[0] for n in normalizados], ignore_index=True)
+        else:
+            df_sel = normalizados[0][0]
+
+        # Sobrescreve a ação conforme parâmetro (garante consistência)
+        df_sel['acao'] = acao.lower()
+
+        # Filtros opcionais (delta, validação e deduplicação); `origem` é o arquivo (ou aba) de cada
+        # linha, para refazer as faixas em arquivos_entrada e contar os removidos de cada arquivo, e
+        # `posicoes` a linha no upload (para o arquivo de rejeitados). O delta vem primeiro e vê o
+        # upload inteiro: a comparação e o snapshot refletem a lista completa, não o que sobraria
+        # depois da validação/deduplicação; os demais filtros só veem as linhas que vão sair.
+        origem = np.repeat(np.arange(len(linhas_por_arquivo)), linhas_por_arquivo)
+        posicoes = np.arange(len(df_sel))
+        extras = {}
+        for etapa, filtro, campo in (('delta', comparador, 'inalteradas_delta'),
+                                     ('validacao', validador, 'rejeitadas_validacao'),
+                                     ('deduplicacao', deduplicador, 'removidos_deduplicacao')):
+            if filtro is None:
+                continue
+            with medicao.etapa(etapa):
+                manter = filtro.mascara(df_sel) if filtro is comparador else filtro.mascara(df_sel, linhas=posicoes)
+                extras[campo] = np.bincount(origem[~manter], minlength=len(linhas_por_arquivo)).tolist()
+                df_sel = df_sel[manter].reset_index(drop=True)
+                origem = origem[manter]
+                posicoes = posicoes[manter]
+        if extras:
+            linhas_por_arquivo = np.bincount(origem, minlength=len(linhas_por_arquivo)).tolist()
+
+        if por_unidade:
+            arquivos_entrada = _resumo_por_arquivo(nomes, linhas_por_arquivo, [n[1] for n in normalizados],
+                                                   tamanho_lote, cache_hits, [n[2] for n in normalizados],
+                                                   {**extras_abas, **extras})
+        del normalizados
+
+        # Se o formato solicitado é 'lista', adicionar vírgula à direita do número
+        if str(output_format).lower() == 'lista':
+            try:
+                # garantir que número seja string e manter apenas dígitos antes de adicionar
+                # a vírgula final; NÃO prefixamos aspa, pois vamos gerar XLSX
+                with medicao.etapa('transformacao_lista'):
+                    df_sel['numero'] = _formatar_numeros_lista(df_sel['numero'])
+            except Exception:
+                pass
+
+        # preparar preview com primeiras linhas para retorno (ajuda no debug/validação)
+        try:
+            preview = df_sel.head(5).to_dict(orient='records')
+        except Exception:
+            preview = []
+
+        total_linhas = len(df_sel)
+        escritor.total_linhas = total_linhas
+
+        if progresso:
+            progresso(0, total_linhas, 0)
+
+        with medicao.etapa('escrita_lotes'):
+            colunas = _colunas_texto(df_sel)
+            del df_sel
+            escritor.enviar_colunas(colunas, tamanho_lote, 1)
+            del colunas
+            arquivos_criados = escritor.finalizar()
+            if validador is not None:
+                validador.gravar(destino, nome_rejeitados)
+            if deduplicador is not None:
+                deduplicador.gravar(destino, f"{file_prefix}_conflitos.csv")
+
+        # Modo delta: números que saíram da lista viram lotes de remoção; depois o snapshot é atualizado
+        arquivos_remocao = []
+        if comparador is not None:
+            with medicao.etapa('delta'):
+                removidos = comparador.removidos
+                if len(removidos) and acao.lower() != 'deletar':
+                    df_rem = pd.DataFrame({'numero': removidos['numero'], 'acao': 'deletar', 'cnpj': removidos['cnpj']})
+                    if str(output_format).lower() == 'lista':
+                        df_rem['numero'] = _formatar_numeros_lista(df_rem['numero'])
+                    escritor_remocao = _EscritorLotes(destino, f"{prefix_map['deletar']}_{company}", output_format,
+                                                      workers=max(int(workers_escrita), 1),
+                                                      tipo_pool=pool_escrita or POOL_ESCRITA,
+                                                      motor_xlsx=motor_xlsx or MOTOR_XLSX)
+                    escritor_remocao.enviar_colunas(_colunas_texto(df_rem), tamanho_lote, 1)
+                    arquivos_remocao = escritor_remocao.finalizar()
+                comparador.gravar_snapshot()
+
+        if deduplicador is not None:
+            with medicao.etapa('deduplicacao'):
+                deduplicador.gravar_indice()
+
+        with medicao.etapa('empacotamento'):
+            resultado = _montar_resultado(destino, arquivos_criados + arquivos_remocao, total_linhas, mapping,
+                                          preview, output_format, file_prefix)
+        resultado["cache_hit"] = all(cache_hits)
+        if por_unidade:
+            resultado["arquivos_entrada"] = arquivos_entrada
+        if deduplicador is not None:
+            resultado["deduplicacao"] = deduplicador.resumo()
+            # entrega em base64: o CSV de conflitos acompanha os lotes (como o de rejeitados)
+            if deduplicador.nome_arquivo and isinstance(destino, _DestinoPasta):
+                with open(destino.pasta / deduplicador.nome_arquivo, 'rb') as fh:
+                    resultado["conflitos_data"] = {'name': deduplicador.nome_arquivo,
+                                                   'content_b64': base64.b64encode(fh.read()).decode('ascii')}
+        if comparador is not None:
+            resultado["delta"] = comparador.resumo(arquivos_remocao)
+        if validador is not None:
+            resultado["validacao"] = validador.resumo()
+            # entrega em base64: o CSV de rejeitados acompanha os lotes (mesmo formato de files_data)
+            if validador.nome_arquivo and isinstance(destino, _DestinoPasta):
+                with open(destino.pasta / validador.nome_arquivo, 'rb') as fh:
+                    resultado["rejeitados_data"] = {'name': validador.nome_arquivo,
+                                                    'content_b64': base64.b64encode(fh.read()).decode('ascii')}
+        return resultado
+
+    except Exception as e:
+        return {"success": False, "error": str(e)}
+
+
+# ============================================================================
+# INSPEÇÃO RÁPIDA (CABEÇALHO + PRIMEIRAS LINHAS)
+# ============================================================================
+
+_NS_PLANILHA = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+_NS_REL_DOC = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}'
+_NS_REL_PKG = '{http://schemas.openxmlformats.org/package/2006/relationships}'
+
+
+def _xlsx_abas(zf):
+    """Lista (nome, caminho do XML dentro do zip) das planilhas, na ordem do workbook.xml.
+
+    Abas de gráfico (chartsheets) ficam de fora: não têm linhas.
+    """
+    workbook = ET.fromstring(zf.read('xl/workbook.xml'))
+    rels = ET.fromstring(zf.read('xl/_rels/workbook.xml.rels'))
+    alvos = {}
+    for rel in rels.iter(f'{_NS_REL_PKG}Relationship'):
+        if rel.get('Type', '').endswith('/worksheet'):
+            alvo = rel.get('Target').lstrip('/')
+            alvos[rel.get('Id')] = alvo if alvo.startswith('xl/') else f'xl/{alvo}'
+    abas = []
+    for aba in workbook.iterfind(f'{_NS_PLANILHA}sheets/{_NS_PLANILHA}sheet'):
+        alvo = alvos.get(aba.get(f'{_NS_REL_DOC}id'))
+        if alvo:
+            abas.append((aba.get('name'), alvo))
+    return abas
+
+
+def _xlsx_caminho_aba(zf, aba=None):
+    """Caminho (dentro do zip) do XML da aba `aba` (pelo nome) ou, sem ela, da primeira aba."""
+    if aba is not None:
+        for nome, alvo in _xlsx_abas(zf):
+            if nome == aba:
+                return alvo
+        raise ValueError(f"Aba '{aba}' não encontrada.")
+    try:
+        abas = _xlsx_abas(zf)
+        if abas:
+            return abas[0][1]
+    except Exception:
+        pass
+    return 'xl/worksheets/sheet1.xml'
+
+
+def _xlsx_indice_coluna(ref):
+    """Converte a referência de célula (ex.: 'AB12') no índice da coluna (base 0)."""
+    indice = 0
+    for ch in ref:
+        if not ch.isalpha():
+            break
+        indice = indice * 26 + (ord(ch.upper()) - 64)
+    return indice - 1
+
+
+def _xlsx_indices_celulas(celulas, indice_da_referencia=_xlsx_indice_coluna):
+    """Índice da coluna de cada <c> de uma linha: pelo atributo r ('B7') ou, sem ele, logo após a anterior.
+
+    O formato permite omitir r (alguns geradores fazem isso); a célula então ocupa a coluna
+    seguinte à da célula anterior da mesma linha.
+    """
+    indices = []
+    anterior = -1
+    for c in celulas:
+        ref = c.get('r')
+        anterior = indice_da_referencia(ref) if ref else anterior + 1
+        indices.append(anterior)
+    return indices
+
+
+def _xlsx_formatos_data(zf):
+    """Estilos de célula (índice em cellXfs, o atributo s) com formato de data/hora, como o openpyxl os identifica.
+
+    Retorna (datas, duracoes, epoca): os índices dos estilos de data, os de duração ([h]:mm)
+    e a data-base dos números seriais (1904 se o workbook assim indicar).
+    """
+    from openpyxl.styles.numbers import builtin_format_code, is_date_format, is_timedelta_format
+    from openpyxl.utils.datetime import MAC_EPOCH, WINDOWS_EPOCH
+
+    datas, duracoes = set(), set()
+    if 'xl/styles.xml' in zf.namelist():
+        estilos = ET.fromstring(zf.read('xl/styles.xml'))
+        personalizados = {int(f.get('numFmtId')): f.get('formatCode', '')
+                          for f in estilos.iterfind(f'{_NS_PLANILHA}numFmts/{_NS_PLANILHA}numFmt')}
+        for i, xf in enumerate(estilos.iterfind(f'{_NS_PLANILHA}cellXfs/{_NS_PLANILHA}xf')):
+            id_formato = int(xf.get('numFmtId', 0))
+            formato = personalizados.get(id_formato) or builtin_format_code(id_formato)
+            if formato and is_date_format(formato):
+                datas.add(i)
+            if formato and is_timedelta_format(formato):
+                duracoes.add(i)
+    epoca = WINDOWS_EPOCH
+    try:
+        propriedades = ET.fromstring(zf.read('xl/workbook.xml')).find(f'{_NS_PLANILHA}workbookPr')
+        if propriedades is not None and propriedades.get('date1904') in ('1', 'true'):
+            epoca = MAC_EPOCH
+    except KeyError:
+        pass
+    return datas, duracoes, epoca
+
+
+class _XlsxNaoSuportado(ValueError):
+    """Aba que a leitura direta do XML não interpreta (ex.: cabeçalho ilegível): ler pelo pandas."""
+
+
+def _xlsx_ler_inicio(caminho, max_linhas, aba=None):
+    """Lê apenas a dimensão e as primeiras `max_linhas` linhas de uma aba (padrão: a primeira) de um .xlsx.
+
+    O XML da aba é lido em fluxo e a leitura para assim que as linhas necessárias chegam;
+    as strings compartilhadas são lidas só até o maior índice usado. Retorna
+    (dimensao, linhas), onde dimensao é o atributo ref de <dimension> (ou None).
+    """
+    dimensao = None
+    linhas = []
+    with zipfile.ZipFile(caminho) as zf:
+        with zf.open(_xlsx_caminho_aba(zf, aba)) as fh:
+            for _, el in ET.iterparse(fh, events=('end',)):
+                tag = el.tag.rsplit('}', 1)[-1]
+                if tag == 'dimension':
+                    dimensao = el.get('ref')
+                elif tag == 'row':
+                    linha = {}
+                    celulas = list(el.iter(f'{_NS_PLANILHA}c'))
+                    for indice, c in zip(_xlsx_indices_celulas(celulas), celulas):
+                        tipo = c.get('t')
+                        if tipo == 'inlineStr':
+                            valor = ''.join(t.text or '' for t in c.iter(f'{_NS_PLANILHA}t'))
+                        else:
+                            v = c.find(f'{_NS_PLANILHA}v')
+                            valor = v.text if v is not None else None
+                            if valor is not None and tipo == 's':
+                                valor = ('s', int(valor))
+                            elif valor is not None and tipo in (None, 'n'):
+                                numero = float(valor)
+                                valor = int(numero) if numero.is_integer() else numero
+                        linha[indice] = valor
+                    el.clear()
+                    if any(v is not None for v in linha.values()):
+                        linhas.append(linha)
+                    if len(linhas) >= max_linhas:
+                        break
+
+        # resolve as strings compartilhadas usadas nessas linhas
+        indices = {v[1] for linha in linhas for v in linha.values() if isinstance(v, tuple)}
+        compartilhadas = {}
+        if indices and 'xl/sharedStrings.xml' in zf.namelist():
+            maior = max(indices)
+            with zf.open('xl/sharedStrings.xml') as fh:
+                i = 0
+                for _, el in ET.iterparse(fh, events=('end',)):
+                    if el.tag == f'{_NS_PLANILHA}si':
+                        if i in indices:
+                            compartilhadas[i] = ''.join(t.text or '' for t in el.iter(f'{_NS_PLANILHA}t'))
+                        el.clear()
+                        i += 1
+                        if i > maior:
+                            break
+
+    largura = max((max(linha) + 1 for linha in linhas if linha), default=0)
+    resultado = []
+    for linha in linhas:
+        valores = [linha.get(j) for j in range(largura)]
+        resultado.append([compartilhadas.get(v[1]) if isinstance(v, tuple) else v for v in valores])
+    return dimensao, resultado
+
+
+def _xlsx_texto(valor):
+    """Valor de _xlsx_ler_inicio como o texto que _xlsx_ler_blocos daria (números sem '.0')."""
+    if valor is None or isinstance(valor, str):
+        return valor
+    return str(valor)
+
+
+def _xlsx_nomes_cabecalho(valores):
+    """Nomes das colunas a partir das células do cabeçalho ({índice: texto}), como o pandas os daria."""
+    return _nomes_unicos([valores.get(i) if valores.get(i) is not None else f'Unnamed: {i}'
+                          for i in range(max(valores) + 1)])
+
+
+def _nomes_unicos(nomes):
+    """Renomeia cabeçalhos repetidos como o pandas faz ('a', 'a' -> 'a', 'a.1')."""
+    contagem = {}
+    resultado = []
+    for nome in nomes:
+        atual = contagem.get(nome, 0)
+        while atual > 0:
+            contagem[nome] = atual + 1
+            nome = f'{nome}.{atual}'
+            atual = contagem.get(nome, 0)
+        resultado.append(nome)
+        contagem[nome] = atual + 1
+    return resultado
+
+
+def _xlsx_ler_blocos(caminho, linhas_por_bloco=None, explicit_mapping=None, todas_colunas=False, aba=None,
+                     colunas_map=None):
+    """Lê uma aba (`aba`, pelo nome; padrão: a primeira) de um .xlsx direto do XML, só nas colunas necessárias, em blocos de DataFrame.
+
+    A primeira linha não vazia é o cabeçalho; as colunas usadas vêm de _colunas_necessarias
+    (todas, com `todas_colunas`). Das demais células só se verifica se a linha está vazia
+    (linhas vazias são ignoradas, como na leitura em streaming), sem converter valores: o custo
+    cai com as colunas não usadas, ao contrário do openpyxl, que cria um objeto por célula.
+    Os valores chegam como texto, como no pd.read_excel(dtype=str): números inteiros sem
+    '.0', booleanos como 'True'/'False', células com formato de data como a data/hora
+    ('2024-01-15 00:00:00') e células de erro vazias. Células sem o atributo r ocupam a
+    coluna seguinte à anterior.
+    Sem `linhas_por_bloco` devolve um único bloco (inclusive vazio, só com o cabeçalho).
+    Levanta ValueError se a aba não tiver nenhuma linha reconhecível e _XlsxNaoSuportado
+    se o cabeçalho não tiver nenhum título (quem chama lê a aba pelo pandas).
+    """
+    tag_row, tag_v, tag_is, tag_t = (f'{_NS_PLANILHA}{t}' for t in ('row', 'v', 'is', 't'))
+    indices_coluna = {}
+
+    def indice_da_referencia(ref):
+        letras = ref.rstrip('0123456789')
+        indice = indices_coluna.get(letras)
+        if indice is None:
+            indice = indices_coluna[letras] = _xlsx_indice_coluna(letras)
+        return indice
+
+    def valor(c):
+        tipo = c.get('t')
+        if tipo == 'inlineStr':
+            return ''.join(t.text or '' for t in c.iter(tag_t))
+        v = c.find(tag_v)
+        if v is None or v.text is None:
+            return None
+        texto = v.text
+        if tipo == 's':
+            return compartilhadas[int(texto)]
+        if tipo in (None, 'n'):
+            if datas and c.get('s') and int(c.get('s')) in datas:
+                return data_hora(texto, int(c.get('s')) in duracoes)
+            if '.' in texto or 'e' in texto or 'E' in texto:
+                numero = float(texto)
+                return str(int(numero)) if numero.is_integer() else str(numero)
+            return str(int(texto))
+        if tipo == 'b':
+            return 'True' if texto == '1' else 'False'
+        if tipo == 'e':
+            return None
+        if tipo == 'd':
+            from openpyxl.utils.datetime import from_ISO8601
+            return str(from_ISO8601(texto))
+        return texto
+
+    def data_hora(texto, duracao):
+        from openpyxl.utils.datetime import from_excel
+        numero = float(texto)
+        try:
+            return str(from_excel(int(numero) if numero.is_integer() else numero, epoca, timedelta=duracao))
+        except (OverflowError, ValueError):
+            # o openpyxl trata como célula de erro, que o pandas lê como vazia
+            return None
+
+    with zipfile.ZipFile(caminho) as zf:
+        datas, duracoes, epoca = _xlsx_formatos_data(zf)
+        compartilhadas = []
+        if 'xl/sharedStrings.xml' in zf.namelist():
+            with zf.open('xl/sharedStrings.xml') as fh:
+                for _, el in ET.iterparse(fh, events=('end',)):
+                    if el.tag == f'{_NS_PLANILHA}si':
+                        compartilhadas.append(''.join(t.text or '' for t in el.iter(tag_t)))
+                        el.clear()
+
+        colunas = None
+        posicoes = None
+        bloco = []
+        enviou = False
+        with zf.open(_xlsx_caminho_aba(zf, aba)) as fh:
+            for _, el in ET.iterparse(fh, events=('end',)):
+                if el.tag != tag_row:
+                    continue
+                if next(el.iter(tag_v), None) is None and next(el.iter(tag_is), None) is None:
+                    el.clear()
+                    continue
+                celulas = list(el)
+                if colunas is None:
+                    # cabeçalho: mesmos nomes que o pandas daria a colunas sem título
+                    valores = {i: valor(c) for i, c in zip(_xlsx_indices_celulas(celulas, indice_da_referencia), celulas)}
+                    if not any(v is not None and i >= 0 for i, v in valores.items()):
+                        raise _XlsxNaoSuportado("Cabeçalho da planilha sem títulos legíveis.")
+                    colunas = _xlsx_nomes_cabecalho(valores)
+                    necessarias = None if todas_colunas else _colunas_necessarias(colunas, explicit_mapping, colunas_map)
+                    posicoes = [i for i, c in enumerate(colunas) if necessarias is None or c in necessarias]
+                    colunas = [colunas[i] for i in posicoes]
+                    el.clear()
+                    continue
+                linha = []
+                por_indice = None
+                for p in posicoes:
+                    # células normalmente vêm em ordem, sem lacunas e com r: tenta a posição direta
+                    c = celulas[p] if p < len(celulas) else None
+                    ref = c.get('r') if c is not None else None
+                    if not ref or indice_da_referencia(ref) != p:
+                        if por_indice is None:
+                            por_indice = dict(zip(_xlsx_indices_celulas(celulas, indice_da_referencia), celulas))
+                        c = por_indice.get(p)
+                    linha.append(valor(c) if c is not None else None)
+                el.clear()
+                bloco.append(linha)
+                if linhas_por_bloco and len(bloco) >= linhas_por_bloco:
+                    yield pd.DataFrame(bloco, columns=colunas)
+                    enviou = True
+                    bloco = []
+
+    if colunas is None:
+        raise ValueError(f"Nenhuma linha encontrada na aba '{aba}'." if aba is not None
+                         else "Nenhuma linha encontrada na primeira aba.")
+    if bloco or not enviou:
+        yield pd.DataFrame(bloco, columns=colunas)
+
+
+def _xlsx_total_pela_dimensao(dimensao):
+    """Última linha indicada por <dimension ref="A1:C6601"> (6601), ou None."""
+    if not dimensao or ':' not in dimensao:
+        return None
+    digitos = re.sub(r'\D', '', dimensao.split(':')[1])
+    return int(digitos) if digitos else None
+
+
+def _contar_linhas_texto(caminho):
+    """Conta as linhas de um arquivo texto lendo em blocos binários (sem interpretar o CSV)."""
+    total = 0
+    ultimo = b''
+    with open(caminho, 'rb') as fh:
+        while True:
+            bloco = fh.read(1024 * 1024)
+            if not bloco:
+                break
+            total += bloco.count(b'\n')
+            ultimo = bloco[-1:]
+    if ultimo and ultimo != b'\n':
+        total += 1
+    return total
+
+
+def _montar_arquivo_parcial(caminho, caminho_fim, tamanho_total):
+    """Grava o fim do arquivo (`caminho_fim`) na posição original, depois do início (`caminho`).
+
+    O trecho não enviado fica zerado (arquivo esparso): basta para o diretório do ZIP (.xlsx)
+    ou o rodapé (.parquet/.feather) e as primeiras linhas; uma leitura que caia nele falha.
+    """
+    tamanho_fim = caminho_fim.stat().st_size
+    if tamanho_fim > tamanho_total or caminho.stat().st_size > tamanho_total:
+        raise ValueError("Partes do arquivo maiores que o tamanho informado.")
+    with open(caminho, 'r+b') as fh, open(caminho_fim, 'rb') as fim:
+        fh.truncate(tamanho_total)
+        fh.seek(tamanho_total - tamanho_fim)
+        shutil.copyfileobj(fim, fh)
+
+
+def inspecionar_arquivo(caminho_arquivo_entrada, linhas_preview=5, tamanho_lote=None, explicit_mapping=None,
+                        tamanho_total=None, caminho_fim=None):
+    """Lê só o cabeçalho, as primeiras linhas e os metadados de dimensão do arquivo.
+
+    Retorna um dicionário com o total de linhas de dados, as colunas, o mapeamento detectado,
+    uma prévia já formatada e (se `tamanho_lote` for informado) a previsão de lotes. Tudo se
+    refere à primeira aba; nas pastas de trabalho, `abas` lista os nomes de todas as abas.
+    Nas pastas de trabalho o total vem da <dimension> (ou das tags <row>) e inclui linhas em
+    branco que o processamento descarta: `total_estimado` é True e o total é um limite superior.
+
+    Com `tamanho_total` (tamanho do arquivo original) o arquivo recebido é só o início dele e
+    `caminho_fim`, se houver, o fim (ver _montar_arquivo_parcial). No CSV o total é estimado
+    pelos bytes por linha do início (`fonte_total` 'amostra', `total_estimado` True). Se as
+    partes não bastarem, o erro vem com `arquivo_completo` True: reenvie o arquivo inteiro.
+    """
+    caminho_in = Path(caminho_arquivo_entrada)
+    suffix_in = caminho_in.suffix.lower()
+    linhas_preview = max(int(linhas_preview or 5), 1)
+    total_bruto = None
+    fonte_total = None
+    parcial = tamanho_total is not None
+    try:
+        bytes_inicio = caminho_in.stat().st_size
+        if parcial and caminho_fim:
+            _montar_arquivo_parcial(caminho_in, Path(caminho_fim), int(tamanho_total))
+        if suffix_in in EXTENSOES_XLSX:
+            dimensao, linhas = _xlsx_ler_inicio(caminho_in, linhas_preview + 1)
+            total_bruto = _xlsx_total_pela_dimensao(dimensao)
+            fonte_total = 'dimensao'
+            if total_bruto is None and parcial:
+                raise ValueError("planilha sem <dimension>: as linhas só podem ser contadas no arquivo inteiro")
+            if total_bruto is None:
+                # sem <dimension> confiável: conta as tags <row> do XML (sem interpretar as células)
+                with zipfile.ZipFile(caminho_in) as zf, zf.open(_xlsx_caminho_aba(zf)) as fh:
+                    total_bruto = sum(bloco.count(b'<row ') for bloco in iter(lambda: fh.read(1024 * 1024), b''))
+                fonte_total = 'contagem'
+            if not linhas:
+                return {"success": False, "error": "Arquivo de entrada vazio."}
+            cabecalho = [c if c is not None else f'Unnamed: {i}' for i, c in enumerate(linhas[0])]
+            df = pd.DataFrame(linhas[1:], columns=cabecalho)
+        elif suffix_in in ('.csv',):
+            # a inspeção mostra todas as colunas
+            df = _ler_csv(caminho_in, todas_colunas=True, nrows=linhas_preview)
+            total_bruto = _contar_linhas_texto(caminho_in)
+            fonte_total = 'contagem'
+            if parcial:
+                # só o início foi enviado: total proporcional ao tamanho (bytes por linha do início)
+                total_bruto = round(total_bruto * int(tamanho_total) / max(bytes_inicio, 1))
+                fonte_total = 'amostra'
+        elif suffix_in == '.parquet':
+            import pyarrow.parquet as pq
+            arquivo = pq.ParquetFile(caminho_in)
+            total_bruto = arquivo.metadata.num_rows + 1
+            fonte_total = 'metadados'
+            if parcial and arquivo.metadata.num_row_groups:
+                # a prévia vem do primeiro row group: ele tem de estar no início enviado
+                grupo = arquivo.metadata.row_group(0)
+                fim_grupo = max((c.dictionary_page_offset if c.has_dictionary_page else c.data_page_offset)
+                                + c.total_compressed_size for c in map(grupo.column, range(grupo.num_columns)))
+                if fim_grupo > bytes_inicio:
+                    raise ValueError("o primeiro row group não está no início enviado")
+            primeiro = next(arquivo.iter_batches(batch_size=linhas_preview), None)
+            df = primeiro.to_pandas() if primeiro is not None else arquivo.schema_arrow.empty_table().to_pandas()
+        elif suffix_in == '.feather':
+            import pyarrow as pa
+            import pyarrow.ipc as ipc
+            # o total vem dos cabeçalhos dos record batches; a prévia, só dos primeiros batches
+            with ipc.open_file(caminho_in) as leitor:
+                total_bruto = leitor.count_rows() + 1
+                fonte_total = 'metadados'
+                lotes = []
+                while len(lotes) < leitor.num_record_batches and sum(l.num_rows for l in lotes) < linhas_preview:
+                    lotes.append(leitor.get_batch(len(lotes)))
+                df = pa.Table.from_batches(lotes, schema=leitor.schema).slice(0, linhas_preview).to_pandas()
+        else:
+            df = _carregar_entrada(caminho_in, todas_colunas=True)
+            total_bruto = len(df) + 1
+            fonte_total = 'leitura'
+            df = df.head(linhas_preview)
+    except Exception as e:
+        if parcial:
+            return {"success": False, "error": f"As partes enviadas não bastam para a inspeção: {e}",
+                    "arquivo_completo": True}
+        return {"success": False, "error": f"Falha ao ler arquivo de entrada: {e}"}
+
+    # total de linhas de dados (desconta o cabeçalho; no CSV em uma coluna, também a linha de títulos)
+    total_linhas = max(total_bruto - 1, 0) if total_bruto is not None else None
+    colunas_originais = [str(c) for c in df.columns]
+    linhas_lidas = len(df)
+    df, delim, colunas_split = _dividir_coluna_unica(df)
+    if delim and total_linhas and len(df) < linhas_lidas:
+        # os títulos estavam na primeira linha de dados
+        total_linhas -= 1
+
+    resultado = {
+        "success": True,
+        "total_linhas": total_linhas,
+        "fonte_total": fonte_total,
+        "total_estimado": suffix_in in EXTENSOES_XLSX or fonte_total == 'amostra',
+        "colunas": [str(c) for c in df.columns],
+        "colunas_originais": colunas_originais,
+        "column_mapping": None,
+        "preview": [],
+    }
+    abas = _listar_abas(caminho_in)
+    if abas is not None:
+        resultado["abas"] = abas
+    if tamanho_lote and total_linhas is not None:
+        try:
+            resultado["previsao_lotes"] = -(-total_linhas // max(int(tamanho_lote), 1))
+        except (TypeError, ValueError):
+            pass
+
+    try:
+        colunas_map = _resolver_mapeamento(df, explicit_mapping)
+    except ValueError as e:
+        resultado["mapping_error"] = str(e)
+        return resultado
+    resultado["column_mapping"] = dict(zip(('numero', 'cnpj', 'acao'), colunas_map))
+    df_preview = _formatar_colunas(df, *colunas_map).astype(object)
+    resultado["preview"] = df_preview.where(df_preview.notna(), None).to_dict(orient='records')
+    return resultado
@@ -0,0 +1,145 @@
+import json
+import logging
+import os
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# ============================================================================
+# INSTRUMENTAÇÃO (TEMPO E MEMÓRIA POR ETAPA)
+# ============================================================================
+
+# AIA_MEDIR_MEMORIA=1 liga o tracemalloc: 'memoria_pico_mb' é o pico de alocações de cada
+# etapa (zerado no início dela), com custo extra de CPU. Sem ele cada etapa informa só
+# 'rss_pico_processo_mb', o pico de RSS do processo desde que ele subiu (ru_maxrss) lido ao
+# fim da etapa: não é a memória da etapa e inclui requisições anteriores do mesmo worker.
+MEDIR_MEMORIA = os.environ.get('AIA_MEDIR_MEMORIA', '').strip().lower() in ('1', 'true', 'sim')
+# AIA_LOG_TIMINGS: '1'/'stderr' grava os logs JSON no stderr; outro valor é o caminho do arquivo
+LOG_TIMINGS = os.environ.get('AIA_LOG_TIMINGS', '').strip()
+
+if MEDIR_MEMORIA and not tracemalloc.is_tracing():
+    tracemalloc.start()
+
+_logger = logging.getLogger('aia.timings')
+
+
+def _configurar_logger():
+    if not LOG_TIMINGS or _logger.handlers:
+        return
+    if LOG_TIMINGS.lower() in ('1', 'true', 'sim', 'stderr'):
+        handler = logging.StreamHandler(sys.stderr)
+    else:
+        handler = logging.FileHandler(LOG_TIMINGS, encoding='utf-8')
+    handler.setFormatter(logging.Formatter('%(message)s'))
+    _logger.addHandler(handler)
+    _logger.setLevel(logging.INFO)
+    _logger.propagate = False
+
+
+_configurar_logger()
+
+
+def _rss_pico_mb():
+    """Pico de memória residente do processo (MB), ou None se indisponível."""
+    if resource is None:
+        return None
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux informa em KB, macOS em bytes
+    return round(pico / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def _campo_memoria():
+    """Nome do campo de memória de cada etapa (o significado muda com MEDIR_MEMORIA)."""
+    return 'memoria_pico_mb' if MEDIR_MEMORIA else 'rss_pico_processo_mb'
+
+
+class Medicao:
+    """Acumula o tempo de parede e o pico de memória de cada etapa de um processamento.
+
+    A mesma etapa pode ser medida várias vezes (ex.: um bloco por vez no modo streaming):
+    os tempos são somados e vale o maior pico. O campo de memória depende de MEDIR_MEMORIA
+    ('memoria_pico_mb' da etapa ou 'rss_pico_processo_mb' do processo; ver acima). Com o
+    tracemalloc o pico é global do processo, então requisições simultâneas se misturam.
+    `etapa_falha` guarda a última etapa interrompida por uma exceção.
+    """
+
+    def __init__(self):
+        self.inicio = time.perf_counter()
+        self.etapas = {}
+        self.etapa_falha = None
+
+    @contextmanager
+    def etapa(self, nome):
+        if MEDIR_MEMORIA:
+            tracemalloc.reset_peak()
+            base, _ = tracemalloc.get_traced_memory()
+        inicio = time.perf_counter()
+        try:
+            yield
+        except BaseException:
+            self.etapa_falha = nome
+            raise
+        finally:
+            segundos = time.perf_counter() - inicio
+            if MEDIR_MEMORIA:
+                _, pico = tracemalloc.get_traced_memory()
+                memoria = round(max(pico - base, 0) / (1024 * 1024), 2)
+            else:
+                memoria = _rss_pico_mb()
+            campo = _campo_memoria()
+            atual = self.etapas.setdefault(nome, {'segundos': 0.0, campo: None})
+            atual['segundos'] += segundos
+            if memoria is not None and (atual[campo] is None or memoria > atual[campo]):
+                atual[campo] = memoria
+
+    def iterar(self, nome, iteravel):
+        """Repassa os itens de `iteravel` medindo o tempo gasto para produzir cada um."""
+        iterador = iter(iteravel)
+        while True:
+            with self.etapa(nome):
+                try:
+                    item = next(iterador)
+                except StopIteration:
+                    return
+            yield item
+
+    def resumo(self):
+        """Dicionário com as etapas (na ordem em que apareceram) e o tempo total."""
+        campo = _campo_memoria()
+        return {
+            'etapas': {nome: {'segundos': round(m['segundos'], 4), campo: m[campo]}
+                       for nome, m in self.etapas.items()},
+            'total_segundos': round(time.perf_counter() - self.inicio, 4),
+            'memoria': 'tracemalloc' if MEDIR_MEMORIA else ('rss_processo' if resource is not None else None),
+        }
+
+
+class _SemMedicao:
+    """Medição nula, para as funções chamadas fora de processar_arquivo_excel."""
+
+    @contextmanager
+    def etapa(self, nome):
+        yield
+
+    def iterar(self, nome, iteravel):
+        return iteravel
+
+
+SEM_MEDICAO = _SemMedicao()
+
+
+def registrar_log(evento, **campos):
+    """Grava um registro JSON (uma linha) no log de timings, se AIA_LOG_TIMINGS estiver configurado."""
+    if not _logger.handlers:
+        return
+    registro = {'evento': evento, 'momento': time.strftime('%Y-%m-%dT%H:%M:%S'), **campos}
+    try:
+        _logger.info(json.dumps(registro, ensure_ascii=False, default=str))
+    except Exception:
+        pass
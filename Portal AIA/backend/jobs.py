@@ -0,0 +1,159 @@
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, wait
+
+# ============================================================================
+# FILA DE PROCESSAMENTO EM SEGUNDO PLANO
+# ============================================================================
+
+# Quantidade de processamentos simultâneos (pode ser ajustada por variável de ambiente)
+MAX_JOBS_SIMULTANEOS = int(os.environ.get('AIA_JOBS_SIMULTANEOS', '2'))
+# Tempo (segundos) que um job finalizado continua disponível para consulta
+JOB_TTL = 3600
+# Campos do resultado com o conteúdo dos lotes em base64: entregues só na primeira consulta
+# após o fim do job (depois ficam só os nomes e a pasta de saída, para não reter a memória)
+CAMPOS_CONTEUDO = ('files_data', 'rejeitados_data', 'conflitos_data')
+
+_executor = ThreadPoolExecutor(max_workers=MAX_JOBS_SIMULTANEOS, thread_name_prefix='aia-job')
+_jobs = {}
+_lock = threading.Lock()
+# futuros dos jobs ainda não finalizados (para o encerramento gracioso)
+_pendentes = set()
+_encerrando = False
+
+
+def _limpar_expirados():
+    """Remove jobs finalizados há mais de JOB_TTL segundos."""
+    agora = time.time()
+    with _lock:
+        expirados = [jid for jid, j in _jobs.items()
+                     if j['finalizado_em'] and agora - j['finalizado_em'] > JOB_TTL]
+        for jid in expirados:
+            del _jobs[jid]
+
+
+def _atualizar(job_id, **campos):
+    with _lock:
+        job = _jobs.get(job_id)
+        if job is not None:
+            job.update(campos)
+
+
+def criar_job(func, *args, ao_finalizar=None, **kwargs):
+    """Agenda `func(*args, progresso=..., **kwargs)` em segundo plano e retorna o id do job.
+
+    `func` deve aceitar o callback `progresso(linhas_processadas, total_linhas, lotes_gravados)`
+    e retornar o dicionário de resultado (com a chave 'success'). `ao_finalizar`, se
+    informado, é chamado sempre ao fim (ex.: remover o arquivo temporário).
+    Levanta RuntimeError se o servidor estiver encerrando (ver `encerrar`).
+    """
+    _limpar_expirados()
+    job_id = uuid.uuid4().hex
+    with _lock:
+        if _encerrando:
+            raise RuntimeError("Servidor em encerramento; tente novamente em instantes.")
+        _jobs[job_id] = {
+            'id': job_id,
+            'status': 'na_fila',
+            'criado_em': time.time(),
+            'iniciado_em': None,
+            'finalizado_em': None,
+            'linhas_processadas': 0,
+            'total_linhas': None,
+            'lotes_gravados': 0,
+            'resultado': None,
+        }
+
+    def _progresso(linhas_processadas, total_linhas, lotes_gravados):
+        _atualizar(job_id, linhas_processadas=linhas_processadas,
+                   total_linhas=total_linhas, lotes_gravados=lotes_gravados)
+
+    def _executar():
+        _atualizar(job_id, status='processando', iniciado_em=time.time())
+        try:
+            resultado = func(*args, progresso=_progresso, **kwargs)
+        except Exception as e:
+            resultado = {"success": False, "error": str(e)}
+        finally:
+            if ao_finalizar:
+                try:
+                    ao_finalizar()
+                except Exception:
+                    pass
+        status = 'concluido' if resultado.get('success') else 'erro'
+        _atualizar(job_id, status=status, resultado=resultado, finalizado_em=time.time())
+
+    with _lock:
+        futuro = _executor.submit(_executar)
+        _pendentes.add(futuro)
+    futuro.add_done_callback(_remover_pendente)
+    return job_id
+
+
+def _remover_pendente(futuro):
+    with _lock:
+        _pendentes.discard(futuro)
+
+
+def encerrar(timeout=None):
+    """Encerramento gracioso: recusa novos jobs e aguarda os que estão na fila ou em andamento.
+
+    Espera no máximo `timeout` segundos (None = sem limite). Retorna a quantidade de jobs
+    que ainda não terminaram ao fim da espera.
+    """
+    global _encerrando
+    with _lock:
+        _encerrando = True
+        pendentes = list(_pendentes)
+    if pendentes:
+        print(f"⏳ Aguardando {len(pendentes)} job(s) em andamento antes de encerrar...")
+    _, nao_concluidos = wait(pendentes, timeout=timeout)
+    return len(nao_concluidos)
+
+
+def obter_job(job_id):
+    """Retorna uma cópia do estado do job (com percentual e ETA), ou None se não existir.
+
+    O conteúdo dos lotes (CAMPOS_CONTEUDO) vem só na primeira consulta do job finalizado;
+    nas seguintes o resultado traz `conteudo_entregue=True` e os arquivos continuam na
+    pasta de saída. Também remove os jobs expirados.
+    """
+    _limpar_expirados()
+    with _lock:
+        job = _jobs.get(job_id)
+        if job is None:
+            return None
+        resultado = job['resultado']
+        if resultado and any(campo in resultado for campo in CAMPOS_CONTEUDO):
+            # esta consulta leva o conteúdo; o job guardado fica só com o resto do resultado
+            job['resultado'] = {campo: valor for campo, valor in resultado.items() if campo not in CAMPOS_CONTEUDO}
+            job['resultado']['conteudo_entregue'] = True
+        job = dict(job, resultado=resultado)
+
+    percentual = None
+    eta = None
+    total = job['total_linhas']
+    feitas = job['linhas_processadas']
+    if job['status'] == 'concluido':
+        percentual = 100.0
+        eta = 0
+    elif total:
+        percentual = round(min(feitas / total, 1.0) * 100, 1)
+        if job['iniciado_em'] and feitas:
+            decorrido = time.time() - job['iniciado_em']
+            eta = round(decorrido * (total - feitas) / feitas, 1)
+    job['percentual'] = percentual
+    job['eta_segundos'] = eta
+    return job
+
+
+def contar_jobs():
+    """Quantidade de jobs por status (na_fila, processando, concluido, erro) ainda registrados."""
+    _limpar_expirados()
+    contagem = {'na_fila': 0, 'processando': 0, 'concluido': 0, 'erro': 0}
+    with _lock:
+        for job in _jobs.values():
+            contagem[job['status']] = contagem.get(job['status'], 0) + 1
+    return contagem
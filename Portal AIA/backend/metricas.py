@@ -0,0 +1,139 @@
+import threading
+
+# ============================================================================
+# MÉTRICAS EM MEMÓRIA (FORMATO TEXTO DO PROMETHEUS)
+# ============================================================================
+
+# Limites (segundos) dos histogramas de latência
+BUCKETS_LATENCIA = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+_lock = threading.Lock()
+_metricas = {}
+
+
+def _escapar(valor):
+    return str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _rotulos(rotulos, extra=None):
+    itens = list(rotulos) + ([extra] if extra else [])
+    if not itens:
+        return ''
+    return '{' + ','.join(f'{nome}="{_escapar(valor)}"' for nome, valor in itens) + '}'
+
+
+def _formatar(valor):
+    if valor == float('inf'):
+        return '+Inf'
+    return repr(float(valor)) if isinstance(valor, float) else str(valor)
+
+
+class _Metrica:
+    """Base das métricas: cada combinação de rótulos tem sua própria série."""
+
+    tipo = None
+
+    def __init__(self, nome, ajuda, rotulos=()):
+        self.nome = nome
+        self.ajuda = ajuda
+        self.nomes_rotulos = tuple(rotulos)
+        self.series = {}
+        with _lock:
+            _metricas[nome] = self
+
+    def _chave(self, rotulos):
+        return tuple((nome, rotulos.get(nome, '')) for nome in self.nomes_rotulos)
+
+    def linhas(self):
+        yield f'# HELP {self.nome} {self.ajuda}'
+        yield f'# TYPE {self.nome} {self.tipo}'
+        with _lock:
+            series = sorted(self.series.items())
+        for chave, valor in series:
+            yield f'{self.nome}{_rotulos(chave)} {_formatar(valor)}'
+
+
+class Contador(_Metrica):
+    tipo = 'counter'
+
+    def inc(self, valor=1, **rotulos):
+        chave = self._chave(rotulos)
+        with _lock:
+            self.series[chave] = self.series.get(chave, 0) + valor
+
+
+class Medidor(_Metrica):
+    """Valor instantâneo; `funcao`, se informada, é consultada na hora da coleta."""
+
+    tipo = 'gauge'
+
+    def __init__(self, nome, ajuda, rotulos=(), funcao=None):
+        super().__init__(nome, ajuda, rotulos)
+        self.funcao = funcao
+
+    def inc(self, valor=1, **rotulos):
+        chave = self._chave(rotulos)
+        with _lock:
+            self.series[chave] = self.series.get(chave, 0) + valor
+
+    def dec(self, valor=1, **rotulos):
+        self.inc(-valor, **rotulos)
+
+    def linhas(self):
+        if self.funcao is not None:
+            try:
+                # a função retorna {valor_do_rotulo: valor} (um único rótulo) ou um número
+                valores = self.funcao()
+                if isinstance(valores, dict):
+                    series = {((self.nomes_rotulos[0], k),): v for k, v in valores.items()}
+                else:
+                    series = {(): valores}
+                with _lock:
+                    self.series = series
+            except Exception:
+                pass
+        yield from super().linhas()
+
+
+class Histograma(_Metrica):
+    tipo = 'histogram'
+
+    def __init__(self, nome, ajuda, rotulos=(), buckets=BUCKETS_LATENCIA):
+        super().__init__(nome, ajuda, rotulos)
+        self.buckets = tuple(buckets) + (float('inf'),)
+
+    def observar(self, valor, **rotulos):
+        chave = self._chave(rotulos)
+        with _lock:
+            serie = self.series.get(chave)
+            if serie is None:
+                serie = self.series[chave] = [[0] * len(self.buckets), 0.0, 0]
+            for i, limite in enumerate(self.buckets):
+                if valor <= limite:
+                    serie[0][i] += 1
+                    break
+            serie[1] += valor
+            serie[2] += 1
+
+    def linhas(self):
+        yield f'# HELP {self.nome} {self.ajuda}'
+        yield f'# TYPE {self.nome} {self.tipo}'
+        with _lock:
+            series = sorted((chave, (list(c), soma, total)) for chave, (c, soma, total) in self.series.items())
+        for chave, (contagens, soma, total) in series:
+            acumulado = 0
+            for limite, contagem in zip(self.buckets, contagens):
+                acumulado += contagem
+                yield f'{self.nome}_bucket{_rotulos(chave, ("le", _formatar(limite)))} {acumulado}'
+            yield f'{self.nome}_sum{_rotulos(chave)} {_formatar(soma)}'
+            yield f'{self.nome}_count{_rotulos(chave)} {total}'
+
+
+def exportar():
+    """Texto de todas as métricas no formato de exposição do Prometheus (text/plain 0.0.4)."""
+    with _lock:
+        metricas = list(_metricas.values())
+    linhas = []
+    for metrica in metricas:
+        linhas.extend(metrica.linhas())
+    return '\n'.join(linhas) + '\n'
@@ -0,0 +1,387 @@
+"""
+Benchmark do processamento de planilhas (backend/aia.py).
+
+Gera planilhas sintéticas com números "sujos" (+55, 00, NBSP, formatos mistos, CPF/CNPJ
+com pontuação, CSV inteiro em uma coluna), mede cada etapa separadamente para os formatos
+'planilha' e 'lista' e grava um relatório JSON para comparar versões.
+
+Uso:
+    python benchmark.py                                  # 10k, 100k e 1M linhas
+    python benchmark.py --linhas 10000 100000 --saida relatorio.json
+    python benchmark.py --comparar relatorio_anterior.json --tolerancia 0.2
+    python benchmark.py --formatos lista --motores rapido openpyxl   # compara os geradores de .xlsx
+
+Cada caso (tamanho x layout x formato) roda em um processo novo, para que o pico de
+memória (RSS) medido seja só dele. Os arquivos gerados ficam em --dir-dados e são
+reaproveitados nas próximas execuções.
+"""
+import argparse
+import itertools
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import zipfile
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from pathlib import Path
+
+BASE_DIR = Path(__file__).parent
+
+# caches persistentes do backend ficam isolados do portal durante o benchmark
+os.environ.setdefault('AIA_DIR_CACHE', str(Path(tempfile.gettempdir()) / 'aia_benchmark_cache'))
+sys.path.insert(0, str(BASE_DIR))
+
+from backend import aia  # noqa: E402
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+TAMANHOS_PADRAO = [10_000, 100_000, 1_000_000]
+LAYOUTS = ('colunas', 'csv', 'coluna_unica')
+FORMATOS = ('planilha', 'lista')
+# Geradores dos .xlsx do formato 'lista' (ver aia.MOTOR_XLSX); no formato 'planilha' não se aplicam
+MOTORES_XLSX = ('rapido', 'openpyxl')
+
+
+# ============================================================================
+# GERAÇÃO DE DADOS SINTÉTICOS
+# ============================================================================
+
+def _numero_sujo(rnd):
+    """Telefone em um dos formatos encontrados nas planilhas reais (ou vazio)."""
+    base = f"{rnd.choice((11, 21, 31, 41, 61, 81, 85))}9{rnd.randint(10000000, 99999999)}"
+    estilo = rnd.randrange(9)
+    if estilo == 0:
+        return '+55 ' + base
+    if estilo == 1:
+        return '0055' + base
+    if estilo == 2:
+        return '00 55 ' + base
+    if estilo == 3:
+        return base[:2] + ' ' + base[2:]
+    if estilo == 4:
+        return f"({base[:2]}) {base[2:7]}-{base[7:]}"
+    if estilo == 5:
+        return int('55' + base)
+    if estilo == 6:
+        return int(base)
+    if estilo == 7 and rnd.random() < 0.1:
+        return ''
+    return base
+
+
+def _documento_sujo(rnd):
+    """CPF ou CNPJ, com ou sem pontuação."""
+    if rnd.random() < 0.5:
+        d = f"{rnd.randint(0, 99999999999):011d}"
+        return f"{d[:3]}.{d[3:6]}.{d[6:9]}-{d[9:]}" if rnd.random() < 0.7 else d
+    d = f"{rnd.randint(0, 99999999):08d}0001{rnd.randint(0, 99):02d}"
+    return f"{d[:2]}.{d[2:5]}.{d[5:8]}/{d[8:12]}-{d[12:]}" if rnd.random() < 0.7 else d
+
+
+def _gerar_registros(linhas, semente):
+    rnd = random.Random(semente)
+    for i in range(linhas):
+        yield (f'Cliente {i}', _numero_sujo(rnd), _documento_sujo(rnd), rnd.choice(('', 'ok', 'revisar')))
+
+
+def _gravar_xlsx(caminho, cabecalho, registros):
+    """Grava um .xlsx de uma aba em fluxo (sem montar a planilha em memória)."""
+    def celula(ref, valor):
+        if isinstance(valor, int):
+            return f'<c r="{ref}"><v>{valor}</v></c>'
+        return aia._xlsx_celula(ref, valor, 0)
+
+    letras = 'ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+    with zipfile.ZipFile(caminho, 'w', compression=zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr('[Content_Types].xml', aia._XLSX_CONTENT_TYPES)
+        zf.writestr('_rels/.rels', aia._XLSX_RELS)
+        zf.writestr('xl/workbook.xml', aia._XLSX_WORKBOOK)
+        zf.writestr('xl/_rels/workbook.xml.rels', aia._XLSX_WORKBOOK_RELS)
+        zf.writestr('xl/styles.xml', aia._XLSX_STYLES)
+        with zf.open('xl/worksheets/sheet1.xml', 'w', force_zip64=True) as fh:
+            fh.write(b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+                     b'<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>')
+            partes = ['<row r="1">' + ''.join(celula(f'{l}1', c) for l, c in zip(letras, cabecalho)) + '</row>']
+            for i, registro in enumerate(registros, start=2):
+                partes.append(f'<row r="{i}">' + ''.join(
+                    celula(f'{l}{i}', v) for l, v in zip(letras, registro)) + '</row>')
+                if len(partes) >= 10_000:
+                    fh.write(''.join(partes).encode('utf-8'))
+                    partes = []
+            fh.write(''.join(partes).encode('utf-8'))
+            fh.write(b'</sheetData></worksheet>')
+
+
+def gerar_arquivo(linhas, layout, dir_dados, semente=42):
+    """Gera (ou reaproveita) a planilha sintética do caso e retorna o caminho."""
+    extensao = 'csv' if layout == 'csv' else 'xlsx'
+    caminho = Path(dir_dados) / f'sintetico_{layout}_{linhas}_{semente}.{extensao}'
+    if caminho.exists():
+        return caminho
+    Path(dir_dados).mkdir(parents=True, exist_ok=True)
+    temporario = caminho.with_name(caminho.name + '.tmp')
+    registros = _gerar_registros(linhas, semente)
+    if layout == 'colunas':
+        _gravar_xlsx(temporario, ('Nome', 'Telefone', 'CPF/CNPJ', 'Observação'), registros)
+    elif layout == 'coluna_unica':
+        # CSV inteiro em uma coluna do Excel (primeira linha com os nomes das colunas)
+        linhas_csv = (f'{numero};criar;{documento}' for _, numero, documento, _ in registros)
+        _gravar_xlsx(temporario, ('dados',), ((v,) for v in itertools.chain(['numero;acao;cnpj'], linhas_csv)))
+    else:
+        with open(temporario, 'w', encoding='utf-8', newline='') as fh:
+            fh.write('Nome;Telefone;CPF/CNPJ;Observação\n')
+            for registro in registros:
+                fh.write(';'.join(str(v) for v in registro) + '\n')
+    os.replace(temporario, caminho)
+    return caminho
+
+
+# ============================================================================
+# MEDIÇÃO
+# ============================================================================
+
+def _rss_pico_mb():
+    """Pico de memória residente do processo (MB), ou None se indisponível."""
+    if resource is None:
+        return None
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux informa em KB, macOS em bytes
+    return round(pico / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+class _Cronometro:
+    """Registra o tempo de cada etapa e o pico de RSS ao final dela."""
+
+    def __init__(self):
+        self.etapas = {}
+
+    def medir(self, etapa, func, *args, **kwargs):
+        inicio = time.perf_counter()
+        resultado = func(*args, **kwargs)
+        self.etapas[etapa] = {
+            'segundos': round(time.perf_counter() - inicio, 4),
+            'rss_pico_mb': _rss_pico_mb(),
+        }
+        return resultado
+
+
+def _executar_caso(caminho, output_format, tamanho_lote, motor_xlsx=None):
+    """Roda as etapas do processamento separadamente e depois o fluxo completo (em um processo novo)."""
+    aia.print = lambda *a, **k: None  # silencia os prints do backend
+    caminho = Path(caminho)
+    cronometro = _Cronometro()
+    pasta = Path(tempfile.mkdtemp(prefix='aia_benchmark_'))
+    try:
+        df = cronometro.medir('leitura', aia._carregar_entrada, caminho)
+        df, _, _ = cronometro.medir('coluna_unica', aia._dividir_coluna_unica, df)
+        colunas = cronometro.medir('deteccao_colunas', aia._resolver_mapeamento, df, usar_cache=False)
+        df_sel = cronometro.medir('normalizacao', aia._formatar_colunas, df, *colunas)
+        del df
+        df_sel['acao'] = 'criar'
+        if output_format == 'lista':
+            df_sel['numero'] = cronometro.medir('transformacao_lista', aia._formatar_numeros_lista, df_sel['numero'])
+
+        destino = aia._DestinoPasta(pasta)
+        escritor = aia._EscritorLotes(destino, 'Cadastro_numeros_benchmark', output_format,
+                                      motor_xlsx=motor_xlsx or aia.MOTOR_XLSX)
+
+        def escrever():
+            escritor.enviar_colunas(aia._colunas_texto(df_sel), tamanho_lote, 1)
+            return escritor.finalizar()
+
+        arquivos = cronometro.medir('escrita_lotes', escrever)
+        cronometro.medir('empacotamento_base64', aia._montar_resultado, destino, arquivos, len(df_sel),
+                         {}, [], output_format, 'Cadastro_numeros_benchmark')
+        total_linhas = len(df_sel)
+        del df_sel
+        shutil.rmtree(pasta, ignore_errors=True)
+
+        for entrega in ('base64', 'zip'):
+            resultado = cronometro.medir(f'total_{entrega}', aia.processar_arquivo_excel, str(caminho), 'criar',
+                                         'benchmark', tamanho_lote, str(pasta), output_format=output_format,
+                                         entrega=entrega, usar_cache=False, motor_xlsx=motor_xlsx)
+            if not resultado.get('success'):
+                raise RuntimeError(resultado.get('error'))
+            if resultado.get('zip_file') is not None:
+                resultado['zip_file'].close()
+            shutil.rmtree(pasta, ignore_errors=True)
+
+        return {
+            'linhas_processadas': total_linhas,
+            'arquivos': len(arquivos),
+            'etapas': cronometro.etapas,
+            'rss_pico_mb': _rss_pico_mb(),
+        }
+    finally:
+        shutil.rmtree(pasta, ignore_errors=True)
+
+
+def _rodar_isolado(caminho, output_format, tamanho_lote, motor_xlsx=None):
+    """Executa o caso em um processo novo (o RSS de pico não se mistura entre casos)."""
+    contexto = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=1, mp_context=contexto) as pool:
+        return pool.submit(_executar_caso, str(caminho), output_format, tamanho_lote, motor_xlsx).result()
+
+
+def _melhor_de(execucoes):
+    """Combina repetições de um caso: menor tempo por etapa e maior pico de memória."""
+    melhor = dict(execucoes[0])
+    melhor['etapas'] = {}
+    for etapa in execucoes[0]['etapas']:
+        medidas = [e['etapas'][etapa] for e in execucoes]
+        picos = [m['rss_pico_mb'] for m in medidas if m['rss_pico_mb'] is not None]
+        melhor['etapas'][etapa] = {
+            'segundos': min(m['segundos'] for m in medidas),
+            'rss_pico_mb': max(picos) if picos else None,
+        }
+    picos = [e['rss_pico_mb'] for e in execucoes if e['rss_pico_mb'] is not None]
+    melhor['rss_pico_mb'] = max(picos) if picos else None
+    return melhor
+
+
+def _versao_codigo():
+    """Commit atual do repositório (se disponível), para identificar o relatório."""
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BASE_DIR, capture_output=True,
+                              text=True, timeout=10).stdout.strip() or None
+    except Exception:
+        return None
+
+
+# ============================================================================
+# COMPARAÇÃO ENTRE RELATÓRIOS
+# ============================================================================
+
+def _motor_do_caso(caso):
+    """Motor de .xlsx do caso (relatórios antigos não o registram: era sempre o 'rapido')."""
+    if caso['formato'] != 'lista':
+        return None
+    return caso.get('motor', 'rapido')
+
+
+def comparar(relatorio, anterior, tolerancia):
+    """Compara os tempos por etapa com um relatório anterior; retorna as regressões encontradas."""
+    def chave(caso):
+        return (caso['linhas'], caso['layout'], caso['formato'], _motor_do_caso(caso))
+
+    casos_anteriores = {chave(c): c for c in anterior.get('casos', [])}
+    regressoes = []
+    for caso in relatorio['casos']:
+        antigo = casos_anteriores.get(chave(caso))
+        if not antigo:
+            continue
+        for etapa, medida in caso['etapas'].items():
+            antes = antigo['etapas'].get(etapa, {}).get('segundos')
+            # etapas muito curtas oscilam demais para serem comparadas
+            if not antes or antes < 0.05:
+                continue
+            razao = medida['segundos'] / antes
+            print(f"  {chave(caso)} {etapa:<22} {antes:>9.3f}s -> {medida['segundos']:>9.3f}s ({razao:.2f}x)")
+            if razao > 1 + tolerancia:
+                regressoes.append({'caso': chave(caso), 'etapa': etapa, 'antes': antes,
+                                   'depois': medida['segundos'], 'razao': round(razao, 2)})
+    return regressoes
+
+
+def comparar_motores(relatorio):
+    """Tempos dos motores de .xlsx lado a lado (mesmo arquivo, formato 'lista'), em relação ao 'rapido'."""
+    casos = {}
+    for caso in relatorio['casos']:
+        if caso['formato'] == 'lista':
+            casos.setdefault((caso['linhas'], caso['layout']), {})[caso['motor']] = caso
+    comparacao = []
+    for (linhas, layout), por_motor in casos.items():
+        if 'rapido' not in por_motor or len(por_motor) < 2:
+            continue
+        base = por_motor['rapido']['etapas']
+        for motor, caso in por_motor.items():
+            if motor == 'rapido':
+                continue
+            for etapa in ('escrita_lotes', 'total_base64', 'total_zip'):
+                antes, depois = base[etapa]['segundos'], caso['etapas'][etapa]['segundos']
+                razao = round(depois / antes, 2) if antes else None
+                print(f"  ({linhas}, {layout!r}) {etapa:<14} rapido {antes:>9.3f}s | {motor} {depois:>9.3f}s"
+                      + (f" ({razao:.2f}x)" if razao else ''))
+                comparacao.append({'linhas': linhas, 'layout': layout, 'etapa': etapa, 'motor': motor,
+                                   'segundos_rapido': antes, 'segundos': depois, 'razao': razao})
+    return comparacao
+
+
+# ============================================================================
+# EXECUÇÃO
+# ============================================================================
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark do processamento de planilhas do Portal AIA.')
+    parser.add_argument('--linhas', type=int, nargs='+', default=TAMANHOS_PADRAO, help='tamanhos das planilhas')
+    parser.add_argument('--layouts', nargs='+', choices=LAYOUTS, default=list(LAYOUTS))
+    parser.add_argument('--formatos', nargs='+', choices=FORMATOS, default=list(FORMATOS))
+    parser.add_argument('--motores', nargs='+', choices=MOTORES_XLSX, default=[aia.MOTOR_XLSX],
+                        help="geradores de .xlsx do formato 'lista' (vários = execução pareada)")
+    parser.add_argument('--lote', type=int, default=aia.TAMANHO_LOTE, help='linhas por lote de saída')
+    parser.add_argument('--repeticoes', type=int, default=1, help='repetições por caso (vale o menor tempo)')
+    parser.add_argument('--dir-dados', default=str(Path(tempfile.gettempdir()) / 'aia_benchmark_dados'),
+                        help='pasta das planilhas sintéticas (reaproveitadas entre execuções)')
+    parser.add_argument('--saida', default=None, help='arquivo do relatório JSON (padrão: benchmark_<data>.json)')
+    parser.add_argument('--comparar', default=None, help='relatório anterior para detectar regressões')
+    parser.add_argument('--tolerancia', type=float, default=0.2, help='aumento de tempo tolerado (0.2 = 20%%)')
+    args = parser.parse_args()
+
+    relatorio = {
+        'gerado_em': datetime.now().isoformat(timespec='seconds'),
+        'versao': _versao_codigo(),
+        'python': platform.python_version(),
+        'pandas': aia.pd.__version__,
+        'plataforma': platform.platform(),
+        'cpus': os.cpu_count(),
+        'tamanho_lote': args.lote,
+        'casos': [],
+    }
+
+    for linhas in args.linhas:
+        for layout in args.layouts:
+            inicio = time.perf_counter()
+            caminho = gerar_arquivo(linhas, layout, args.dir_dados)
+            print(f"• {linhas} linhas / {layout}: {caminho.name} ({time.perf_counter() - inicio:.1f}s para gerar)")
+            for formato in args.formatos:
+                for motor in (args.motores if formato == 'lista' else [None]):
+                    execucoes = [_rodar_isolado(caminho, formato, args.lote, motor)
+                                 for _ in range(max(args.repeticoes, 1))]
+                    caso = {'linhas': linhas, 'layout': layout, 'formato': formato, 'motor': motor,
+                            'tamanho_arquivo_mb': round(caminho.stat().st_size / (1024 * 1024), 2)}
+                    caso.update(_melhor_de(execucoes))
+                    relatorio['casos'].append(caso)
+                    etapas = ', '.join(f"{e}={m['segundos']:.3f}s" for e, m in caso['etapas'].items())
+                    rotulo = f"{formato} ({motor})" if motor else formato
+                    print(f"  └─ {rotulo}: {etapas} | pico RSS {caso['rss_pico_mb']} MB")
+
+    if 'lista' in args.formatos and len(set(args.motores)) > 1:
+        print("Motores de .xlsx (formato 'lista'):")
+        relatorio['comparacao_motores'] = comparar_motores(relatorio)
+
+    saida = Path(args.saida or f"benchmark_{datetime.now():%Y%m%d_%H%M%S}.json")
+    saida.write_text(json.dumps(relatorio, indent=2, ensure_ascii=False), encoding='utf-8')
+    print(f"✓ Relatório gravado em {saida}")
+
+    if args.comparar:
+        anterior = json.loads(Path(args.comparar).read_text(encoding='utf-8'))
+        print(f"Comparação com {args.comparar} (versão {anterior.get('versao')}):")
+        regressoes = comparar(relatorio, anterior, args.tolerancia)
+        if regressoes:
+            print(f"✗ {len(regressoes)} etapa(s) acima da tolerância de {args.tolerancia:.0%}")
+            sys.exit(1)
+        print("✓ Nenhuma regressão acima da tolerância")
+
+
+if __name__ == '__main__':
+    main()
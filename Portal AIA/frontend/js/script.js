@@ -3,7 +3,10 @@ function preventDefaults(e) {
     e.stopPropagation();
 }
 
-let selectedFile = null;
+let selectedFile = null; // primeiro arquivo da lista (mapeamento/colunas vêm dele)
+let selectedFiles = []; // todos os arquivos selecionados, na ordem de concatenação
+const linhasPorArquivo = new Map(); // arquivo -> linhas detectadas
+const linhasEstimadas = new Map(); // arquivos cuja contagem é estimada -> explicação (.xlsx: inclui linhas em branco; CSV grande: pelo tamanho)
 let totalLines = 0;
 let batchSize = 100; // valor inicial
 const BATCH_MAX = 100;
@@ -37,7 +40,7 @@ document.addEventListener('DOMContentLoaded', function () {
             dropArea.addEventListener('drop', (e) => {
                 const files = e.dataTransfer.files;
                 if (files.length > 0) {
-                    handleFile(files[0]);
+                    handleFiles(files);
                 }
             });
         }
@@ -45,7 +48,7 @@ document.addEventListener('DOMContentLoaded', function () {
         if (fileInput) {
             fileInput.addEventListener('change', (e) => {
                 if (e.target.files.length > 0) {
-                    handleFile(e.target.files[0]);
+                    handleFiles(e.target.files);
                 }
             });
         }
@@ -109,72 +112,228 @@ document.addEventListener('DOMContentLoaded', function () {
 });
 
 function handleFile(file) {
-    if (file.name.endsWith('.xlsx') || file.name.endsWith('.xls')) {
-        selectedFile = file;
-        document.getElementById('fileName').textContent = `📄 ${file.name}`;
-        // tenta ler o arquivo no cliente para contar linhas (usa SheetJS se disponível)
-        const batchInput = document.getElementById('batchSize');
-        if (batchInput) {
-            batchSize = Math.max(1, Math.min(BATCH_MAX, Number(batchInput.value) || 100));
-            batchInput.value = batchSize;
+    handleFiles([file]);
+}
+
+// extensões aceitas: Excel, CSV e formatos colunares (Parquet/Feather) gerados pelos sistemas de origem
+const EXTENSOES_ACEITAS = ['.xlsx', '.xls', '.csv', '.parquet', '.feather'];
+
+function handleFiles(fileList) {
+    // aceita vários arquivos: são concatenados (na ordem da lista) em uma única sequência de lotes
+    const files = Array.from(fileList);
+    const validos = files.filter(f => EXTENSOES_ACEITAS.some(ext => f.name.toLowerCase().endsWith(ext)));
+    if (!validos.length) {
+        alert('Por favor, selecione um arquivo válido (' + EXTENSOES_ACEITAS.join(', ') + ')');
+        return;
+    }
+    if (validos.length < files.length) {
+        showDiagnostics(`${files.length - validos.length} arquivo(s) ignorado(s): apenas ` + EXTENSOES_ACEITAS.join(', '));
+    }
+    selectedFiles = validos;
+    selectedFile = validos[0];
+    linhasPorArquivo.clear();
+    linhasEstimadas.clear();
+    const batchInput = document.getElementById('batchSize');
+    if (batchInput) {
+        batchSize = Math.max(1, Math.min(BATCH_MAX, Number(batchInput.value) || 100));
+        batchInput.value = batchSize;
+    }
+    totalLines = 0;
+    document.getElementById('btnProcess').disabled = true;
+    renderFileList();
+    updatePrediction();
+
+    // pede ao servidor a contagem de linhas e o mapeamento (lê só cabeçalho + primeiras linhas);
+    // se não for possível, tenta contar localmente com SheetJS
+    const selecao = selectedFiles;
+    validos.forEach(file => {
+        inspectOnServer(file).then(info => {
+            if (selectedFiles !== selecao || !selecao.includes(file)) return;
+            if (info) {
+                if (file === selectedFile) {
+                    detectedMappingLocal = info.column_mapping || null;
+                    showLocalMapping(detectedMappingLocal, info.colunas || []);
+                }
+                const estimativa = !info.total_estimado ? ''
+                    : (info.fonte_total === 'amostra' ? 'pelo tamanho do arquivo' : 'pode incluir linhas em branco');
+                registrarLinhas(file, info.total_linhas || 0, 'servidor', estimativa);
+            } else {
+                countLinesLocally(file);
+            }
+        });
+    });
+    // limpa o campo empresa sempre que um novo arquivo for adicionado
+    const companyInputEl = document.getElementById('companyInput');
+    if (companyInputEl) companyInputEl.value = '';
+}
+
+function registrarLinhas(file, linhas, origem, estimado = '') {
+    // guarda a contagem do arquivo e atualiza total, lista e previsão;
+    // `estimado` é a explicação da estimativa ('' = contagem exata)
+    linhasPorArquivo.set(file, linhas);
+    if (estimado) linhasEstimadas.set(file, estimado); else linhasEstimadas.delete(file);
+    totalLines = selectedFiles.reduce((soma, f) => soma + (linhasPorArquivo.get(f) || 0), 0);
+    showDiagnostics(`Linhas detectadas: ${estimado ? '~' : ''}${linhas} em ${file.name} (${origem}` +
+        (estimado ? `, estimativa: ${estimado}` : '') + ')' +
+        (selectedFiles.length > 1 ? ` · total: ${totalLinhasTexto()}` : ''));
+    renderFileList();
+    updatePrediction();
+    if (selectedFiles.every(f => linhasPorArquivo.has(f))) {
+        document.getElementById('btnProcess').disabled = false;
+    }
+}
+
+function renderFileList() {
+    // um arquivo: só o nome; vários: lista com linhas e botões para ordenar/remover
+    const el = document.getElementById('fileName');
+    if (!el) return;
+    el.textContent = '';
+    if (selectedFiles.length === 1) {
+        el.textContent = `📄 ${selectedFiles[0].name}`;
+        return;
+    }
+    selectedFiles.forEach((file, idx) => {
+        const item = document.createElement('div');
+        item.className = 'file-item';
+        const linhas = linhasPorArquivo.has(file)
+            ? `${linhasEstimadas.has(file) ? '~' : ''}${linhasPorArquivo.get(file)} linha(s)` : 'contando...';
+        const label = document.createElement('span');
+        label.textContent = `${idx + 1}. 📄 ${file.name} (${linhas})`;
+        item.appendChild(label);
+        [['↑', -1, 'Mover para cima'], ['↓', 1, 'Mover para baixo'], ['✕', 0, 'Remover']].forEach(([txt, delta, title]) => {
+            const b = document.createElement('button');
+            b.type = 'button';
+            b.className = 'file-item-btn';
+            b.textContent = txt;
+            b.title = title;
+            b.addEventListener('click', () => (delta ? moverArquivo(idx, delta) : removerArquivo(idx)));
+            item.appendChild(b);
+        });
+        el.appendChild(item);
+    });
+}
+
+function moverArquivo(idx, delta) {
+    // altera a ordem de concatenação (a lista é alterada no lugar)
+    const destino = idx + delta;
+    if (destino < 0 || destino >= selectedFiles.length) return;
+    const [file] = selectedFiles.splice(idx, 1);
+    selectedFiles.splice(destino, 0, file);
+    if (selectedFile !== selectedFiles[0]) {
+        selectedFile = selectedFiles[0];
+        showDiagnostics('O mapeamento de colunas exibido é do primeiro arquivo: selecione novamente para atualizá-lo.');
+    }
+    renderFileList();
+}
+
+function removerArquivo(idx) {
+    const restantes = selectedFiles.filter((_, i) => i !== idx);
+    if (!restantes.length) return;
+    const contagens = new Map(linhasPorArquivo);
+    const estimadas = new Map(linhasEstimadas);
+    handleFiles(restantes);
+    // reaproveita as contagens já feitas
+    restantes.forEach(f => { if (contagens.has(f)) registrarLinhas(f, contagens.get(f), 'cache', estimadas.get(f) || ''); });
+}
+
+function totalLinhasTexto() {
+    // total de linhas, marcado como aproximado se alguma contagem for estimada
+    return (selectedFiles.some(f => linhasEstimadas.has(f)) ? '~' : '') + totalLines;
+}
+
+// A inspeção envia só o início do arquivo (e, nos formatos binários, também o fim)
+const INSPECAO_INICIO_BYTES = 2 * 1024 * 1024;
+const INSPECAO_FIM_BYTES = 1024 * 1024;
+
+async function partesParaInspecao(file) {
+    // CSV: o início, cortado na última quebra de linha; .xlsx/.parquet/.feather: início e fim
+    // (o diretório do ZIP e o rodapé com os metadados ficam no fim); .xls e arquivos pequenos: null (inteiro)
+    const nome = file.name.toLowerCase();
+    if (nome.endsWith('.xls') || file.size <= INSPECAO_INICIO_BYTES + INSPECAO_FIM_BYTES) return null;
+    if (nome.endsWith('.csv')) {
+        const bytes = new Uint8Array(await file.slice(0, INSPECAO_INICIO_BYTES).arrayBuffer());
+        const fim = bytes.lastIndexOf(10) + 1;
+        return { inicio: new Blob([fim ? bytes.subarray(0, fim) : bytes]) };
+    }
+    return { inicio: file.slice(0, INSPECAO_INICIO_BYTES), fim: file.slice(file.size - INSPECAO_FIM_BYTES) };
+}
+
+async function inspectOnServer(file, completo = false) {
+    // retorna o resultado de /api/inspect ou null se o servidor não estiver disponível
+    if (location.protocol === 'file:') return null;
+    try {
+        const partes = completo ? null : await partesParaInspecao(file);
+        const formData = new FormData();
+        formData.append('file', partes ? partes.inicio : file, file.name);
+        if (partes) {
+            formData.append('tamanho_total', String(file.size));
+            if (partes.fim) formData.append('file_fim', partes.fim, file.name);
         }
+        formData.append('batchSize', String(batchSize));
+        const resp = await fetch((window.location.origin ? window.location.origin : '') + '/api/inspect', {
+            method: 'POST',
+            body: formData
+        });
+        const info = await resp.json();
+        if (resp.ok && info.success) return info;
+        // as partes enviadas não bastaram (ex.: planilha sem <dimension>): envia o arquivo inteiro
+        if (partes && info && info.arquivo_completo) return inspectOnServer(file, true);
+        if (info && info.error) showDiagnostics('Inspeção: ' + info.error);
+    } catch (err) {
+        console.warn('Erro ao inspecionar arquivo no servidor:', err);
+    }
+    return null;
+}
 
-        if (window.XLSX) {
-            const reader = new FileReader();
-            reader.onload = function (e) {
-                try {
-                    const data = new Uint8Array(e.target.result);
-                    const wb = window.XLSX.read(data, { type: 'array' });
-                    const firstSheet = wb.SheetNames && wb.SheetNames[0];
-                    if (firstSheet) {
-                        const ws = wb.Sheets[firstSheet];
-                        const rows = window.XLSX.utils.sheet_to_json(ws, { header: 1, defval: '' });
-                        let count = 0;
-                        if (rows.length === 0) count = 0;
-                        else {
-                            // detecta se existe header pela presença de letras na primeira linha
-                            const firstRow = rows[0] || [];
-                            const hasHeader = firstRow.some(cell => /[A-Za-zÀ-ú]/.test(String(cell)));
-                            count = hasHeader ? Math.max(0, rows.length - 1) : rows.length;
-                                // se houver header, tenta detectar mapeamento local de colunas
+function countLinesLocally(file) {
+    // tenta ler o arquivo no cliente para contar linhas (usa SheetJS se disponível)
+    if (window.XLSX) {
+        const reader = new FileReader();
+        reader.onload = function (e) {
+            try {
+                const data = new Uint8Array(e.target.result);
+                const wb = window.XLSX.read(data, { type: 'array' });
+                const firstSheet = wb.SheetNames && wb.SheetNames[0];
+                if (firstSheet) {
+                    const ws = wb.Sheets[firstSheet];
+                    const rows = window.XLSX.utils.sheet_to_json(ws, { header: 1, defval: '' });
+                    let count = 0;
+                    if (rows.length === 0) count = 0;
+                    else {
+                        // detecta se existe header pela presença de letras na primeira linha
+                        const firstRow = rows[0] || [];
+                        const hasHeader = firstRow.some(cell => /[A-Za-zÀ-ú]/.test(String(cell)));
+                        count = hasHeader ? Math.max(0, rows.length - 1) : rows.length;
+                            // se houver header, tenta detectar mapeamento local de colunas
+                            // (o mapeamento exibido é sempre o do primeiro arquivo)
+                            if (file === selectedFile) {
                                 if (hasHeader) {
                                     const header_row = firstRow.map(h => String(h).trim());
                                     detectedMappingLocal = detectMappingFromHeaders(header_row);
-                                    showLocalMapping(detectedMappingLocal);
+                                    showLocalMapping(detectedMappingLocal, header_row);
                                 } else {
                                     detectedMappingLocal = null;
                                     showLocalMapping(null);
                                 }
-                        }
-                        totalLines = count;
-                        showDiagnostics('Linhas detectadas: ' + totalLines + ' (sheet: ' + firstSheet + ')');
-                        updatePrediction();
-                        document.getElementById('btnProcess').disabled = false;
-                        return;
+                            }
                     }
-                } catch (err) {
-                    console.warn('Erro ao ler Excel localmente:', err);
+                    registrarLinhas(file, count, 'sheet: ' + firstSheet);
+                    return;
                 }
-                // fallback se leitura falhar
-                totalLines = 0;
-                updatePrediction();
-            };
-            reader.onerror = function () {
-                totalLines = 0;
-                updatePrediction();
-            };
-            reader.readAsArrayBuffer(file);
-        } else {
-            // SheetJS não disponível: definir 0 e instruir a usar servidor para previsão
-            totalLines = 0;
-            showDiagnostics('SheetJS não disponível — previsão só após upload.');
+            } catch (err) {
+                console.warn('Erro ao ler Excel localmente:', err);
+            }
+            // fallback se leitura falhar
             updatePrediction();
-        }
-        // limpa o campo empresa sempre que um novo arquivo for adicionado
-        const companyInputEl = document.getElementById('companyInput');
-        if (companyInputEl) companyInputEl.value = '';
+        };
+        reader.onerror = function () {
+            updatePrediction();
+        };
+        reader.readAsArrayBuffer(file);
     } else {
-        alert('Por favor, selecione um arquivo Excel válido (.xlsx ou .xls)');
+        // SheetJS não disponível: instruir a usar servidor para previsão
+        showDiagnostics('SheetJS não disponível — previsão só após upload.');
+        updatePrediction();
     }
 }
 
@@ -195,19 +354,22 @@ function updatePrediction() {
         const batchInput = document.getElementById('batchSize');
         if (batchInput) batchSize = Math.max(1, Math.min(BATCH_MAX, Number(batchInput.value) || batchSize));
         const fileCount = Math.ceil(totalLines / batchSize);
+        const notas = [...new Set(selectedFiles.filter(f => linhasEstimadas.has(f)).map(f => linhasEstimadas.get(f)))];
         const actionSelect = document.getElementById('actionSelect');
         const companyInput = document.getElementById('companyInput');
         const actionLabel = actionSelect ? actionSelect.value : '';
         const companyLabel = companyInput ? companyInput.value : '';
+        const origem = selectedFiles.length > 1 ? ` de ${selectedFiles.length} arquivos` : '';
         document.getElementById('predictionText').innerHTML =
-            `<strong>Previsão:</strong> Serão gerados aproximadamente <strong>${fileCount}</strong> arquivo(s)` +
+            `<strong>Previsão:</strong> Serão gerados <strong>${notas.length ? '~' : ''}${fileCount}</strong> arquivo(s) para ${totalLinhasTexto()} linha(s)${origem}` +
+            (notas.length ? `<br><small>Estimativa: contagem ${notas.join('; ')}; as linhas em branco não são exportadas.</small>` : '') +
             (actionLabel || companyLabel ? `<br><small>Ação: ${actionLabel} · Empresa: ${companyLabel}</small>` : '');
         return;
     }
 
     // quando não há contagem disponível
-    if (selectedFile) {
-        if (predictionEl) predictionEl.textContent = 'Lendo arquivo para previsão...';
+    if (selectedFiles.length) {
+        if (predictionEl) predictionEl.textContent = selectedFiles.length > 1 ? 'Lendo arquivos para previsão...' : 'Lendo arquivo para previsão...';
     } else {
         if (predictionEl) predictionEl.textContent = 'Selecione um arquivo para ver a previsão';
     }
@@ -222,7 +384,7 @@ async function processFiles() {
     const successMessage = document.getElementById('successMessage');
 
     // Validações básicas
-    if (!selectedFile) { alert('Selecione um arquivo!'); return; }
+    if (!selectedFiles.length) { alert('Selecione um arquivo!'); return; }
     const companyInput = document.getElementById('companyInput');
     if (!companyInput || !companyInput.value.trim()) { alert('Informe o nome da empresa!'); return; }
     const outputFormatEl = document.getElementById('outputFormat');
@@ -269,13 +431,35 @@ async function processFiles() {
 
     // Preparar FormData
     const formData = new FormData();
-    formData.append('file', selectedFile);
+    // vários arquivos: enviados na ordem da lista (concatenados nessa ordem no servidor)
+    for (const f of selectedFiles) formData.append('file', f);
     const actionSelect = document.getElementById('actionSelect');
     formData.append('action', actionSelect ? actionSelect.value : 'criar');
     formData.append('company', companyInput.value.trim());
     const batchInput = document.getElementById('batchSize');
     formData.append('batchSize', batchInput ? batchInput.value : String(batchSize));
     formData.append('output_format', outputFormatEl.value);
+    // deduplicação no upload e contra os números já exportados pela empresa
+    const dedupSelect = document.getElementById('dedupSelect');
+    if (dedupSelect && dedupSelect.value) formData.append('deduplicar', dedupSelect.value);
+    const indiceEmpresa = document.getElementById('indiceEmpresa');
+    if (indiceEmpresa && indiceEmpresa.checked) formData.append('indice_empresa', '1');
+    // validação de linhas: inválidas vão para o arquivo de rejeitados
+    const validarLinhas = document.getElementById('validarLinhas');
+    if (validarLinhas && validarLinhas.checked) formData.append('validar', '1');
+    // modo delta: só linhas novas/alteradas e remoções desde a última exportação da empresa
+    const modoDelta = document.getElementById('modoDelta');
+    if (modoDelta && modoDelta.checked) formData.append('delta', '1');
+    // abas das pastas de trabalho: todas ou as informadas (padrão: só a primeira)
+    const todasAbas = document.getElementById('todasAbas');
+    const abasSelecionadas = document.getElementById('abasSelecionadas');
+    if (todasAbas && todasAbas.checked) {
+        formData.append('abas', 'todas');
+    } else if (abasSelecionadas && abasSelecionadas.value.trim()) {
+        abasSelecionadas.value.split(',').map(a => a.trim()).filter(Boolean).forEach(a => formData.append('abas', a));
+    }
+    // processamento assíncrono: o servidor devolve um job_id e acompanhamos o progresso real
+    formData.append('async', '1');
     // se mapeamento editável presente, anexar seleção explícita
     try {
         const selNum = document.getElementById('map_numero');
@@ -306,7 +490,12 @@ async function processFiles() {
             body: formData
         });
 
-        const result = await resp.json();
+        let result = await resp.json();
+
+        // modo assíncrono: acompanha o job até finalizar
+        if (resp.status === 202 && result.job_id) {
+            result = await acompanharJob(result.job_id, progressBar, progressText);
+        }
 
         if (resp.ok && result.success) {
             progressBar.style.width = '100%';
@@ -317,6 +506,33 @@ async function processFiles() {
             showSuccess(count);
             showDiagnostics(`Concluído: ${count} arquivo(s) em ${result.output_folder}`);
             if (result.output_folder) lastOutputFolder = result.output_folder;
+            // totais por arquivo de entrada (modo multi-arquivo) ou por aba
+            if (result.arquivos_entrada && result.arquivos_entrada.length) {
+                showDiagnostics('Totais por arquivo:\n' + result.arquivos_entrada.map(a =>
+                    `${a.arquivo}${a.aba ? ' [' + a.aba + ']' : ''}: ${a.linhas} linha(s)` + (a.linhas ? ` · lotes ${a.lote_inicial} a ${a.lote_final}` : '')
+                ).join('\n'));
+            }
+            // linhas rejeitadas na validação (o CSV de rejeitados é salvo junto com os lotes)
+            if (result.validacao) {
+                const v = result.validacao;
+                const motivos = Object.entries(v.por_motivo || {}).map(([m, n]) => `${m}: ${n}`).join(', ');
+                showDiagnostics(`Validação: ${v.validas} válida(s), ${v.rejeitadas} rejeitada(s)` + (motivos ? ` (${motivos})` : ''));
+                if (result.rejeitados_data && result.files_data) result.files_data.push(result.rejeitados_data);
+            }
+            if (result.delta) {
+                const d = result.delta;
+                showDiagnostics(d.snapshot_anterior
+                    ? `Delta: ${d.adicionadas} nova(s), ${d.alteradas} alterada(s), ${d.removidas} removida(s), ${d.inalteradas} sem alteração`
+                    : 'Delta: primeira exportação da empresa (todas as linhas enviadas).');
+            }
+            if (result.deduplicacao) {
+                const d = result.deduplicacao;
+                showDiagnostics(`Duplicados removidos: ${d.removidos_duplicados}` +
+                    (d.linhas_em_conflito ? ` · linhas com CPF/CNPJ divergente (mantidas, ver ${d.arquivo_conflitos}): ${d.linhas_em_conflito}` : '') +
+                    (d.usou_indice ? ` · já exportados: ${d.ja_exportados}` : ''));
+                // o CSV de conflitos é salvo junto com os lotes
+                if (result.conflitos_data && result.files_data) result.files_data.push(result.conflitos_data);
+            }
 
             // mostrar mapeamento retornado pelo backend, se presente
             if (result.column_mapping) {
@@ -490,6 +706,26 @@ async function processFiles() {
     }
 }
 
+async function acompanharJob(jobId, progressBar, progressText) {
+    // consulta /api/jobs/<id> até o processamento terminar e retorna o resultado final
+    const statusUrl = (window.location.origin ? window.location.origin : '') + '/api/jobs/' + jobId;
+    while (true) {
+        await new Promise(resolve => setTimeout(resolve, 1000));
+        const r = await fetch(statusUrl);
+        const job = await r.json();
+        if (!r.ok || !job.success) throw new Error(job.error || 'Falha ao consultar o processamento');
+        if (job.status === 'concluido' || job.status === 'erro') {
+            return job.resultado || { success: false, error: 'Processamento finalizado sem resultado' };
+        }
+        const pct = job.percentual != null ? Math.max(5, job.percentual) : 5;
+        progressBar.style.width = pct + '%';
+        progressBar.textContent = job.percentual != null ? Math.round(job.percentual) + '%' : 'Processando...';
+        let txt = `Processando: ${job.linhas_processadas} linha(s), ${job.lotes_gravados} lote(s) gravado(s)`;
+        if (job.eta_segundos != null) txt += ` · restante ~${Math.ceil(job.eta_segundos)}s`;
+        progressText.textContent = txt;
+    }
+}
+
 function showSuccess(fileCount) {
     const successMessage = document.getElementById('successMessage');
     document.getElementById('filesCreated').textContent = fileCount;
@@ -0,0 +1,26 @@
+"""
+Configuração do gunicorn para o Portal AIA:  gunicorn -c gunicorn.conf.py wsgi:app
+
+Os valores vêm das mesmas variáveis de ambiente documentadas em wsgi.py.
+"""
+import os
+
+bind = f"{os.environ.get('AIA_HOST', '0.0.0.0')}:{os.environ.get('AIA_PORT', '5000')}"
+workers = int(os.environ.get('AIA_WORKERS', '1'))
+# threads por processo: uploads grandes não bloqueiam as demais requisições
+worker_class = 'gthread'
+threads = int(os.environ.get('AIA_THREADS', '8'))
+# worker sem sinal de vida (heartbeat) por mais que isso é reiniciado; no gthread as threads
+# em processamento não contam, então isto não limita a duração de uma requisição
+timeout = int(os.environ.get('AIA_TIMEOUT', '300'))
+# ao encerrar, o worker aguarda os jobs em andamento (ver worker_exit) até este limite
+graceful_timeout = int(os.environ.get('AIA_DRENAGEM_TIMEOUT', '600'))
+keepalive = 5
+# o tamanho máximo do corpo é aplicado pelo app (AIA_MAX_UPLOAD_MB -> MAX_CONTENT_LENGTH)
+accesslog = '-'
+
+
+def worker_exit(server, worker):
+    """Drena os jobs assíncronos do worker antes de o processo terminar."""
+    from app import encerrar_servidor
+    encerrar_servidor(graceful_timeout)
@@ -0,0 +1,58 @@
+import json
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+# caches persistentes (mapeamento, resultados) em uma pasta temporária, antes de importar o backend
+os.environ['AIA_DIR_CACHE'] = tempfile.mkdtemp(prefix='aia_testes_')
+os.environ.setdefault('AIA_CACHE_RESULTADOS', '0')
+
+RAIZ = Path(__file__).resolve().parent.parent
+DADOS = Path(__file__).resolve().parent / 'dados'
+sys.path.insert(0, str(RAIZ))
+
+from backend import aia  # noqa: E402
+
+
+@pytest.fixture
+def modulo_aia():
+    return aia
+
+
+@pytest.fixture(scope='session')
+def referencia_baseline():
+    """Saídas gravadas pelo código original (antes das otimizações) para tests/dados/entrada.*"""
+    with open(DADOS / 'referencia_baseline.json', encoding='utf-8') as fh:
+        return json.load(fh)
+
+
+def ler_saidas(resultado):
+    """Conteúdo dos lotes gravados, no mesmo formato de referencia_baseline.json.
+
+    CSV: texto exato do arquivo; XLSX: valores das células e o formato da coluna A.
+    """
+    import openpyxl
+    arquivos = []
+    for nome in resultado['files']:
+        caminho = Path(resultado['output_folder']) / nome
+        if nome.endswith('.csv'):
+            arquivos.append({'nome': nome, 'conteudo': caminho.read_bytes().decode('utf-8')})
+        else:
+            ws = openpyxl.load_workbook(caminho).active
+            arquivos.append({'nome': nome,
+                             'celulas': [[c.value for c in linha] for linha in ws.iter_rows()],
+                             'formato_a': [c.number_format for c in ws['A']]})
+    return arquivos
+
+
+def processar(tmp_path, entrada, acao='criar', output_format='planilha', tamanho_lote=5, **kwargs):
+    """processar_arquivo_excel com a empresa de teste, saída em `tmp_path` e sem o cache de resultados."""
+    kwargs.setdefault('usar_cache', False)
+    entrada = [str(e) for e in entrada] if isinstance(entrada, list) else str(entrada)
+    resultado = aia.processar_arquivo_excel(entrada, acao, 'Empresa Teste', tamanho_lote, str(tmp_path),
+                                            output_format=output_format, **kwargs)
+    assert resultado['success'], resultado
+    return resultado
@@ -0,0 +1,70 @@
+"""Várias abas de uma pasta de trabalho em uma única sequência de lotes."""
+import openpyxl
+import pytest
+
+from conftest import ler_saidas, processar
+
+
+@pytest.fixture
+def pasta_de_trabalho(tmp_path):
+    caminho = tmp_path / 'abas.xlsx'
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.title = 'Clientes'
+    ws.append(['Telefone', 'CNPJ'])
+    for i in range(3):
+        ws.append([f'1199999000{i}', '12345678000190'])
+    wb.create_sheet('Vazia')
+    ws = wb.create_sheet('Outros')
+    ws.append(['Documento', 'Obs', 'Celular'])
+    for i in range(2):
+        ws.append(['98765432000110', 'x', f'2188888000{i}'])
+    wb.save(caminho)
+    return caminho
+
+
+def _por_aba(resultado):
+    return {item['aba']: item for item in resultado['arquivos_entrada']}
+
+
+def test_todas_as_abas_com_dados(tmp_path, pasta_de_trabalho):
+    resultado = processar(tmp_path / 'saida', pasta_de_trabalho, tamanho_lote=2, abas='todas')
+    assert resultado['total_lines'] == 5
+    itens = resultado['arquivos_entrada']
+    assert [(i['arquivo'], i['aba'], i['linhas']) for i in itens] == [('abas.xlsx', 'Clientes', 3),
+                                                                      ('abas.xlsx', 'Outros', 2)]
+    # faixas de linhas/lotes de cada aba na sequência única de lotes
+    assert [(i['linha_inicial'], i['linha_final'], i['lote_inicial'], i['lote_final']) for i in itens] == \
+        [(1, 3, 1, 2), (4, 5, 2, 3)]
+    assert all('leitura' in str(i['timings']) for i in itens)
+
+
+def test_mapeamento_independente_por_aba(tmp_path, pasta_de_trabalho):
+    por_aba = _por_aba(processar(tmp_path / 'saida', pasta_de_trabalho, abas='todas'))
+    assert por_aba['Clientes']['column_mapping'] == {'numero': 'Telefone', 'cnpj': 'CNPJ', 'acao': None}
+    assert por_aba['Outros']['column_mapping'] == {'numero': 'Celular', 'cnpj': 'Documento', 'acao': None}
+
+
+def test_lista_de_abas_selecionadas(tmp_path, pasta_de_trabalho, modulo_aia):
+    resultado = processar(tmp_path / 'saida', pasta_de_trabalho, abas=['outros'])
+    assert list(_por_aba(resultado)) == ['Outros']
+    assert [linha['numero'] for linha in resultado['preview']] == [21888880000, 21888880001]
+
+    erro = modulo_aia.processar_arquivo_excel(str(pasta_de_trabalho), 'criar', 'Empresa Teste', 5,
+                                              str(tmp_path / 'erro'), usar_cache=False, abas=['Clientes', 'Nenhuma'])
+    assert erro['success'] is False and 'Nenhuma' in erro['error'] and 'Clientes, Vazia, Outros' in erro['error']
+
+
+def test_abas_lidas_no_pool_de_processos(tmp_path, pasta_de_trabalho, modulo_aia, monkeypatch):
+    monkeypatch.setattr(modulo_aia, 'WORKERS_LEITURA', 2)
+    tipos = []
+    obter_pool = modulo_aia._obter_pool_escrita
+    monkeypatch.setattr(modulo_aia, '_obter_pool_escrita', lambda workers, tipo: (tipos.append(tipo),
+                                                                                  obter_pool(workers, tipo))[1])
+    processos = processar(tmp_path / 'processos', pasta_de_trabalho, abas='todas')
+    assert tipos == ['processos']
+
+    monkeypatch.setattr(modulo_aia, 'POOL_ABAS', 'threads')
+    threads = processar(tmp_path / 'threads', pasta_de_trabalho, abas='todas')
+    assert tipos == ['processos', 'threads']
+    assert ler_saidas(processos) == ler_saidas(threads)
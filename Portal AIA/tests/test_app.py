@@ -0,0 +1,110 @@
+"""Rotas auxiliares do app Flask."""
+import io
+
+import openpyxl
+import pytest
+
+app = pytest.importorskip('app')
+
+
+def _metricas(cliente):
+    """Linhas de amostra de /metrics: {'nome{rótulos}': valor}."""
+    resposta = cliente.get('/metrics')
+    assert resposta.status_code == 200
+    amostras = {}
+    for linha in resposta.get_data(as_text=True).splitlines():
+        if linha and not linha.startswith('#'):
+            serie, valor = linha.rsplit(' ', 1)
+            amostras[serie] = float(valor)
+    return amostras
+
+
+def _processar(cliente, output_format):
+    from conftest import DADOS
+    with open(DADOS / 'entrada.csv', 'rb') as fh:
+        return cliente.post('/api/processar', data={'file': (fh, 'entrada.csv'), 'company': 'Empresa Teste',
+                                                    'action': 'criar', 'batchSize': '10',
+                                                    'output_format': output_format})
+
+
+def test_metricas_de_processamento_e_falhas(tmp_path, monkeypatch):
+    monkeypatch.setattr(app, 'BASE_DIR', tmp_path)
+    cliente = app.app.test_client()
+    antes = _metricas(cliente)
+    assert _processar(cliente, 'lista').status_code == 200
+    sem_colunas = cliente.post('/api/processar', data={'file': (io.BytesIO(b'Nome;Obs\nAna;x\n'), 'sem_colunas.csv'),
+                                                       'company': 'Empresa Teste', 'batchSize': '10'})
+    assert sem_colunas.status_code == 500
+    depois = _metricas(cliente)
+
+    def variacao(serie):
+        return depois.get(serie, 0) - antes.get(serie, 0)
+    assert variacao('aia_linhas_processadas_total{formato="lista"}') == 23
+    assert variacao('aia_lotes_gravados_total{formato="lista"}') == 3
+    assert variacao('aia_processamento_segundos_count{formato="lista",status="sucesso"}') == 1
+    assert variacao('aia_falhas_total{motivo="colunas_ausentes"}') == 1
+    assert variacao('aia_etapa_segundos_total{etapa="leitura"}') > 0
+    assert variacao('aia_http_requisicoes_total{rota="/api/processar",metodo="POST",status="200"}') == 1
+
+
+def test_metricas_de_processamento_com_rotulo_de_formato_limitado(tmp_path, monkeypatch):
+    monkeypatch.setattr(app, 'BASE_DIR', tmp_path)
+    cliente = app.app.test_client()
+    antes = _metricas(cliente)
+    assert _processar(cliente, 'LISTA').status_code == 200
+    assert _processar(cliente, 'formato<inventado>').status_code == 200
+    depois = _metricas(cliente)
+
+    def variacao(serie):
+        return depois.get(serie, 0) - antes.get(serie, 0)
+    for formato in ('lista', 'outro'):
+        assert variacao(f'aia_linhas_processadas_total{{formato="{formato}"}}') > 0
+        assert variacao(f'aia_lotes_gravados_total{{formato="{formato}"}}') > 0
+        assert variacao(f'aia_processamento_segundos_count{{formato="{formato}",status="sucesso"}}') == 1
+        assert variacao(f'aia_processamento_segundos_bucket{{formato="{formato}",status="sucesso",le="+Inf"}}') == 1
+    assert not any('inventado' in serie for serie in depois)
+    assert variacao('aia_http_requisicoes_total{rota="/api/processar",metodo="POST",status="200"}') == 2
+
+
+def test_processamento_assincrono_recusado_no_encerramento(tmp_path, monkeypatch):
+    from backend import jobs
+    monkeypatch.setattr(jobs, '_encerrando', True)
+    monkeypatch.setattr(app, 'DATA_DIR', tmp_path)
+    resposta = app.app.test_client().post('/api/processar', data={
+        'file': (io.BytesIO(b'Telefone;CNPJ\n11999990001;123\n'), 'entrada.csv'), 'company': 'Empresa Teste',
+        'batchSize': '10', 'async': '1'})
+    assert resposta.status_code == 503 and resposta.get_json()['success'] is False
+    # o arquivo recebido não fica para trás
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_hostinfo_informa_a_porta_configurada(monkeypatch):
+    monkeypatch.setattr(app, 'PORTA', 8123)
+    resposta = app.app.test_client().get('/api/hostinfo')
+    assert resposta.status_code == 200
+    assert resposta.get_json()['port'] == 8123
+
+
+def test_inspecao_com_inicio_e_fim_do_arquivo(tmp_path):
+    caminho = tmp_path / 'grande.xlsx'
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.append(['Telefone', 'CNPJ'])
+    for i in range(20_000):
+        ws.append([f'1199999{i:04d}', f'{i:014d}'])
+    wb.save(caminho)
+    dados = caminho.read_bytes()
+
+    cliente = app.app.test_client()
+    resposta = cliente.post('/api/inspect', data={
+        'file': (io.BytesIO(dados[:64 * 1024]), 'grande.xlsx'),
+        'file_fim': (io.BytesIO(dados[-16 * 1024:]), 'grande.xlsx'),
+        'tamanho_total': str(len(dados)),
+    })
+    assert resposta.status_code == 200, resposta.get_json()
+    assert resposta.get_json()['total_linhas'] == 20_000
+
+    # sem o fim, o diretório do ZIP não chega: o cliente é avisado para reenviar o arquivo inteiro
+    resposta = cliente.post('/api/inspect', data={'file': (io.BytesIO(dados[:64 * 1024]), 'grande.xlsx'),
+                                                  'tamanho_total': str(len(dados))})
+    assert resposta.status_code == 422 and resposta.get_json()['arquivo_completo'] is True
@@ -0,0 +1,65 @@
+"""Benchmark: planilhas sintéticas, medição das etapas e comparação com um relatório anterior e entre motores."""
+import pytest
+
+import benchmark
+from backend import aia
+
+
+@pytest.mark.parametrize('layout', benchmark.LAYOUTS)
+def test_arquivo_sintetico_reaproveitado(tmp_path, layout):
+    caminho = benchmark.gerar_arquivo(50, layout, tmp_path)
+    conteudo = caminho.read_bytes()
+    assert benchmark.gerar_arquivo(50, layout, tmp_path) == caminho
+    assert caminho.read_bytes() == conteudo
+    assert benchmark.gerar_arquivo(50, layout, tmp_path, semente=7) != caminho
+    assert not list(tmp_path.glob('*.tmp'))
+
+
+@pytest.mark.parametrize('formato', benchmark.FORMATOS)
+def test_caso_mede_cada_etapa(tmp_path, monkeypatch, formato):
+    # o caso silencia os prints do backend: desfeito ao fim do teste
+    monkeypatch.setattr(aia, 'print', print, raising=False)
+    caminho = benchmark.gerar_arquivo(120, 'coluna_unica', tmp_path / 'dados')
+    caso = benchmark._executar_caso(str(caminho), formato, 50)
+    assert (caso['linhas_processadas'], caso['arquivos']) == (120, 3)
+    assert {'leitura', 'coluna_unica', 'deteccao_colunas', 'normalizacao', 'escrita_lotes',
+            'total_base64', 'total_zip'} <= set(caso['etapas'])
+    assert ('transformacao_lista' in caso['etapas']) == (formato == 'lista')
+
+
+def _caso(formato='planilha', motor=None, **segundos):
+    caso = {'linhas': 1_000, 'layout': 'csv', 'formato': formato,
+            'etapas': {etapa: {'segundos': s} for etapa, s in segundos.items()}}
+    if motor:
+        caso['motor'] = motor
+    return caso
+
+
+def _relatorio(**segundos):
+    return {'casos': [_caso(**segundos)]}
+
+
+def test_comparar_aponta_so_as_regressoes_acima_da_tolerancia():
+    anterior = _relatorio(leitura=1.0, escrita_lotes=1.0, deteccao_colunas=0.01)
+    atual = _relatorio(leitura=1.5, escrita_lotes=1.1, deteccao_colunas=0.04)
+    # etapas muito curtas no relatório anterior não são comparadas
+    assert benchmark.comparar(atual, anterior, 0.2) == [
+        {'caso': (1_000, 'csv', 'planilha', None), 'etapa': 'leitura', 'antes': 1.0, 'depois': 1.5, 'razao': 1.5}]
+    assert benchmark.comparar(atual, {'casos': []}, 0.2) == []
+
+
+def test_comparar_por_motor_de_xlsx():
+    # relatórios antigos não registram o motor: o caso 'lista' deles era do 'rapido'
+    anterior = {'casos': [_caso('lista', leitura=1.0)]}
+    assert len(benchmark.comparar({'casos': [_caso('lista', 'rapido', leitura=2.0)]}, anterior, 0.2)) == 1
+    assert benchmark.comparar({'casos': [_caso('lista', 'openpyxl', leitura=2.0)]}, anterior, 0.2) == []
+
+
+def test_motores_lado_a_lado():
+    etapas = dict(escrita_lotes=1.0, total_base64=2.0, total_zip=2.0)
+    relatorio = {'casos': [_caso('lista', 'rapido', **etapas),
+                           _caso('lista', 'openpyxl', **{e: 3 * s for e, s in etapas.items()}),
+                           _caso('planilha', **etapas)]}
+    comparacao = benchmark.comparar_motores(relatorio)
+    assert [(c['etapa'], c['motor'], c['razao']) for c in comparacao] == [
+        ('escrita_lotes', 'openpyxl', 3.0), ('total_base64', 'openpyxl', 3.0), ('total_zip', 'openpyxl', 3.0)]
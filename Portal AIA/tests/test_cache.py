@@ -0,0 +1,55 @@
+"""Cache de resultados por hash do conteúdo."""
+from conftest import DADOS, ler_saidas, processar
+
+
+def test_chave_muda_com_a_versao(modulo_aia, monkeypatch):
+    chave = modulo_aia._chave_cache_resultado('abc', [0, 1, None])
+    assert chave == modulo_aia._chave_cache_resultado('abc', (0, 1, None))
+    assert chave != modulo_aia._chave_cache_resultado('abc', [2, 1, None])
+    assert chave != modulo_aia._chave_cache_resultado('abc', [0, 1, None], aba='Planilha2')
+    monkeypatch.setattr(modulo_aia, 'VERSAO_CACHE', modulo_aia.VERSAO_CACHE + 1)
+    assert chave != modulo_aia._chave_cache_resultado('abc', [0, 1, None])
+
+
+def test_reenvio_do_mesmo_arquivo_vem_do_cache(modulo_aia, monkeypatch, tmp_path):
+    monkeypatch.setattr(modulo_aia, 'DIR_CACHE', tmp_path / 'cache')
+    entrada = DADOS / 'entrada.csv'
+    primeiro = processar(tmp_path / 'a', entrada, usar_cache=True)
+    segundo = processar(tmp_path / 'b', entrada, usar_cache=True)
+    assert (primeiro['cache_hit'], segundo['cache_hit']) == (False, True)
+    assert ler_saidas(segundo) == ler_saidas(primeiro)
+
+    # ação e tamanho de lote são aplicados depois do cache
+    deletar = processar(tmp_path / 'c', entrada, 'deletar', tamanho_lote=10, usar_cache=True)
+    assert (deletar['cache_hit'], deletar['total_files'], deletar['total_lines']) == (True, 3, 23)
+    assert '"deletar"' in ler_saidas(deletar)[0]['conteudo']
+
+    alterada = tmp_path / 'alterada.csv'
+    alterada.write_bytes(entrada.read_bytes() + b'11 96666-5555,11.222.333/0001-81,x\n')
+    assert processar(tmp_path / 'd', alterada, usar_cache=True)['cache_hit'] is False
+
+
+def test_cache_de_versao_anterior_nao_e_usado(modulo_aia, monkeypatch, tmp_path):
+    monkeypatch.setattr(modulo_aia, 'DIR_CACHE', tmp_path / 'cache')
+    entrada = DADOS / 'entrada.csv'
+    assert processar(tmp_path / 'a', entrada, usar_cache=True)['cache_hit'] is False
+    monkeypatch.setattr(modulo_aia, 'VERSAO_CACHE', modulo_aia.VERSAO_CACHE + 1)
+    assert processar(tmp_path / 'b', entrada, usar_cache=True)['cache_hit'] is False
+
+
+def test_mapeamento_confirmado_muda_a_saida_em_cache(modulo_aia, monkeypatch, tmp_path):
+    monkeypatch.setattr(modulo_aia, 'DIR_CACHE', tmp_path / 'cache')
+    monkeypatch.setattr(modulo_aia, '_cache_mapeamento', None)
+    entrada = tmp_path / 'dois_telefones.csv'
+    entrada.write_text('Telefone;Tel2;CNPJ\n11999990001;11888880002;123\n', encoding='utf-8')
+
+    def numeros(pasta, mapeamento=None):
+        resultado = processar(tmp_path / pasta, entrada, usar_cache=True, explicit_mapping=mapeamento)
+        return resultado['cache_hit'], resultado['preview'][0]['numero']
+
+    assert numeros('a', {'numero_col': 'Tel2'}) == (False, 11888880002)
+    # sem mapeamento no formulário vale o confirmado para o cabeçalho: mesma saída, do cache
+    assert numeros('b') == (True, 11888880002)
+    # outro mapeamento confirmado para o mesmo cabeçalho não pode reaproveitar a saída anterior
+    assert numeros('c', {'numero_col': 'Telefone'}) == (False, 11999990001)
+    assert numeros('d') == (True, 11999990001)
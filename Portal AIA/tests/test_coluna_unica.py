@@ -0,0 +1,67 @@
+"""Planilha com o CSV inteiro em uma única coluna (_dividir_coluna_unica)."""
+import openpyxl
+import pandas as pd
+import pytest
+
+from conftest import processar
+
+
+def _planilha(caminho, linhas):
+    wb = openpyxl.Workbook()
+    for linha in linhas:
+        wb.active.append([linha])
+    wb.save(caminho)
+    return caminho
+
+
+@pytest.mark.parametrize('streaming', [False, True])
+def test_planilha_com_csv_em_uma_coluna(tmp_path, streaming):
+    entrada = _planilha(tmp_path / 'coluna.xlsx', ['numero;acao;cnpj',
+                                                   '11987654321;criar;12345678000190',
+                                                   '21988887777;remover;98765432000110'])
+    resultado = processar(tmp_path / 'saida', entrada, streaming=streaming)
+    assert resultado['column_mapping'] == {'numero': 'numero', 'cnpj': 'cnpj', 'acao': 'acao'}
+    assert [(linha['numero'], linha['cnpj']) for linha in resultado['preview']] == \
+        [(11987654321, '12345678000190'), (21988887777, '98765432000110')]
+
+
+def test_delimitador_entre_aspas_nao_separa_o_campo(modulo_aia):
+    df = pd.DataFrame({'numero;acao;cnpj': ['11987654321;"criar;já";"12.345.678/0001-90"',
+                                           '21988887777;remover;98765432000110']})
+    dividido, delim, colunas = modulo_aia._dividir_coluna_unica(df)
+    assert (delim, colunas) == (';', ['numero', 'acao', 'cnpj'])
+    assert dividido.values.tolist() == [['11987654321', 'criar;já', '12.345.678/0001-90'],
+                                        ['21988887777', 'remover', '98765432000110']]
+
+
+@pytest.mark.parametrize('linhas,esperado', [
+    # delimitador dentro de aspas não separa o campo
+    (['11987654321;"criar;já";"12.345.678/0001-90"', '21988887777;remover;98765432000110'],
+     [['11987654321', 'criar;já', '12.345.678/0001-90'], ['21988887777', 'remover', '98765432000110']]),
+    # as aspas fazem a contagem de delimitadores passar do número real de campos
+    (['11987654321,criar,"12,3"', '21988887777,remover,x'],
+     [['11987654321', 'criar', '12,3'], ['21988887777', 'remover', 'x']]),
+])
+def test_delimitador_entre_aspas_com_titulos_na_primeira_linha(modulo_aia, linhas, esperado):
+    df = pd.DataFrame({'Dados': ['numero' + linhas[0][11] + 'acao' + linhas[0][11] + 'cnpj'] + linhas})
+    dividido, delim, colunas = modulo_aia._dividir_coluna_unica(df)
+    assert delim == linhas[0][11]
+    assert colunas == ['numero', 'acao', 'cnpj']
+    assert dividido.values.tolist() == esperado
+
+
+@pytest.mark.parametrize('valores', [
+    [11987654321, 21988887777, None],
+    ['(11) 98765-4321', '21 98888-7777', ''],
+])
+def test_planilha_de_uma_coluna_nao_e_dividida(modulo_aia, valores):
+    df = pd.DataFrame({'Telefone': valores})
+    dividido, delim, colunas = modulo_aia._dividir_coluna_unica(df)
+    assert delim is None and colunas is None
+    assert dividido is df
+
+
+def test_planilha_so_com_telefones(tmp_path, modulo_aia):
+    entrada = _planilha(tmp_path / 'telefones.xlsx', ['Telefone', '11987654321', '(21) 98888-7777'])
+    inspecao = modulo_aia.inspecionar_arquivo(str(entrada))
+    assert (inspecao['colunas'], inspecao['total_linhas']) == (['Telefone'], 2)
@@ -0,0 +1,141 @@
+"""Deduplicação: em blocos (modo streaming), políticas de repetidos e de conflitos e índice da empresa."""
+import multiprocessing
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from conftest import processar
+
+
+def _blocos(numeros, tamanho):
+    for i in range(0, len(numeros), tamanho):
+        yield pd.DataFrame({'numero': pd.array(numeros[i:i + tamanho], dtype='Int64'), 'cnpj': '1'})
+
+
+def _numeros(quantidade, semente=0):
+    # ~25% de repetições, espalhadas por blocos diferentes
+    aleatorio = np.random.default_rng(semente)
+    return aleatorio.integers(11_900_000_000, 11_900_000_000 + quantidade * 3, quantidade)
+
+
+def test_primeiro_em_blocos_igual_ao_upload_inteiro(modulo_aia):
+    numeros = _numeros(20_000)
+    deduplicador = modulo_aia._Deduplicador('primeiro')
+    manter = np.concatenate([deduplicador.mascara(bloco) for bloco in _blocos(numeros, 700)])
+    esperado = ~pd.Series(numeros).duplicated(keep='first').to_numpy()
+    assert (manter == esperado).all()
+    assert deduplicador.removidos_duplicados == int((~esperado).sum())
+    # números vistos: int64 ordenado, um por número mantido (8 bytes cada)
+    assert deduplicador._vistos.dtype == np.int64
+    assert deduplicador._vistos.nbytes == 8 * int(esperado.sum())
+    assert (np.diff(deduplicador._vistos) > 0).all()
+
+
+def test_primeiro_ignora_nulos_e_usa_o_indice(modulo_aia, tmp_path):
+    indice = modulo_aia._IndiceNumeros(tmp_path / 'indice.npy')
+    indice.adicionar([11999990002])
+    deduplicador = modulo_aia._Deduplicador('primeiro', indice)
+    primeiro = pd.DataFrame({'numero': pd.array([11999990001, None, 11999990002], dtype='Int64'), 'cnpj': '1'})
+    segundo = pd.DataFrame({'numero': pd.array([None, 11999990001, 11999990003], dtype='Int64'), 'cnpj': '1'})
+    assert deduplicador.mascara(primeiro).tolist() == [True, True, False]
+    assert deduplicador.mascara(segundo).tolist() == [True, False, True]
+    assert (deduplicador.removidos_duplicados, deduplicador.ja_exportados) == (1, 1)
+
+
+def _tempo_em_blocos(modulo_aia, quantidade, tamanho_bloco=1_000, repeticoes=3):
+    numeros = _numeros(quantidade)
+    blocos = list(_blocos(numeros, tamanho_bloco))
+    melhor = float('inf')
+    for _ in range(repeticoes):
+        deduplicador = modulo_aia._Deduplicador('primeiro')
+        inicio = time.perf_counter()
+        for bloco in blocos:
+            deduplicador.mascara(bloco)
+        melhor = min(melhor, time.perf_counter() - inicio)
+    return melhor
+
+
+def test_custo_por_bloco_nao_cresce_com_o_total(modulo_aia):
+    """4x mais linhas (e blocos) custam bem menos que 16x: o custo é ~linear, não quadrático."""
+    pequeno = _tempo_em_blocos(modulo_aia, 50_000)
+    grande = _tempo_em_blocos(modulo_aia, 200_000)
+    assert grande < 10 * pequeno, (pequeno, grande)
+
+
+LINHAS = [('11999990001', '11111111000111'),
+          ('11999990002', '22222222000122'),
+          ('11999990001', '11111111000111'),
+          ('11999990003', '33333333000133'),
+          ('11999990003', '44444444000144')]
+
+
+def _gravar_entrada(caminho):
+    caminho.write_text('Telefone;CNPJ\n' + ''.join(f'{n};{c}\n' for n, c in LINHAS), encoding='utf-8')
+    return caminho
+
+
+@pytest.mark.parametrize('politica,esperado', [
+    ('primeiro', [(11999990001, '11111111000111'), (11999990002, '22222222000122'), (11999990003, '33333333000133')]),
+    ('ultimo', [(11999990002, '22222222000122'), (11999990001, '11111111000111'), (11999990003, '44444444000144')]),
+])
+def test_politicas_de_repetidos(tmp_path, politica, esperado):
+    resultado = processar(tmp_path, _gravar_entrada(tmp_path / 'entrada.csv'), deduplicar=politica)
+    assert [(linha['numero'], linha['cnpj']) for linha in resultado['preview']] == esperado
+    assert resultado['deduplicacao']['removidos_duplicados'] == 2
+
+
+def test_indice_da_empresa_pula_os_ja_exportados(tmp_path):
+    entrada = _gravar_entrada(tmp_path / 'entrada.csv')
+    primeiro = processar(tmp_path, entrada, deduplicar='primeiro', usar_indice=True)
+    assert (primeiro['total_lines'], primeiro['deduplicacao']['ja_exportados']) == (3, 0)
+    assert (tmp_path / '.indice_numeros' / 'Empresa_Teste_criar.npy').exists()
+
+    segundo = processar(tmp_path, entrada, deduplicar='primeiro', usar_indice=True)
+    assert (segundo['total_lines'], segundo['deduplicacao']['ja_exportados']) == (0, 3)
+    # o índice é por empresa e ação
+    assert processar(tmp_path, entrada, 'deletar', deduplicar='primeiro', usar_indice=True)['total_lines'] == 3
+
+
+def test_conflito_mantem_e_lista_as_linhas(tmp_path):
+    entrada = tmp_path / 'conflitos.csv'
+    entrada.write_text('Telefone;CNPJ\n'
+                       '11999990001;11111111000111\n'
+                       '11999990002;22222222000122\n'
+                       '11999990001;33333333000133\n'
+                       '11999990002;22222222000122\n', encoding='utf-8')
+    resultado = processar(tmp_path / 'saida', entrada, output_format='lista', deduplicar='conflito',
+                          entrega='pasta')
+    dedup = resultado['deduplicacao']
+    # o repetido sem divergência sai; os dois CPF/CNPJ do número em conflito ficam nos lotes
+    assert (resultado['total_lines'], dedup['removidos_duplicados'], dedup['linhas_em_conflito']) == (3, 1, 2)
+    assert 'removidos_conflito' not in dedup
+    assert dedup['conflitos'] == [{'numero': 11999990001, 'cnpjs': ['11111111000111', '33333333000133']}]
+    conflitos = pd.read_csv(Path(resultado['output_folder']) / dedup['arquivo_conflitos'], sep=';', dtype=str,
+                            encoding='utf-8-sig')
+    assert conflitos[['linha', 'numero', 'cnpj']].values.tolist() == [['1', '11999990001', '11111111000111'],
+                                                                    ['3', '11999990001', '33333333000133']]
+
+
+def _adicionar_varias_vezes(caminho, inicio, vezes):
+    from backend import aia
+    indice = aia._IndiceNumeros(caminho)
+    for i in range(vezes):
+        indice.adicionar([inicio + i])
+
+
+def test_indice_atualizado_por_dois_jobs_ao_mesmo_tempo(tmp_path):
+    """Dois processos (ex.: dois workers do servidor) atualizando o índice da mesma empresa."""
+    caminho = tmp_path / 'Empresa_criar.npy'
+    contexto = multiprocessing.get_context('spawn')
+    jobs = [contexto.Process(target=_adicionar_varias_vezes, args=(caminho, inicio, 150))
+            for inicio in (11_900_000_000, 21_900_000_000)]
+    for job in jobs:
+        job.start()
+    for job in jobs:
+        job.join(120)
+        assert job.exitcode == 0
+    indice = np.load(caminho)
+    assert len(indice) == 300
@@ -0,0 +1,96 @@
+"""Modo delta: diferença em relação à exportação anterior, combinado com índice, validação e deduplicação."""
+from conftest import processar
+
+LINHAS = [
+    ('11999990001', '60.701.190/0001-04'),
+    ('11999990002', '123.456.789-09'),
+    ('11999990002', '123.456.789-09'),    # repetido: removido pela deduplicação
+    ('123', '98765432000110'),            # inválido: vai para os rejeitados
+    ('2133334444', '11.222.333/0001-81'),
+]
+
+
+def _gravar_entrada(caminho, linhas):
+    caminho.write_text('Telefone;CPF/CNPJ\n' + ''.join(f'{n};{c}\n' for n, c in linhas), encoding='utf-8')
+    return caminho
+
+
+def _lotes(resultado):
+    return [nome for nome in resultado['files'] if not nome.endswith('_rejeitados.csv')]
+
+
+def test_delta_em_relacao_a_exportacao_anterior(tmp_path):
+    primeiro = processar(tmp_path, _gravar_entrada(tmp_path / 'v1.csv', [LINHAS[0], LINHAS[1], LINHAS[4]]), delta=True)
+    assert (primeiro['total_lines'], primeiro['delta']['snapshot_anterior']) == (3, False)
+
+    # sai o 2133334444, muda o CPF/CNPJ do 11999990001 e entra o 11999990003
+    nova = [('11999990001', '00.000.000/0001-91'), LINHAS[1], ('11999990003', '529.982.247-25')]
+    resultado = processar(tmp_path, _gravar_entrada(tmp_path / 'v2.csv', nova), delta=True)
+    delta = resultado['delta']
+    assert delta['snapshot_anterior'] is True
+    assert (delta['adicionadas'], delta['alteradas'], delta['removidas'], delta['inalteradas']) == (1, 1, 1, 1)
+    assert resultado['total_lines'] == 2
+
+    pasta = tmp_path / 'uploads_Empresa_Teste'
+    assert len(delta['arquivos_remocao']) == 1
+    assert '"2133334444";"deletar"' in (pasta / delta['arquivos_remocao'][0]).read_text(encoding='utf-8-sig')
+    saida = ''.join((pasta / nome).read_text(encoding='utf-8-sig') for nome in _lotes(resultado)
+                    if nome.startswith('Cadastro'))
+    assert '"11999990001";"criar";"00000000000191"' in saida
+    assert '"11999990003";"criar";"52998224725"' in saida
+    assert '11999990002' not in saida
+
+
+def test_reenvio_da_mesma_lista_nao_gera_remocoes(tmp_path):
+    entrada = _gravar_entrada(tmp_path / 'lista.csv', LINHAS)
+    opcoes = dict(delta=True, usar_indice=True, validar=True, deduplicar='primeiro')
+
+    primeiro = processar(tmp_path, entrada, **opcoes)
+    assert primeiro['total_lines'] == 3
+    assert primeiro['delta']['snapshot_anterior'] is False
+    assert primeiro['delta']['removidas'] == 0
+
+    # mesma lista de novo: nada mudou, nada sai e nenhum número vivo é removido
+    for _ in range(2):
+        seguinte = processar(tmp_path, entrada, **opcoes)
+        assert seguinte['delta']['snapshot_anterior'] is True
+        assert seguinte['delta']['removidas'] == 0
+        assert seguinte['delta']['arquivos_remocao'] == []
+        assert seguinte['delta']['adicionadas'] == 0
+        assert seguinte['delta']['inalteradas'] == len(LINHAS)
+        assert seguinte['total_lines'] == 0
+        assert not any(nome.startswith('Deletar_numeros') for nome in seguinte['files'])
+
+
+def test_delta_remove_so_os_numeros_que_sairam_da_lista(tmp_path):
+    processar(tmp_path, _gravar_entrada(tmp_path / 'v1.csv', LINHAS), delta=True, validar=True, deduplicar='primeiro')
+
+    # sai o 2133334444, muda o CPF/CNPJ do 11999990001 e entra o 11999990003
+    nova = [('11999990001', '00.000.000/0001-91')] + LINHAS[1:4] + [('11999990003', '529.982.247-25')]
+    resultado = processar(tmp_path, _gravar_entrada(tmp_path / 'v2.csv', nova), delta=True, validar=True,
+                          deduplicar='primeiro')
+    delta = resultado['delta']
+    assert (delta['adicionadas'], delta['alteradas'], delta['removidas']) == (1, 1, 1)
+    # a linha inválida (sem mudança desde a última exportação) não chega a ser validada de novo
+    assert resultado['validacao']['rejeitadas'] == 0
+
+    pasta = tmp_path / 'uploads_Empresa_Teste'
+    remocao = [nome for nome in delta['arquivos_remocao']]
+    assert len(remocao) == 1
+    conteudo = (pasta / remocao[0]).read_text(encoding='utf-8-sig')
+    assert '"2133334444";"deletar"' in conteudo
+    assert '11999990001' not in conteudo and '11999990002' not in conteudo
+    saida = ''.join((pasta / nome).read_text(encoding='utf-8-sig') for nome in _lotes(resultado)
+                    if nome.startswith('Cadastro'))
+    assert '"11999990001";"criar";"00000000000191"' in saida
+    assert '"11999990003";"criar";"52998224725"' in saida
+
+
+def test_rejeitados_mantem_a_linha_do_upload_com_delta(tmp_path):
+    processar(tmp_path, _gravar_entrada(tmp_path / 'v1.csv', LINHAS[:2]), delta=True)
+    resultado = processar(tmp_path, _gravar_entrada(tmp_path / 'v2.csv', LINHAS), delta=True, validar=True)
+    rejeitados = (tmp_path / 'uploads_Empresa_Teste' / resultado['validacao']['arquivo_rejeitados'])
+    linhas = rejeitados.read_text(encoding='utf-8-sig').splitlines()
+    assert len(linhas) == 2
+    # '123' é a 4ª linha de dados do upload, embora seja a 2ª que o delta deixa passar
+    assert linhas[1].startswith('"4";"123"')
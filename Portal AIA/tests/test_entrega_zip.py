@@ -0,0 +1,52 @@
+"""Entrega dos lotes em ZIP (_DestinoZip): mesmos lotes da pasta de saída, sem passar pelo disco."""
+import io
+import zipfile
+
+import openpyxl
+import pytest
+
+from conftest import DADOS, processar
+
+
+def _conteudo(nome, dados):
+    """Bytes do lote; no .xlsx, os valores das células (o ZIP interno guarda a hora da gravação)."""
+    if nome.endswith('.xlsx'):
+        return [[c.value for c in linha] for linha in openpyxl.load_workbook(io.BytesIO(dados)).active.iter_rows()]
+    return dados
+
+
+@pytest.mark.parametrize('output_format', ['planilha', 'lista'])
+def test_zip_com_os_mesmos_lotes_da_pasta(tmp_path, modulo_aia, monkeypatch, output_format):
+    pasta = processar(tmp_path / 'pasta', DADOS / 'entrada.csv', output_format=output_format)
+    # limite baixo: o ZIP passa da memória para o arquivo temporário no meio da escrita
+    monkeypatch.setattr(modulo_aia, 'ZIP_MAX_MEMORIA', 1024)
+    resultado = processar(tmp_path / 'zip', DADOS / 'entrada.csv', output_format=output_format, entrega='zip')
+
+    assert resultado['zip_name'] == 'Cadastro_numeros_Empresa_Teste.zip'
+    assert resultado['output_folder'] is None and not (tmp_path / 'zip').exists()
+    arquivo = resultado['zip_file']
+    assert arquivo._rolled and arquivo.tell() == 0
+    with zipfile.ZipFile(arquivo) as zf:
+        assert zf.namelist() == resultado['files'] == pasta['files']
+        for nome in pasta['files']:
+            gravado = (tmp_path / 'pasta' / 'uploads_Empresa_Teste' / nome).read_bytes()
+            assert _conteudo(nome, zf.read(nome)) == _conteudo(nome, gravado)
+    arquivo.close()
+    assert arquivo.closed
+
+
+def test_resposta_zip_fecha_o_temporario(tmp_path, modulo_aia, monkeypatch):
+    app = pytest.importorskip('app')
+    monkeypatch.setattr(modulo_aia, 'ZIP_MAX_MEMORIA', 1024)
+    resultado = processar(tmp_path, DADOS / 'entrada.csv', entrega='zip')
+    arquivo = resultado['zip_file']
+
+    with app.app.test_request_context():
+        resposta = app._resposta_zip(resultado)
+        corpo = b''.join(resposta.response)
+    assert resposta.headers['Content-Disposition'] == 'attachment; filename="Cadastro_numeros_Empresa_Teste.zip"'
+    assert resposta.headers['X-Total-Files'] == str(len(resultado['files']))
+    with zipfile.ZipFile(io.BytesIO(corpo)) as zf:
+        assert zf.namelist() == resultado['files']
+    # o arquivo temporário é fechado (e com isso removido) ao fim do envio
+    assert arquivo.closed
@@ -0,0 +1,30 @@
+"""Escrita dos lotes: colunas de saída em texto e CSV pré-renderizado (igual ao to_csv)."""
+import csv
+import io
+
+import pandas as pd
+import pytest
+
+
+def test_colunas_texto_com_nulos(modulo_aia):
+    df = pd.DataFrame({'numero': pd.array([11999990001, None, 1133334444], dtype='Int64'),
+                       'acao': ['criar', None, 'criar'], 'cnpj': ['123', None, '']})
+    assert [list(c) for c in modulo_aia._colunas_texto(df)] == [['11999990001', '', '1133334444'],
+                                                                ['criar', '', 'criar'], ['123', '', '']]
+
+
+VALORES = ['simples', 'com "aspas"', 'a;b', 'linha\nquebrada', '', 'ação', '😀', '""', ' espaço ']
+
+
+@pytest.mark.parametrize('tamanho_lote', [1, 4, 100])
+def test_csv_pre_renderizado_igual_ao_to_csv(modulo_aia, tamanho_lote):
+    df = pd.DataFrame({'numero': [str(11999990000 + i) for i in range(len(VALORES))], 'acao': VALORES,
+                       'cnpj': VALORES[::-1]})
+    buffer, limites = modulo_aia._csv_lotes_bytes(modulo_aia._colunas_texto(df), tamanho_lote)
+    lotes = [bytes(buffer[inicio:fim]) for inicio, fim in zip(limites, limites[1:])]
+    esperados = []
+    for i in range(0, len(df), tamanho_lote):
+        saida = io.BytesIO()
+        df.iloc[i:i + tamanho_lote].to_csv(saida, index=False, sep=';', quoting=csv.QUOTE_ALL, encoding='utf-8-sig')
+        esperados.append(saida.getvalue())
+    assert lotes == esperados
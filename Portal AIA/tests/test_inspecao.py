@@ -0,0 +1,141 @@
+"""inspecionar_arquivo: total de linhas e prévia sem ler o arquivo inteiro."""
+import openpyxl
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+import pyarrow.parquet  # noqa: F401  (pa.parquet)
+
+from conftest import DADOS
+
+
+def test_csv_com_total_mapeamento_e_previa(modulo_aia):
+    inspecao = modulo_aia.inspecionar_arquivo(str(DADOS / 'entrada.csv'), linhas_preview=3, tamanho_lote=10)
+    assert inspecao['success'], inspecao
+    assert (inspecao['total_linhas'], inspecao['fonte_total'], inspecao['previsao_lotes']) == (23, 'contagem', 3)
+    assert inspecao['column_mapping'] == {'numero': 'Telefone', 'cnpj': 'CPF/CNPJ', 'acao': 'Observação'}
+    assert [linha['numero'] for linha in inspecao['preview']] == [11999990001, 1133334444, 11988887777]
+
+
+def test_xlsx_pela_dimensao_sem_ler_a_planilha(tmp_path, modulo_aia, monkeypatch):
+    caminho = tmp_path / 'entrada.xlsx'
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.append(['Telefone', 'CNPJ'])
+    for i in range(2_500):
+        ws.append([f'1199999{i:04d}', '12345678000190'])
+    wb.save(caminho)
+
+    def _proibido(*args, **kwargs):
+        raise AssertionError('leitura completa do .xlsx')
+    monkeypatch.setattr(pd, 'read_excel', _proibido)
+    monkeypatch.setattr(openpyxl, 'load_workbook', _proibido)
+
+    inspecao = modulo_aia.inspecionar_arquivo(str(caminho), linhas_preview=2, tamanho_lote=1_000)
+    assert inspecao['success'], inspecao
+    assert (inspecao['total_linhas'], inspecao['fonte_total'], inspecao['previsao_lotes']) == (2_500, 'dimensao', 3)
+    assert [linha['numero'] for linha in inspecao['preview']] == [11999990000, 11999990001]
+
+
+def test_feather_pelos_metadados(tmp_path, modulo_aia, monkeypatch):
+    tabela = pa.table({'Telefone': [f'1199999{i:04d}' for i in range(2_500)], 'CNPJ': ['12345678000190'] * 2_500})
+    caminho = tmp_path / 'entrada.feather'
+    feather.write_feather(tabela, caminho, chunksize=1_000)
+
+    def _proibido(*args, **kwargs):
+        raise AssertionError('leitura completa do .feather')
+    monkeypatch.setattr(pd, 'read_feather', _proibido)
+    monkeypatch.setattr(pa.ipc.RecordBatchFileReader, 'read_all', _proibido)
+
+    resultado = modulo_aia.inspecionar_arquivo(str(caminho), linhas_preview=3, tamanho_lote=1_000)
+    assert resultado['success'], resultado
+    assert (resultado['total_linhas'], resultado['fonte_total'], resultado['previsao_lotes']) == (2_500, 'metadados', 3)
+    assert [linha['numero'] for linha in resultado['preview']] == [11999990000, 11999990001, 11999990002]
+
+
+def test_xlsx_com_linhas_em_branco_informa_estimativa(tmp_path, modulo_aia):
+    caminho = tmp_path / 'entrada.xlsx'
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.append(['Telefone', 'CNPJ'])
+    ws.append(['11999990001', '12345678000190'])
+    ws.append([])
+    ws.append(['11999990002', '12345678000190'])
+    ws.cell(row=10, column=1).number_format = '@'   # linha só com formatação, sem valor
+    wb.save(caminho)
+
+    inspecao = modulo_aia.inspecionar_arquivo(str(caminho))
+    processado = modulo_aia.processar_arquivo_excel(str(caminho), 'criar', 'Empresa Teste', 100, str(tmp_path),
+                                                    usar_cache=False)
+    # a <dimension> conta as linhas em branco: o total é um limite superior, marcado como estimado
+    assert inspecao['total_estimado'] is True and inspecao['fonte_total'] == 'dimensao'
+    assert inspecao['total_linhas'] >= processado['total_lines'] == 2
+
+
+def test_csv_informa_total_exato(modulo_aia):
+    inspecao = modulo_aia.inspecionar_arquivo(str(DADOS / 'entrada.csv'))
+    assert inspecao['total_estimado'] is False
+    assert inspecao['total_linhas'] == 23
+
+
+def _partes(caminho, inicio, fim=0):
+    """Início (e fim) do arquivo, como o frontend envia na inspeção."""
+    dados = caminho.read_bytes()
+    parte_inicio = caminho.with_name('inicio' + caminho.suffix)
+    parte_inicio.write_bytes(dados[:inicio])
+    parte_fim = None
+    if fim:
+        parte_fim = caminho.with_name('fim' + caminho.suffix)
+        parte_fim.write_bytes(dados[-fim:])
+    return parte_inicio, parte_fim, len(dados)
+
+
+def test_csv_parcial_estima_pelo_tamanho(tmp_path, modulo_aia):
+    caminho = tmp_path / 'grande.csv'
+    caminho.write_text('Telefone;CNPJ\n' + ''.join(f'1199999{i:04d};12345678000190\n' for i in range(5_000)),
+                       encoding='utf-8')
+    inicio, _, tamanho = _partes(caminho, 27 * 100)   # 100 linhas inteiras
+    inspecao = modulo_aia.inspecionar_arquivo(str(inicio), tamanho_total=tamanho)
+    assert inspecao['success'], inspecao
+    assert (inspecao['total_estimado'], inspecao['fonte_total']) == (True, 'amostra')
+    assert abs(inspecao['total_linhas'] - 5_000) <= 50
+    assert inspecao['column_mapping'] == {'numero': 'Telefone', 'cnpj': 'CNPJ', 'acao': None}
+
+
+def _xlsx_grande(caminho, linhas):
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.append(['Telefone', 'CNPJ'])
+    for i in range(linhas):
+        ws.append([f'1199999{i:04d}', f'{i:014d}'])
+    wb.save(caminho)
+
+
+def test_xlsx_pelo_inicio_e_fim(tmp_path, modulo_aia):
+    caminho = tmp_path / 'grande.xlsx'
+    _xlsx_grande(caminho, 20_000)
+    completo = modulo_aia.inspecionar_arquivo(str(caminho), tamanho_lote=1_000)
+    inicio, fim, tamanho = _partes(caminho, 64 * 1024, 16 * 1024)
+    assert tamanho > 64 * 1024 + 16 * 1024
+    parcial = modulo_aia.inspecionar_arquivo(str(inicio), tamanho_lote=1_000, tamanho_total=tamanho,
+                                             caminho_fim=str(fim))
+    assert parcial['success'], parcial
+    assert parcial == completo
+
+
+def test_parquet_pelo_inicio_e_fim(tmp_path, modulo_aia):
+    caminho = tmp_path / 'grande.parquet'
+    tabela = pa.table({'Telefone': [f'1199999{i:04d}' for i in range(50_000)], 'CNPJ': [f'{i:014d}' for i in range(50_000)]})
+    pa.parquet.write_table(tabela, caminho, row_group_size=1_000)
+    completo = modulo_aia.inspecionar_arquivo(str(caminho))
+    inicio, fim, tamanho = _partes(caminho, 64 * 1024, 64 * 1024)
+    parcial = modulo_aia.inspecionar_arquivo(str(inicio), tamanho_total=tamanho, caminho_fim=str(fim))
+    assert parcial == completo
+
+
+def test_partes_insuficientes_pedem_o_arquivo_inteiro(tmp_path, modulo_aia):
+    caminho = tmp_path / 'grande.parquet'
+    tabela = pa.table({'Telefone': [f'1199999{i:04d}' for i in range(50_000)], 'CNPJ': [f'{i:014d}' for i in range(50_000)]})
+    pa.parquet.write_table(tabela, caminho)   # um único row group: não cabe no início enviado
+    inicio, fim, tamanho = _partes(caminho, 16 * 1024, 16 * 1024)
+    resultado = modulo_aia.inspecionar_arquivo(str(inicio), tamanho_total=tamanho, caminho_fim=str(fim))
+    assert resultado['success'] is False and resultado['arquivo_completo'] is True
@@ -0,0 +1,52 @@
+"""Medição por etapa: tempo de cada etapa e campo de memória conforme AIA_MEDIR_MEMORIA."""
+import time
+import tracemalloc
+
+import pytest
+
+from backend import instrumentacao
+from conftest import DADOS, processar
+
+
+@pytest.mark.parametrize('streaming', [False, True], ids=['completo', 'streaming'])
+def test_resultado_com_o_tempo_de_cada_etapa(tmp_path, streaming):
+    timings = processar(tmp_path, DADOS / 'entrada.csv', streaming=streaming)['timings']
+    assert {'leitura', 'deteccao_colunas', 'normalizacao', 'escrita_lotes'} <= set(timings['etapas'])
+    assert all(medida['segundos'] >= 0 for medida in timings['etapas'].values())
+    assert timings['total_segundos'] > 0
+
+
+def test_etapa_medida_varias_vezes_soma_os_tempos():
+    medicao = instrumentacao.Medicao()
+    for _ in range(3):
+        with medicao.etapa('bloco'):
+            time.sleep(0.01)
+    assert medicao.resumo()['etapas']['bloco']['segundos'] >= 0.03
+
+
+def test_sem_tracemalloc_informa_o_pico_do_processo(monkeypatch):
+    monkeypatch.setattr(instrumentacao, 'MEDIR_MEMORIA', False)
+    medicao = instrumentacao.Medicao()
+    with medicao.etapa('leitura'):
+        pass
+    resumo = medicao.resumo()
+    assert set(resumo['etapas']['leitura']) == {'segundos', 'rss_pico_processo_mb'}
+    assert resumo['memoria'] in ('rss_processo', None)
+
+
+def test_tracemalloc_mede_cada_etapa_desde_zero(monkeypatch):
+    monkeypatch.setattr(instrumentacao, 'MEDIR_MEMORIA', True)
+    tracemalloc.start()
+    try:
+        medicao = instrumentacao.Medicao()
+        with medicao.etapa('grande'):
+            bloco = bytearray(20 * 1024 * 1024)
+            del bloco
+        with medicao.etapa('pequena'):
+            bloco = bytearray(1024)
+    finally:
+        tracemalloc.stop()
+    etapas = medicao.resumo()['etapas']
+    # o pico da etapa anterior não vaza para a seguinte
+    assert etapas['grande']['memoria_pico_mb'] >= 19
+    assert etapas['pequena']['memoria_pico_mb'] < 1
@@ -0,0 +1,89 @@
+"""Fila de jobs: progresso por lote, conteúdo base64 entregue uma vez, expiração e encerramento gracioso."""
+import threading
+import time
+
+import pytest
+
+from backend import jobs
+from conftest import DADOS, processar
+
+
+def _aguardar(job_id):
+    for _ in range(200):
+        with jobs._lock:
+            if jobs._jobs[job_id]['finalizado_em']:
+                return
+        time.sleep(0.01)
+    pytest.fail('job não finalizou')
+
+
+def _resultado(progresso=None):
+    return {'success': True, 'files': ['Cadastro_001.csv'], 'files_data': [{'name': 'Cadastro_001.csv', 'content': 'eA=='}],
+            'rejeitados_data': {'name': 'r.csv', 'content': 'eQ=='}}
+
+
+def test_job_informa_o_progresso_e_o_resultado(tmp_path):
+    job_id = jobs.criar_job(processar, tmp_path, DADOS / 'entrada.csv')
+    _aguardar(job_id)
+    job = jobs.obter_job(job_id)
+    assert job['status'] == 'concluido' and job['percentual'] == 100.0
+    resultado = job['resultado']
+    assert (job['linhas_processadas'], job['lotes_gravados']) == (resultado['total_lines'], resultado['total_files'])
+    assert resultado['total_lines'] == 23
+
+
+def test_job_com_erro_e_job_inexistente():
+    removidos = []
+
+    def falhar(progresso=None):
+        raise RuntimeError('planilha ilegível')
+    job_id = jobs.criar_job(falhar, ao_finalizar=lambda: removidos.append(True))
+    _aguardar(job_id)
+    job = jobs.obter_job(job_id)
+    assert job['status'] == 'erro'
+    assert job['resultado'] == {'success': False, 'error': 'planilha ilegível'}
+    assert removidos == [True]
+    assert jobs.obter_job('inexistente') is None
+
+
+def test_conteudo_entregue_so_na_primeira_consulta():
+    job_id = jobs.criar_job(_resultado)
+    _aguardar(job_id)
+    primeira = jobs.obter_job(job_id)
+    assert primeira['resultado']['files_data'][0]['name'] == 'Cadastro_001.csv'
+    assert 'rejeitados_data' in primeira['resultado']
+
+    segunda = jobs.obter_job(job_id)
+    assert segunda['status'] == 'concluido'
+    assert segunda['resultado']['files'] == ['Cadastro_001.csv']
+    assert segunda['resultado']['conteudo_entregue'] is True
+    assert 'files_data' not in segunda['resultado'] and 'rejeitados_data' not in segunda['resultado']
+    # a primeira cópia entregue continua intacta
+    assert 'files_data' in primeira['resultado']
+
+
+def test_consulta_remove_jobs_expirados(monkeypatch):
+    job_id = jobs.criar_job(_resultado)
+    _aguardar(job_id)
+    monkeypatch.setattr(jobs, 'JOB_TTL', 0)
+    time.sleep(0.01)
+    assert jobs.obter_job('outro') is None
+    with jobs._lock:
+        assert job_id not in jobs._jobs
+
+
+def test_encerrar_aguarda_os_jobs_e_recusa_novos(monkeypatch):
+    monkeypatch.setattr(jobs, '_encerrando', False)
+    liberar = threading.Event()
+
+    def demorado(progresso=None):
+        liberar.wait(5)
+        return {'success': True}
+    job_id = jobs.criar_job(demorado)
+    # o job ainda está em andamento ao fim da espera
+    assert jobs.encerrar(timeout=0.05) == 1
+    with pytest.raises(RuntimeError):
+        jobs.criar_job(demorado)
+    liberar.set()
+    assert jobs.encerrar(timeout=5) == 0
+    assert jobs.obter_job(job_id)['status'] == 'concluido'
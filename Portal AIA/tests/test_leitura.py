@@ -0,0 +1,65 @@
+"""Vários arquivos no mesmo envio: uma sequência de lotes, lidos em paralelo por threads (padrão) ou processos."""
+import json
+
+import pytest
+
+from conftest import DADOS, ler_saidas, processar
+
+
+def _linhas(resultado):
+    return [linha for arquivo in ler_saidas(resultado) for linha in arquivo['conteudo'].splitlines()[1:]]
+
+
+@pytest.mark.parametrize('streaming', [False, True], ids=['completo', 'streaming'])
+def test_arquivos_em_uma_sequencia_de_lotes(tmp_path, streaming):
+    outro = tmp_path / 'outro.csv'
+    outro.write_text('Celular;Documento\n' + ''.join(f'1188888000{i};12345678000190\n' for i in range(4)),
+                     encoding='utf-8')
+    juntos = processar(tmp_path / 'juntos', [DADOS / 'entrada.csv', outro], streaming=streaming,
+                       nome_arquivo=['entrada.csv', 'outro.csv'])
+    assert (juntos['total_lines'], juntos['total_files']) == (27, 6)
+    assert [(i['arquivo'], i['linhas'], i['linha_inicial'], i['linha_final'], i['lote_inicial'], i['lote_final'])
+            for i in juntos['arquivos_entrada']] == [('entrada.csv', 23, 1, 23, 1, 5), ('outro.csv', 4, 24, 27, 5, 6)]
+    # cada arquivo com o seu mapeamento; a saída é a dos dois envios separados, em sequência
+    assert juntos['arquivos_entrada'][1]['column_mapping'] == {'numero': 'Celular', 'cnpj': 'Documento', 'acao': None}
+    separados = [processar(tmp_path / nome, entrada, streaming=streaming)
+                 for nome, entrada in (('a', DADOS / 'entrada.csv'), ('b', outro))]
+    assert _linhas(juntos) == _linhas(separados[0]) + _linhas(separados[1])
+
+
+def _processar_dois(tmp_path, modulo_aia, monkeypatch, pool):
+    monkeypatch.setattr(modulo_aia, 'WORKERS_LEITURA', 2)
+    monkeypatch.setattr(modulo_aia, 'POOL_LEITURA', pool)
+    return processar(tmp_path / pool, [DADOS / 'entrada.csv', DADOS / 'entrada.xlsx'],
+                     nome_arquivo=['entrada.csv', 'entrada.xlsx'])
+
+
+def test_processos_e_threads_geram_os_mesmos_lotes(tmp_path, modulo_aia, monkeypatch):
+    threads = _processar_dois(tmp_path, modulo_aia, monkeypatch, 'threads')
+    processos = _processar_dois(tmp_path, modulo_aia, monkeypatch, 'processos')
+    assert threads['total_lines'] == processos['total_lines'] > 0
+    assert ler_saidas(threads) == ler_saidas(processos)
+
+
+def test_cache_de_mapeamento_gravado_pelo_processo_principal(tmp_path, modulo_aia, monkeypatch):
+    monkeypatch.setattr(modulo_aia, 'WORKERS_LEITURA', 2)
+    monkeypatch.setattr(modulo_aia, 'POOL_LEITURA', 'processos')
+    monkeypatch.setattr(modulo_aia, 'DIR_CACHE', tmp_path / 'cache')
+    monkeypatch.setattr(modulo_aia, '_cache_mapeamento', None)
+    # cabeçalhos que nenhum outro teste usou: os filhos não os encontram no cache deles
+    entradas = []
+    for i in range(2):
+        entrada = tmp_path / f'layout{i}.csv'
+        entrada.write_text(f'Extra {tmp_path.name} {i};Telefone;CNPJ\nx;11999990001;123\n', encoding='utf-8')
+        entradas.append(entrada)
+    processar(tmp_path, entradas, nome_arquivo=['layout0.csv', 'layout1.csv'])
+    # os filhos só devolvem as entradas; o principal grava o arquivo e mantém o cache em memória
+    with open(tmp_path / 'cache' / 'cache_mapeamentos.json', encoding='utf-8') as fh:
+        gravado = json.load(fh)
+    assinaturas = [modulo_aia._assinatura_cabecalho([modulo_aia._normalize_col(c) for c in
+                                                     (f'Extra {tmp_path.name} {i}', 'Telefone', 'CNPJ')])
+                   for i in range(2)]
+    assert all(gravado[a] == {'numero': 1, 'cnpj': 2, 'acao': None, 'confirmado': False} for a in assinaturas)
+    assert gravado == dict(modulo_aia._cache_mapeamento)
+    assert modulo_aia._cache_mapeamento_adiado is None
+    assert modulo_aia._contexto_processos().get_start_method() in ('forkserver', 'spawn')
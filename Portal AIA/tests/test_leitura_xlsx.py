@@ -0,0 +1,128 @@
+"""Leitura direta do XML do .xlsx (_xlsx_ler_blocos) comparada com pd.read_excel(dtype=str)."""
+import datetime
+import zipfile
+
+import openpyxl
+import pandas as pd
+import pytest
+
+from conftest import processar
+
+_NS = 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'
+
+
+def _gravar_xlsx_manual(caminho, linhas_xml, compartilhadas=()):
+    """.xlsx mínimo com o <sheetData> informado (e, opcionalmente, strings compartilhadas)."""
+    with zipfile.ZipFile(caminho, 'w') as zf:
+        zf.writestr('[Content_Types].xml',
+                    '<?xml version="1.0" encoding="UTF-8"?>'
+                    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+                    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+                    '<Default Extension="xml" ContentType="application/xml"/>'
+                    '<Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+                    '<Override PartName="/xl/worksheets/sheet1.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+                    '<Override PartName="/xl/sharedStrings.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sharedStrings+xml"/>'
+                    '</Types>')
+        zf.writestr('_rels/.rels',
+                    '<?xml version="1.0" encoding="UTF-8"?>'
+                    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+                    '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="xl/workbook.xml"/>'
+                    '</Relationships>')
+        zf.writestr('xl/workbook.xml',
+                    f'<?xml version="1.0" encoding="UTF-8"?><workbook xmlns="{_NS}" '
+                    'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+                    '<sheets><sheet name="Dados" sheetId="1" r:id="rId1"/></sheets></workbook>')
+        zf.writestr('xl/_rels/workbook.xml.rels',
+                    '<?xml version="1.0" encoding="UTF-8"?>'
+                    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+                    '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" Target="worksheets/sheet1.xml"/>'
+                    '<Relationship Id="rId2" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/sharedStrings" Target="sharedStrings.xml"/>'
+                    '</Relationships>')
+        zf.writestr('xl/sharedStrings.xml',
+                    f'<?xml version="1.0" encoding="UTF-8"?><sst xmlns="{_NS}" count="{len(compartilhadas)}">'
+                    + ''.join(f'<si><t>{t}</t></si>' for t in compartilhadas) + '</sst>')
+        zf.writestr('xl/worksheets/sheet1.xml',
+                    f'<?xml version="1.0" encoding="UTF-8"?><worksheet xmlns="{_NS}"><sheetData>'
+                    + ''.join(linhas_xml) + '</sheetData></worksheet>')
+    return caminho
+
+
+def _inline(texto):
+    return f'<c t="inlineStr"><is><t>{texto}</t></is></c>'
+
+
+def _comparar_com_pandas(modulo_aia, caminho):
+    obtido = next(modulo_aia._xlsx_ler_blocos(caminho, todas_colunas=True))
+    # linhas totalmente em branco são descartadas pela leitura do XML (como no processamento)
+    esperado = pd.read_excel(caminho, dtype=str, engine='openpyxl').dropna(how='all')
+    assert list(obtido.columns) == [str(c) for c in esperado.columns]
+    assert obtido.astype(object).where(obtido.notna(), None).values.tolist() == \
+        esperado.astype(object).where(esperado.notna(), None).values.tolist()
+    return obtido
+
+
+def test_celulas_sem_referencia(tmp_path, modulo_aia):
+    # sem o atributo r: cada célula ocupa a coluna seguinte à anterior
+    linhas = ['<row>' + _inline('Nome') + _inline('Telefone') + _inline('CNPJ') + '</row>',
+              '<row>' + _inline('Ana') + '<c><v>11999990001</v></c>' + _inline('12.345.678/0001-90') + '</row>',
+              '<row>' + _inline('Bia') + '<c><v>2133334444</v></c>' + _inline('98765432000110') + '</row>']
+    caminho = _gravar_xlsx_manual(tmp_path / 'sem_r.xlsx', linhas)
+    df = _comparar_com_pandas(modulo_aia, caminho)
+    assert df['Telefone'].tolist() == ['11999990001', '2133334444']
+
+    resultado = processar(tmp_path, caminho)
+    assert resultado['total_lines'] == 2
+
+
+def test_strings_inline_e_compartilhadas(tmp_path, modulo_aia):
+    linhas = ['<row r="1"><c r="A1" t="s"><v>0</v></c><c r="B1" t="s"><v>1</v></c>' + '<c r="C1" t="inlineStr"><is><t>Obs</t></is></c></row>',
+              '<row r="2"><c r="A2" t="s"><v>2</v></c><c r="B2" t="inlineStr"><is><t>123.456.789-09</t></is></c></row>',
+              '<row r="4"><c r="A4"><v>11999990003.0</v></c><c r="C4" t="s"><v>2</v></c></row>']
+    caminho = _gravar_xlsx_manual(tmp_path / 'strings.xlsx', linhas, ['Telefone', 'CPF', '(11) 99999-0002'])
+    _comparar_com_pandas(modulo_aia, caminho)
+
+
+def test_so_as_colunas_mapeadas_como_texto(tmp_path, modulo_aia, monkeypatch):
+    caminho = tmp_path / 'colunas.xlsx'
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.append(['Nome', 'Telefone', 'Obs', 'CNPJ', 'Telefone'])
+    ws.append(['Ana', 11999990001, 'x', '12345678000190', 1])
+    ws.append(['Bia', None, 'y', '98765432000110', 2])
+    ws.append(['Caio', 2133334444, 'z', '11222333000181', 3])
+    wb.save(caminho)
+    # cabeçalho repetido renomeado como no pandas
+    _comparar_com_pandas(modulo_aia, caminho)
+
+    def _proibido(*args, **kwargs):
+        raise AssertionError('.xlsx lido pelo pandas')
+    monkeypatch.setattr(pd, 'read_excel', _proibido)
+    resultado = processar(tmp_path, caminho)
+    # a célula em branco não transforma a coluna em float (11999990001 -> '11999990001.0')
+    assert [linha['numero'] for linha in resultado['preview']] == [11999990001, None, 2133334444]
+
+
+def test_celulas_de_data(tmp_path, modulo_aia):
+    caminho = tmp_path / 'datas.xlsx'
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.append(['Telefone', 'CNPJ', 'Cadastro', 'Hora', 'Valor'])
+    ws.append(['11999990001', '12345678000190', datetime.datetime(2024, 1, 15, 10, 30), datetime.time(8, 15), 1.5])
+    ws.append([11999990002, '12345678000190', datetime.date(2023, 12, 31), None, 2])
+    ws['E3'].number_format = 'dd/mm/yyyy'
+    wb.save(caminho)
+    df = _comparar_com_pandas(modulo_aia, caminho)
+    assert df['Cadastro'].tolist() == ['2024-01-15 10:30:00', '2023-12-31 00:00:00']
+
+
+@pytest.mark.parametrize('streaming', [False, True])
+def test_cabecalho_ilegivel_le_pelo_pandas(tmp_path, modulo_aia, monkeypatch, streaming):
+    caminho = _gravar_xlsx_manual(tmp_path / 'sem_r.xlsx', [
+        '<row>' + _inline('Telefone') + _inline('CNPJ') + '</row>',
+        '<row><c><v>11999990001</v></c>' + _inline('123') + '</row>'])
+    # simula um cabeçalho que a leitura do XML não interpreta: cai no pd.read_excel
+    monkeypatch.setattr(modulo_aia, '_xlsx_indices_celulas', lambda celulas, *a: [-1] * len(celulas))
+    with pytest.raises(modulo_aia._XlsxNaoSuportado):
+        next(modulo_aia._xlsx_ler_blocos(caminho))
+    resultado = processar(tmp_path, caminho, streaming=streaming)
+    assert resultado['total_lines'] == 1
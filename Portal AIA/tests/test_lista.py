@@ -0,0 +1,74 @@
+"""Formato 'lista': paridade da formatação vetorizada do número com a original (por linha)."""
+import re
+
+import openpyxl
+import pandas as pd
+
+from conftest import processar
+
+
+def _append_comma_original(s):
+    """Formatação por linha do código original (referência para _formatar_numeros_lista)."""
+    if s is None:
+        return ''
+    ss = str(s)
+    ss = re.sub(r"\s+", "", ss)
+    ss = ss.replace('\u00A0', '')
+    ss = re.sub(r"[^0-9]", "", ss)
+    if not ss:
+        return ''
+    return ss + ','
+
+
+VALORES = [
+    '11999990001', ' 11 99999-0001 ', '11\u00a099999\u00a00004', '\u00a0(11) 99999-0005\u00a0', '11\u00a099999\u00a00002', '\u00a0(21) 3333-4444\u00a0',
+    '11999990001.0', 11999990001.0, 1133334444, '0800 123 4567', '011987654321', '00',
+    '', '   ', 'abc', '+55 11 9', None, float('nan'), pd.NA, '1,5', '٣٤٥',
+]
+
+
+def test_formatar_numeros_lista_igual_ao_original(modulo_aia):
+    serie = pd.Series(VALORES, dtype=object)
+    esperado = [_append_comma_original(v) for v in VALORES]
+    assert modulo_aia._formatar_numeros_lista(serie).tolist() == esperado
+
+
+def test_formatar_numeros_lista_em_texto_igual_ao_original(modulo_aia):
+    textos = [v for v in VALORES if isinstance(v, str)]
+    serie = pd.Series(textos, dtype='string')
+    assert modulo_aia._formatar_numeros_lista(serie).tolist() == [_append_comma_original(v) for v in textos]
+
+
+def test_formatar_numeros_lista_int64_com_nulos(modulo_aia):
+    """Coluna 'numero' normalizada (Int64) com nulos: cada número sai com os seus dígitos.
+
+    Mudança em relação ao original: lá o Series.apply sobre Int64 com <NA> entregava floats
+    à função no pandas 3 ('11999990001.0'), e todos os números da coluna ganhavam um '0'
+    a mais ('119999900010,'); os nulos continuam virando ''.
+    """
+    serie = pd.Series([11999990001, None, 1133334444], dtype='Int64')
+    assert modulo_aia._formatar_numeros_lista(serie).tolist() == ['11999990001,', '', '1133334444,']
+
+
+def test_lista_com_nulos_e_formatos_variados(tmp_path):
+    """Ponta a ponta (.xlsx): a célula A da 'lista' é o número da 'planilha' seguido de vírgula."""
+    entrada = tmp_path / 'entrada.xlsx'
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.append(['Telefone', 'CNPJ'])
+    for numero in ['11999990001', 11999990002.0, '11\u00a099999-0003', '', 'sem número', '0800 123 4567',
+                   '011 3333-4444', 5511977776666, '11999990001.0']:
+        ws.append([numero, '12.345.678/0001-90'])
+    wb.save(entrada)
+
+    planilha = processar(tmp_path / 'p', entrada, output_format='planilha', tamanho_lote=100)
+    lista = processar(tmp_path / 'l', entrada, output_format='lista', tamanho_lote=100)
+    with open(tmp_path / 'p' / 'uploads_Empresa_Teste' / planilha['files'][0], encoding='utf-8-sig') as fh:
+        numeros = [linha.split(';')[0].strip('"') for linha in fh.read().splitlines()[1:]]
+    ws = openpyxl.load_workbook(tmp_path / 'l' / 'uploads_Empresa_Teste' / lista['files'][0]).active
+    celulas = [c.value for c in ws['A']][1:]
+
+    assert numeros == ['11999990001', '11999990002', '11999990003', '', '', '8001234567', '1133334444',
+                       '11977776666', '119999900010']
+    assert celulas == [f'{n},' if n else None for n in numeros]
+    assert {c.number_format for c in ws['A']} == {'@'}
@@ -0,0 +1,70 @@
+"""Cache de mapeamento de colunas por assinatura do cabeçalho."""
+import pandas as pd
+import pytest
+
+from conftest import processar
+
+
+@pytest.fixture
+def cache_vazio(modulo_aia, monkeypatch, tmp_path):
+    monkeypatch.setattr(modulo_aia, 'DIR_CACHE', tmp_path / 'cache')
+    monkeypatch.setattr(modulo_aia, '_cache_mapeamento', None)
+    return modulo_aia
+
+
+def _assinatura(modulo_aia, colunas):
+    return modulo_aia._assinatura_cabecalho([modulo_aia._normalize_col(c) for c in colunas])
+
+
+def test_layout_conhecido_dispensa_a_deteccao(cache_vazio, monkeypatch):
+    colunas = ['Telefone', 'Documento', 'Obs']
+    df = pd.DataFrame(columns=colunas)
+    assert cache_vazio._resolver_mapeamento(df) == ('Telefone', 'Documento', None)
+    assert cache_vazio._cache_mapeamento[_assinatura(cache_vazio, colunas)] == \
+        {'numero': 0, 'cnpj': 1, 'acao': None, 'confirmado': False}
+
+    def sem_deteccao(*args):
+        raise AssertionError('layout em cache não deveria passar pela detecção')
+    monkeypatch.setattr(cache_vazio, '_find_column', sem_deteccao)
+    assert cache_vazio._resolver_mapeamento(df) == ('Telefone', 'Documento', None)
+
+
+def test_lru_remove_o_layout_menos_usado(cache_vazio, monkeypatch):
+    monkeypatch.setattr(cache_vazio, 'CACHE_MAPEAMENTO_MAX', 2)
+    layouts = [['Telefone', 'CNPJ', f'Extra{i}'] for i in range(3)]
+    cache_vazio._resolver_mapeamento(pd.DataFrame(columns=layouts[0]))
+    cache_vazio._resolver_mapeamento(pd.DataFrame(columns=layouts[1]))
+    # usar o primeiro de novo o torna o mais recente: sai o segundo
+    cache_vazio._resolver_mapeamento(pd.DataFrame(columns=layouts[0]))
+    cache_vazio._resolver_mapeamento(pd.DataFrame(columns=layouts[2]))
+    assert list(cache_vazio._cache_mapeamento) == [_assinatura(cache_vazio, layouts[i]) for i in (0, 2)]
+
+
+def test_mapeamento_explicito_prevalece_e_fica_confirmado(cache_vazio):
+    colunas = ['Telefone', 'Tel2', 'CNPJ']
+    df = pd.DataFrame(columns=colunas)
+    assert cache_vazio._resolver_mapeamento(df)[0] == 'Telefone'
+    assert cache_vazio._resolver_mapeamento(df, {'numero_col': 'Tel2'})[0] == 'Tel2'
+    assert cache_vazio._cache_mapeamento[_assinatura(cache_vazio, colunas)] == \
+        {'numero': 1, 'cnpj': 2, 'acao': None, 'confirmado': True}
+    # as próximas planilhas com o mesmo cabeçalho usam o mapeamento confirmado
+    assert cache_vazio._resolver_mapeamento(df)[0] == 'Tel2'
+
+
+@pytest.mark.parametrize('streaming', [False, True], ids=['completo', 'streaming'])
+@pytest.mark.parametrize('extensao', ['.csv', '.xlsx'])
+def test_mapeamento_resolvido_uma_vez_por_upload(cache_vazio, monkeypatch, tmp_path, extensao, streaming):
+    entrada = tmp_path / f'entrada{extensao}'
+    df = pd.DataFrame({'Obs': ['x', 'y'], 'Telefone': ['11999990001', '11999990002'], 'CNPJ': ['1', '2']})
+    if extensao == '.csv':
+        df.to_csv(entrada, sep=';', index=False)
+    else:
+        df.to_excel(entrada, index=False)
+    gravacoes = []
+    gravar = cache_vazio._gravar_cache_mapeamento
+    monkeypatch.setattr(cache_vazio, '_gravar_cache_mapeamento', lambda *a: (gravacoes.append(a), gravar(*a)))
+
+    resultado = processar(tmp_path / 'saida', entrada, streaming=streaming)
+    assert resultado['total_lines'] == 2
+    assert gravacoes == [(_assinatura(cache_vazio, list(df.columns)),
+                          {'numero': 1, 'cnpj': 2, 'acao': None, 'confirmado': False})]
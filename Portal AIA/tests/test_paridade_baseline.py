@@ -0,0 +1,111 @@
+"""Paridade com o código original: normalização dos números e conteúdo dos lotes gravados.
+
+tests/dados/referencia_baseline.json foi gerado pelo processar_arquivo_excel original
+(iterrows/apply por linha, to_csv por lote e pd.ExcelWriter/openpyxl no formato 'lista')
+com tests/dados/entrada.csv e entrada.xlsx, lotes de 5 linhas e a empresa 'Empresa Teste'.
+"""
+import random
+import re
+
+import pandas as pd
+import pytest
+
+from conftest import DADOS, ler_saidas, processar
+
+
+def _normalize_num_original(n):
+    """Normalização por linha do código original (referência para _normalizar_numeros)."""
+    if pd.isna(n):
+        return n
+    s = str(n)
+    s = re.sub(r'\D', '', s)
+    while s.startswith('00'):
+        s = s[2:]
+    if s.startswith('55') and len(s) > 8:
+        s = s[2:]
+    return s
+
+
+def _valores_baguncados(quantidade, semente=0):
+    aleatorio = random.Random(semente)
+    prefixos = ['', '00', '0000', '55', '5555', '0055', '+55 ', '+55 (', '00 55 ', '055']
+    valores = []
+    for _ in range(quantidade):
+        tipo = aleatorio.random()
+        digitos = ''.join(aleatorio.choice('0123456789') for _ in range(aleatorio.randint(0, 13)))
+        if tipo < 0.05:
+            valores.append(None)
+        elif tipo < 0.1:
+            valores.append(float('nan'))
+        elif tipo < 0.2 and digitos:
+            valores.append(int(digitos))
+        elif tipo < 0.25 and digitos:
+            valores.append(float(digitos))
+        else:
+            texto = aleatorio.choice(prefixos) + digitos
+            if len(texto) > 4 and aleatorio.random() < 0.5:
+                corte = aleatorio.randint(1, len(texto) - 1)
+                texto = texto[:corte] + aleatorio.choice([' ', '-', ') ', '.', '\u00a0']) + texto[corte:]
+            valores.append(texto)
+    return valores
+
+
+def test_normalizar_numeros_igual_ao_original(modulo_aia):
+    serie = pd.Series(_valores_baguncados(20_000), dtype=object)
+    esperado = serie.apply(_normalize_num_original)
+    obtido = modulo_aia._normalizar_numeros(serie)
+    assert obtido.isna().tolist() == esperado.isna().tolist()
+    assert obtido.dropna().tolist() == esperado.dropna().tolist()
+    pd.testing.assert_series_equal(pd.to_numeric(obtido, errors='coerce').astype('Int64'),
+                                   pd.to_numeric(esperado, errors='coerce').astype('Int64'))
+
+
+CASOS = [(entrada, acao, formato)
+         for entrada in ('entrada.csv', 'entrada.xlsx')
+         for acao in ('criar', 'alterar', 'deletar')
+         for formato in ('planilha', 'lista')]
+
+
+@pytest.mark.parametrize('entrada,acao,formato', CASOS)
+@pytest.mark.parametrize('streaming', [False, True], ids=['completo', 'streaming'])
+def test_lotes_iguais_ao_original(tmp_path, referencia_baseline, entrada, acao, formato, streaming):
+    resultado = processar(tmp_path, DADOS / entrada, acao, formato, streaming=streaming)
+    assert ler_saidas(resultado) == referencia_baseline[f'{entrada}|{acao}|{formato}']
+
+
+@pytest.mark.parametrize('motor', ['rapido', 'openpyxl'])
+@pytest.mark.parametrize('acao', ['criar', 'alterar', 'deletar'])
+def test_lista_igual_ao_original_nos_dois_motores(tmp_path, referencia_baseline, motor, acao):
+    resultado = processar(tmp_path, DADOS / 'entrada.xlsx', acao, 'lista', motor_xlsx=motor)
+    assert ler_saidas(resultado) == referencia_baseline[f'entrada.xlsx|{acao}|lista']
+
+
+def test_lotes_em_paralelo_iguais_ao_original(tmp_path, referencia_baseline):
+    resultado = processar(tmp_path, DADOS / 'entrada.csv', 'criar', 'lista', workers_escrita=2, pool_escrita='threads')
+    assert ler_saidas(resultado) == referencia_baseline['entrada.csv|criar|lista']
+
+
+@pytest.mark.parametrize('extensao', ['.parquet', '.feather'])
+@pytest.mark.parametrize('streaming', [False, True], ids=['completo', 'streaming'])
+def test_parquet_e_feather_iguais_ao_csv(tmp_path, referencia_baseline, extensao, streaming):
+    entrada = tmp_path / f'entrada{extensao}'
+    df = pd.read_csv(DADOS / 'entrada.csv', dtype=str)
+    if extensao == '.parquet':
+        df.to_parquet(entrada, index=False)
+    else:
+        df.to_feather(entrada)
+    resultado = processar(tmp_path / 'saida', entrada, streaming=streaming)
+    assert ler_saidas(resultado) == referencia_baseline['entrada.csv|criar|planilha']
+
+
+@pytest.mark.parametrize('streaming', [False, True], ids=['completo', 'streaming'])
+def test_coluna_de_acao_explicita(tmp_path, streaming):
+    entrada = tmp_path / 'acoes.csv'
+    entrada.write_text('Telefone;CNPJ;Acao;Tipo\n11999990001;123;alterar;deletar\n11999990002;456;alterar;deletar\n',
+                       encoding='utf-8')
+    resultado = processar(tmp_path / 'saida', entrada, output_format='planilha', streaming=streaming,
+                          explicit_mapping={'numero_col': None, 'cnpj_col': None, 'acao_col': 'Tipo'})
+    # acao_col prevalece sobre a coluna detectada ('Acao'); nos lotes vale a ação do parâmetro
+    assert resultado['column_mapping'] == {'numero': 'Telefone', 'cnpj': 'CNPJ', 'acao': 'Tipo'}
+    assert ler_saidas(resultado)[0]['conteudo'].splitlines()[1:] == ['"11999990001";"criar";"123"',
+                                                                        '"11999990002";"criar";"456"']
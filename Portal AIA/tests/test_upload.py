@@ -0,0 +1,84 @@
+"""Recebimento dos uploads direto em arquivo temporário (_RequestUpload/_ArquivoUpload)."""
+import hashlib
+import io
+
+import pytest
+
+app = pytest.importorskip('app')
+
+CSV = b'Telefone;CNPJ\n11987654321;52998224725\n' * 2_000
+
+
+@pytest.fixture
+def pasta_uploads(tmp_path, monkeypatch):
+    pasta = tmp_path / 'data'
+    pasta.mkdir()
+    monkeypatch.setattr(app, 'DATA_DIR', pasta)
+    monkeypatch.setattr(app, 'BASE_DIR', tmp_path)
+    return pasta
+
+
+@pytest.fixture
+def uploads_criados(monkeypatch):
+    """Os _ArquivoUpload criados no request (para conferir que chegaram a gravar algo)."""
+    criados = []
+    iniciar = app._ArquivoUpload.__init__
+
+    def __init__(self, filename):
+        iniciar(self, filename)
+        criados.append(self)
+    monkeypatch.setattr(app._ArquivoUpload, '__init__', __init__)
+    return criados
+
+
+def _enviar(cliente, dados=CSV, **extras):
+    return cliente.post('/api/processar', data={'file': (io.BytesIO(dados), 'entrada.csv'), 'company': 'Empresa Teste',
+                                                'batchSize': '1000', **extras})
+
+
+def test_sha256_calculado_durante_o_recebimento(pasta_uploads, monkeypatch):
+    recebidos = []
+
+    def processar(entrada, *args, **kwargs):
+        with open(entrada, 'rb') as fh:
+            recebidos.append((fh.read(), kwargs['hash_conteudo']))
+        return {'success': True}
+    monkeypatch.setattr(app, 'processar_arquivo_excel', processar)
+
+    assert _enviar(app.app.test_client()).status_code == 200
+    assert recebidos == [(CSV, hashlib.sha256(CSV).hexdigest())]
+    # o arquivo temporário é removido ao fim do request
+    assert list(pasta_uploads.iterdir()) == []
+
+
+def test_upload_acima_do_limite(pasta_uploads, uploads_criados, monkeypatch):
+    monkeypatch.setattr(app, 'MAX_UPLOAD_MB', 1)
+    monkeypatch.setattr(app, 'MAX_UPLOAD_BYTES', len(CSV) // 2)
+    # sem o Content-Length no limite do Flask: o limite vale enquanto o corpo é gravado
+    monkeypatch.setitem(app.app.config, 'MAX_CONTENT_LENGTH', None)
+    resposta = _enviar(app.app.test_client())
+    assert resposta.status_code == 413
+    assert resposta.get_json() == {'success': False, 'error': 'Arquivo grande demais (limite: 1 MB).'}
+    assert [u.tamanho > app.MAX_UPLOAD_BYTES for u in uploads_criados] == [True]
+    assert list(pasta_uploads.iterdir()) == []
+
+
+def test_temporario_removido_quando_o_processamento_falha(pasta_uploads, monkeypatch):
+    def processar(*args, **kwargs):
+        raise RuntimeError('falha no processamento')
+    monkeypatch.setattr(app, 'processar_arquivo_excel', processar)
+    resposta = _enviar(app.app.test_client())
+    assert resposta.status_code == 500 and 'falha no processamento' in resposta.get_json()['error']
+    assert list(pasta_uploads.iterdir()) == []
+
+
+def test_temporario_removido_quando_o_envio_e_interrompido(pasta_uploads, uploads_criados):
+    corpo = (b'--limite\r\nContent-Disposition: form-data; name="file"; filename="entrada.csv"\r\n'
+             b'Content-Type: text/csv\r\n\r\n' + CSV)
+    # o Content-Length promete mais bytes do que chegam (cliente desconectou no meio do arquivo)
+    resposta = app.app.test_client().post('/api/processar', input_stream=io.BytesIO(corpo),
+                                          content_type='multipart/form-data; boundary=limite',
+                                          headers={'Content-Length': str(len(corpo) + 10_000)})
+    assert resposta.status_code == 400
+    assert len(uploads_criados) == 1 and uploads_criados[0].tamanho > 0
+    assert list(pasta_uploads.iterdir()) == []
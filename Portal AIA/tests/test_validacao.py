@@ -0,0 +1,77 @@
+"""Validação de telefone, DDD e CPF/CNPJ (linhas inválidas vão para o arquivo de rejeitados)."""
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+from conftest import processar
+
+CELULAR = 11987654321
+CPF_VALIDO = '52998224725'
+CNPJ_VALIDO = '11222333000181'
+
+
+def _motivo(modulo_aia, numero, documento):
+    df = pd.DataFrame({'numero': pd.array([numero], dtype='Int64'), 'cnpj': [documento]})
+    codigo = int(modulo_aia._motivos_rejeicao(df)[0])
+    return list(modulo_aia.MOTIVOS_REJEICAO)[codigo - 1] if codigo else None
+
+
+@pytest.mark.parametrize('documento,motivo', [
+    (CPF_VALIDO, None),
+    ('11144477735', None),
+    ('52998224724', 'documento_invalido'),      # segundo dígito verificador
+    ('52998224715', 'documento_invalido'),      # primeiro dígito verificador
+    ('11111111111', 'documento_invalido'),      # dígitos repetidos passam no cálculo, mas são inválidos
+    ('00000000000', 'documento_invalido'),
+    (CNPJ_VALIDO, None),
+    ('11222333000182', 'documento_invalido'),
+    ('11222333000191', 'documento_invalido'),
+    ('11111111111111', 'documento_invalido'),
+    ('191', None),                              # CPF sem os zeros à esquerda (célula numérica)
+    ('1234', 'documento_invalido'),
+    ('1222333000128', None),                    # CNPJ sem o zero à esquerda (01.222.333/0001-28)
+    ('123456789012345', 'documento_invalido'),  # mais de 14 dígitos
+    ('', 'documento_ausente'),
+])
+def test_digitos_verificadores(modulo_aia, documento, motivo):
+    assert _motivo(modulo_aia, CELULAR, documento) == motivo
+
+
+@pytest.mark.parametrize('numero,motivo', [
+    (11987654321, None),
+    (1133334444, None),
+    (5532221111, None),          # 55 é DDD (RS), não só o código do país
+    (20987654321, 'ddd_invalido'),
+    (10987654321, 'ddd_invalido'),
+    (2333334444, 'ddd_invalido'),
+    (2633334444, 'ddd_invalido'),
+    (11887654321, 'numero_formato'),
+    (1163334444, 'numero_formato'),
+    (987654321, 'numero_tamanho'),
+    (119876543210, 'numero_tamanho'),
+    (None, 'numero_ausente'),
+])
+def test_telefone_e_ddd(modulo_aia, numero, motivo):
+    assert _motivo(modulo_aia, numero, CPF_VALIDO) == motivo
+
+
+def test_arquivo_de_rejeitados_e_contagem_por_motivo(tmp_path):
+    entrada = tmp_path / 'validar.csv'
+    entrada.write_text('Telefone;CNPJ\n'
+                       f'{CELULAR};{CPF_VALIDO}\n'
+                       f'20987654321;{CPF_VALIDO}\n'
+                       f'{CELULAR};11111111111\n'
+                       f'(11) 3333-4444;{CNPJ_VALIDO}\n'
+                       f'2333334444;{CNPJ_VALIDO}\n'
+                       f'{CELULAR};\n', encoding='utf-8')
+    resultado = processar(tmp_path / 'saida', entrada, validar=True, entrega='pasta')
+    validacao = resultado['validacao']
+    assert (resultado['total_lines'], validacao['validas'], validacao['rejeitadas']) == (2, 2, 4)
+    assert validacao['por_motivo'] == {'ddd_invalido': 2, 'documento_invalido': 1, 'documento_ausente': 1}
+
+    rejeitados = pd.read_csv(Path(resultado['output_folder']) / validacao['arquivo_rejeitados'], sep=';', dtype=str,
+                             encoding='utf-8-sig', keep_default_na=False)
+    assert list(rejeitados.columns) == ['linha', 'numero', 'acao', 'cnpj', 'motivo']
+    assert rejeitados[['linha', 'motivo']].values.tolist() == [['2', 'ddd_invalido'], ['3', 'documento_invalido'],
+                                                               ['5', 'ddd_invalido'], ['6', 'documento_ausente']]
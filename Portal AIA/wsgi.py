@@ -0,0 +1,73 @@
+"""
+Ponto de entrada de produção do Portal AIA (servidor WSGI multi-thread/multi-processo).
+
+Waitress (Windows ou Linux; um processo com várias threads):
+    pip install waitress
+    python wsgi.py
+
+Gunicorn (Linux; vários processos, cada um com várias threads):
+    pip install gunicorn
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+Configuração por variáveis de ambiente:
+    AIA_HOST / AIA_PORT        endereço e porta (padrão 0.0.0.0:5000)
+    AIA_THREADS                threads por processo (padrão 8)
+    AIA_WORKERS                processos do gunicorn (padrão 1, ver observação abaixo)
+    AIA_TIMEOUT                waitress: fecha conexões ociosas (sem tráfego) há mais que isso;
+                               gunicorn: reinicia o worker sem sinal de vida há mais que isso
+                               (padrão 300 s). Nenhum dos dois limita a duração de uma requisição
+                               em processamento: para arquivos grandes use o modo assíncrono
+                               (/api/jobs/<id>)
+    AIA_MAX_UPLOAD_MB          tamanho máximo do corpo da requisição (padrão 512, ver app.py)
+    AIA_DRENAGEM_TIMEOUT       espera máxima (s) pelos jobs em andamento ao encerrar (padrão 600)
+
+Observação: a fila de jobs assíncronos (/api/jobs/<id>) fica na memória de cada processo.
+Com AIA_WORKERS > 1 a consulta de um job pode cair em outro processo; para ganhar vazão
+prefira aumentar AIA_THREADS e a serialização paralela dos lotes (AIA_WORKERS_ESCRITA).
+
+Ao receber SIGTERM/SIGINT (ou Ctrl+C), novos jobs são recusados (HTTP 503) e os jobs na
+fila ou em andamento são concluídos antes de o processo terminar.
+"""
+import multiprocessing
+import os
+import signal
+
+from app import app, encerrar_servidor, MAX_UPLOAD_BYTES, PORTA
+
+HOST = os.environ.get('AIA_HOST', '0.0.0.0')
+THREADS = int(os.environ.get('AIA_THREADS', '8'))
+TIMEOUT = int(os.environ.get('AIA_TIMEOUT', '300'))
+DRENAGEM_TIMEOUT = int(os.environ.get('AIA_DRENAGEM_TIMEOUT', '600'))
+
+
+def _interromper(signum, frame):
+    raise KeyboardInterrupt
+
+
+def main():
+    try:
+        from waitress import serve
+    except ImportError:
+        print("✗ waitress não está instalado (pip install waitress); usando o servidor de desenvolvimento do Flask.")
+        serve = None
+
+    # SIGTERM (ex.: parada do serviço) segue o mesmo caminho do Ctrl+C
+    signal.signal(signal.SIGTERM, _interromper)
+    print(f"✓ Portal AIA em http://{HOST}:{PORTA} ({THREADS} threads)")
+    try:
+        if serve is not None:
+            # channel_timeout: tempo de inatividade da conexão, não da requisição (ver AIA_TIMEOUT)
+            serve(app, host=HOST, port=PORTA, threads=THREADS, channel_timeout=TIMEOUT,
+                  max_request_body_size=MAX_UPLOAD_BYTES or 2 ** 40)
+        else:
+            app.run(host=HOST, port=PORTA, threaded=True)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        encerrar_servidor(DRENAGEM_TIMEOUT)
+
+
+if __name__ == '__main__':
+    # necessário para o pool de processos de escrita quando empacotado como executável
+    multiprocessing.freeze_support()
+    main()
@@ -71,4 +71,6 @@ def api_processar():
         return jsonify({"success": False, "error": str(e)}), 500
 
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5000, debug=True)
+    # debugger/reloader do Flask apenas quando AIA_DEBUG=1 (nunca em produção)
+    debug = os.environ.get('AIA_DEBUG', '').strip().lower() in ('1', 'true', 'sim')
+    app.run(host='0.0.0.0', port=5000, debug=debug)
@@ -192,7 +192,7 @@ def selecionar_e_formatar_dados(df):
         # Limpeza e normalização do campo 'numero': remover quaisquer caracteres não-dígitos
         # e remover prefixo de país '55' caso exista (manter apenas DDD + número local)
         df_selected['numero'] = df_selected['numero'].astype(str).str.replace(r'\D', '', regex=True)
-        df_selected['numero'] = df_selected['numero'].apply(lambda s: s[2:] if s.startswith('55') else s)
+        df_selected['numero'] = df_selected['numero'].str.replace(r'^55', '', regex=True)
 
         # Formata cada coluna
         df_selected['numero'] = pd.to_numeric(df_selected['numero'], errors='coerce').astype('Int64')